@@ -21,21 +21,34 @@ to voice warning system that would notify the driver of any upcoming threats.
     - window_height: The desired height of the captured window (full height of the given monitor by default)
     - window_scale: A scaling factor for the captured window (1.0 by default)
 
+    - frame_source: Replace the screen capture with any other source of frames,
+        i.e. a recorded video or a directory of images (see capture_utils.py)
+    - display: Show the processed frames on the dashboard (disable it for headless runs)
+    - inference_server: Address of an InferenceServer to run the object detection on,
+        instead of loading a copy of the model in this process (see object_classifier/InferenceServer.py)
+
+- Threading:
+    - intra_op_threads, inter_op_threads: Size of the thread pools of the tensorflow session (0 lets tensorflow decide)
+    - cpu_affinity: List of cores (or a string, i.e. '0-3') to restrict the whole process to (all cores by default)
+    - opencv_threads: Number of threads used by OpenCV (OpenCV's default if None)
+    See driving_assistant/thread_utils.py
+
 """
 
 # libraries and dependencies
 # ---------------------------------------------------------------------------- #
 import numpy as np
-import pandas as pd
 import cv2
 import os, sys
-import mss
-import mss.tools
 import time
 
 from object_classifier.ObjectClassifier import *
 from lane_detector.LaneDetector import *
+import driving_assistant.capture_utils as capture_utils
+import driving_assistant.thread_utils as thread_utils
+import driving_assistant.render_utils as render_utils
 from object_classifier.object_detection.utils import label_map_util, visualization_utils
+import profiling.trace_utils as tracer
 
 # ---------------------------------------------------------------------------- #
 
@@ -55,7 +68,14 @@ class DrivingAssistant:
         window_left_offset = 0,
         window_width = None,
         window_height = None,
-        window_scale = 1.0):
+        window_scale = 1.0,
+        frame_source = None,
+        display = True,
+        inference_server = None,
+        intra_op_threads = 0,
+        inter_op_threads = 0,
+        cpu_affinity = None,
+        opencv_threads = None):
 
         # Boolean flag for feature-customization
         self.object_detection = object_detection
@@ -65,40 +85,49 @@ class DrivingAssistant:
         self.lane_detection = lane_detection
         self.lane_visualization = lane_visualization
 
-        # Instance of the MSS-API for captureing screenshots
-        self.window_manager = mss.mss()
-
-        # Note:
-        #   - monitor_id = 0 | grab all monitors together
-        #   - monitor_id = n | grab a given monitor (n) : where n > 0
-        self.target_window = self.window_manager.monitors[monitor_id]
-
-        # Update position of the window that will be captured
-        if window_left_offset:
-            self.target_window['left'] += window_left_offset
-            self.target_window['width'] -= window_left_offset
-        if window_top_offset:
-            self.target_window['top'] += window_top_offset
-            self.target_window['height'] -= window_top_offset
-        if window_width:
-            self.target_window['width'] = window_width
-        if window_height:
-            self.target_window['height'] = window_height
-        if window_scale:
-            self.target_window['scale'] = window_scale
+        # Boolean flag to show the processed frames on the dashboard (disabled for headless runs)
+        self.show_dashboard = display
+
+        # draws the regions of interest and resizes the frames for the dashboard (see driving_assistant/render_utils.py)
+        self.renderer = render_utils.DashboardRenderer()
+
+        # By default, frames are captured from the screen using the MSS-API
+        # otherwise, any object with a read() method that returns BGR frames could be used
+        # (see driving_assistant/capture_utils.py)
+        if frame_source is None:
+            frame_source = capture_utils.ScreenSource(
+                monitor_id = monitor_id,
+                window_top_offset = window_top_offset,
+                window_left_offset = window_left_offset,
+                window_width = window_width,
+                window_height = window_height,
+                window_scale = window_scale)
+
+        self.frame_source = frame_source
+
+        # split the cores between tensorflow, OpenCV and the rest of the process
+        thread_utils.configure_threads(cpu_affinity = cpu_affinity, opencv_threads = opencv_threads)
 
         print("Activating DeepEye Advanced Co-pilot Mode")
         
-        self.object_detector = ObjectClassifier(
+        object_classifier_prams = dict(
             classifier_codename = classifier_codename,
             dataset_codename = dataset_codename,
             classifier_threshold = classifier_threshold,
             visualization = object_visualization,
             diagnostic_mode = diagnostic_mode,
-            frame_height = self.target_window['height'],
-            frame_width = self.target_window['width']
+            frame_height = self.frame_source.height,
+            frame_width = self.frame_source.width,
+            intra_op_threads = intra_op_threads,
+            inter_op_threads = inter_op_threads
         )
 
+        if inference_server is None:
+            self.object_detector = ObjectClassifier(**object_classifier_prams)
+        else:
+            from object_classifier.InferenceServer import RemoteObjectClassifier
+            self.object_detector = RemoteObjectClassifier(address = inference_server, **object_classifier_prams)
+
         self.lane_detector = LaneDetector(
             visualization = lane_visualization
         )
@@ -131,47 +160,52 @@ class DrivingAssistant:
             'COLLISION'
         ]
 
-        self.data_frame = pd.DataFrame(columns=self.columns)
+        # pandas is only needed to log the detected threats in diagnostic mode
+        self.data_frame = None
+        if self.diagnostic_mode:
+            import pandas as pd
+            self.data_frame = pd.DataFrame(columns=self.columns)
+
+
+    def draw_roi(self, frame):
+        """
+        Draw boxes around the areas scanned by the object detector.
+        Note: the boxes are drawn once for the current frame size, then copied onto each frame (see render_utils.py)
+        """
+        self.renderer.draw_roi(frame, self.object_detector.roi)
+
+
+    def display(self, frame):
+        """
+        Show the processed frame on the dashboard.
+        """
+        if not self.show_dashboard:
+            return
+
+        with tracer.span('display'):
+            cv2.imshow('DeepEye Dashboard', self.renderer.resize(frame))
 
 
+    @tracer.traced('DrivingAssistant.run')
     def run(self):   
         """
         Capture frames, initiate both objects and lane detectors, and then visualize output. 
+        Return False if there are no more frames to be processed.
         """
-        # Get raw pixels from the screen, save it to a Numpy array
-        original_frame = np.asarray(self.window_manager.grab(self.target_window))
+        with tracer.span('capture'):
+            original_frame = self.frame_source.read()
 
-        # set frame's height & width
-        frame_height, frame_width = original_frame.shape[:2]
-
-        # convert pixels from BGRA to RGB values 
-        original_frame = cv2.cvtColor(original_frame, cv2.COLOR_BGRA2BGR)
+        if original_frame is None:
+            return False
 
         if self.diagnostic_mode:
-            pre = original_frame.copy()
-            # draw a box around the area scaned for for PEDESTRIAN/VEHICLES detection
-            visualization_utils.draw_bounding_box_on_image_array(
-                pre,
-                self.object_detector.roi["t"]/frame_height, 
-                self.object_detector.roi["l"]/frame_width, 
-                self.object_detector.roi["b"]/frame_height, 
-                self.object_detector.roi["r"]/frame_width,
-                color=(255, 255, 0), # BGR VALUE 
-                display_str_list=(' ROI ',))
-
-            # draw a box around the area scaned for collision warnings
-            visualization_utils.draw_bounding_box_on_image_array(
-                pre,
-                self.object_detector.roi["ct"]/frame_height, 
-                self.object_detector.roi["cl"]/frame_width, 
-                self.object_detector.roi["b"]/frame_height, 
-                self.object_detector.roi["cr"]/frame_width,
-                color=(255, 0, 255), # BGR VALUE 
-                display_str_list=(' COLLISION ROI ',))
-
-            # save a screen shot of the current frame before getting processed 
-            if self.frame_id % 10 == 0:
-                cv2.imwrite("test/pre/" + str(self.frame_id/10) + ".jpg", pre)
+            with tracer.span('diagnostic_pre'):
+                pre = original_frame.copy()
+                self.draw_roi(pre)
+
+                # save a screen shot of the current frame before getting processed 
+                if self.frame_id % 10 == 0:
+                    cv2.imwrite("test/pre/" + str(self.frame_id/10) + ".jpg", pre)
 
         # only detect objects in the given frame
         if self.object_detection and not self.lane_detection:
@@ -179,10 +213,7 @@ class DrivingAssistant:
 
             if self.object_visualization:
                 # Display frame with detected objects.
-                cv2.imshow(
-                    'DeepEye Dashboard', 
-                    cv2.resize(frame, (640, 480))
-                )
+                self.display(frame)
 
         # only detect lane in the given frame
         elif self.lane_detection and not self.object_detection:
@@ -190,10 +221,7 @@ class DrivingAssistant:
 
             if self.lane_visualization:
                 # Display frame with detected lane.
-                cv2.imshow(
-                    'DeepEye Dashboard', 
-                    cv2.resize(frame, (640, 480))
-                )
+                self.display(frame)
         
         # detect both objects and lane
         elif self.object_detection and self.lane_detection:
@@ -203,10 +231,7 @@ class DrivingAssistant:
                 (frame, self.threats) = self.object_detector.scan_road(original_frame, self.threats)
 
                 # Display frame with detected lane.
-                cv2.imshow(
-                    'DeepEye Dashboard', 
-                    cv2.resize(frame, (640, 480))
-                )
+                self.display(frame)
 
                 (_, self.threats) = self.lane_detector.detect_lane(original_frame, self.threats)
                 
@@ -216,10 +241,7 @@ class DrivingAssistant:
                 (frame, self.threats) = self.lane_detector.detect_lane(original_frame, self.threats)
 
                 # Display frame with detected lane.
-                cv2.imshow(
-                    'DeepEye Dashboard', 
-                    cv2.resize(frame, (640, 480))
-                )
+                self.display(frame)
 
                 (_, self.threats) = self.object_detector.scan_road(original_frame, self.threats)
 
@@ -229,10 +251,7 @@ class DrivingAssistant:
                 (frame, self.threats) = self.lane_detector.detect_lane(frame, self.threats)
 
                 # Display frame with detected lane.
-                cv2.imshow(
-                    'DeepEye Dashboard', 
-                    cv2.resize(frame, (640, 480))
-                )
+                self.display(frame)
 
             # skip visualization
             else:
@@ -245,44 +264,29 @@ class DrivingAssistant:
 
         
         if (self.frame_id % 10 == 0) and (self.diagnostic_mode):
-            # draw a box around the area scaned for for PEDESTRIAN/VEHICLES detection
-            visualization_utils.draw_bounding_box_on_image_array(
-                frame,
-                self.object_detector.roi["t"]/frame_height, 
-                self.object_detector.roi["l"]/frame_width, 
-                self.object_detector.roi["b"]/frame_height, 
-                self.object_detector.roi["r"]/frame_width,
-                color=(255, 255, 0), # BGR VALUE 
-                display_str_list=(' ROI ',))
-
-            # draw a box around the area scaned for collision warnings
-            visualization_utils.draw_bounding_box_on_image_array(
-                frame,
-                self.object_detector.roi["ct"]/frame_height, 
-                self.object_detector.roi["cl"]/frame_width, 
-                self.object_detector.roi["b"]/frame_height, 
-                self.object_detector.roi["cr"]/frame_width,
-                color=(255, 0, 255), # BGR VALUE 
-                display_str_list=(' COLLISION ROI ',))
-
-            # save a screen shot of the current frame after getting processed 
-            cv2.imwrite("test/post/" + str(self.frame_id/10) + ".jpg", frame)
+            with tracer.span('diagnostic_post'):
+                self.draw_roi(frame)
+
+                # save a screen shot of the current frame after getting processed 
+                cv2.imwrite("test/post/" + str(self.frame_id/10) + ".jpg", frame)
             
-            if self.threats["FAR_LEFT"] or self.threats["FAR_RIGHT"]:
-                OFF_LANE = 1
-            else:
-                OFF_LANE = 0
-
-            # append a new row to dataframe
-            self.data_frame = self.data_frame.append({
-                'FRAME_ID':         int(self.frame_id/10),
-                'PEDESTRIAN':       int(self.threats['PEDESTRIAN']),
-                'VEHICLES':         int(self.threats['VEHICLES']),
-                'BIKES':            int(self.threats['BIKES']),
-                'STOP_SIGN':        int(self.threats['STOP_SIGN']),
-                'TRAFFIC_LIGHT':    int(self.threats['TRAFFIC_LIGHT']),
-                'OFF_LANE':         int(OFF_LANE),
-                'COLLISION':        int(self.threats['COLLISION']),
-            }, ignore_index=True)
+                if self.threats["FAR_LEFT"] or self.threats["FAR_RIGHT"]:
+                    OFF_LANE = 1
+                else:
+                    OFF_LANE = 0
+
+                # append a new row to dataframe
+                self.data_frame = self.data_frame.append({
+                    'FRAME_ID':         int(self.frame_id/10),
+                    'PEDESTRIAN':       int(self.threats['PEDESTRIAN']),
+                    'VEHICLES':         int(self.threats['VEHICLES']),
+                    'BIKES':            int(self.threats['BIKES']),
+                    'STOP_SIGN':        int(self.threats['STOP_SIGN']),
+                    'TRAFFIC_LIGHT':    int(self.threats['TRAFFIC_LIGHT']),
+                    'OFF_LANE':         int(OFF_LANE),
+                    'COLLISION':        int(self.threats['COLLISION']),
+                }, ignore_index=True)
 
         self.frame_id += 1
+
+        return True
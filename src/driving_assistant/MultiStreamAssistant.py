@@ -0,0 +1,273 @@
+# coding: utf-8
+"""
+A multi-stream version of the DrivingAssistant, that watches several monitors/cameras at once
+(i.e. a front camera, a rear camera and two side cameras) using a single copy of the model.
+
+Each stream has its own frame source (and capture region), its own object/lane detection flags,
+its own region of interest and its own threats dictionary and frame rate.
+All the streams share the same tensorflow session, and a scheduler decides which streams get processed on each run():
+    - 'priority': every stream that is due on this tick, in order of priority.
+        A stream is due every (interval) ticks, i.e. the front camera every frame (interval = 1)
+        and the side cameras every third frame (interval = 3).
+    - 'round_robin': a single stream per run(), one after the other (intervals and priorities are ignored).
+
+Note: a stream only reads a frame when it gets processed. Screen captures always return the latest frame,
+while recorded videos get replayed slower than real time when their stream is not processed on every tick.
+
+- Usage:
+    streams = [
+        Stream('front', capture_utils.ScreenSource(monitor_id = 1), priority = 1),
+        Stream('left', capture_utils.ScreenSource(monitor_id = 2), lane_detection = False, interval = 3),
+        Stream('right', capture_utils.ScreenSource(monitor_id = 3), lane_detection = False, interval = 3),
+    ]
+    driving_assistant = MultiStreamAssistant(classifier_codename, dataset_codename, classifier_threshold, streams)
+    driving_assistant.setup()
+    while driving_assistant.run():
+        for stream in driving_assistant.streams:
+            print(stream.name, stream.frame_rate(), stream.threats)
+    driving_assistant.release()
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import collections
+import time
+
+import profiling.trace_utils as tracer
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+SCHEDULES = ('priority', 'round_robin')
+
+# number of processed frames that the frame rate of each stream is averaged over
+FRAME_RATE_WINDOW = 30
+# ---------------------------------------------------------------------------- #
+
+
+class FrameRateCounter:
+    """
+    Measure the frame rate over the last (window) frames.
+    """
+    def __init__(self, window = FRAME_RATE_WINDOW):
+        self.timestamps = collections.deque(maxlen = window)
+
+
+    def tick(self):
+        self.timestamps.append(time.perf_counter())
+
+
+    def frame_rate(self):
+        if len(self.timestamps) < 2:
+            return 0.0
+
+        elapsed_time = self.timestamps[-1] - self.timestamps[0]
+
+        return (len(self.timestamps) - 1) / elapsed_time if elapsed_time > 0 else 0.0
+
+
+class Stream:
+    """
+    - name: name of the stream (i.e. 'front', 'rear')
+    - frame_source: any object with a read() method that returns BGR frames (see capture_utils.py),
+        i.e. capture_utils.ScreenSource(monitor_id = 2, window_top_offset = 100)
+    - object_detection / lane_detection: Boolean flags to run each detector on this stream
+    - interval: process this stream every (interval) ticks (used by the 'priority' schedule)
+    - priority: streams with a higher priority are processed first (used by the 'priority' schedule)
+    - roi: overrides the boundaries of the object detector's region of interest (see ObjectClassifier.roi),
+        i.e. {"t": 0, "b": 360} to scan the whole height of a 360px side camera
+    """
+    def __init__(self,
+        name,
+        frame_source,
+        object_detection = True,
+        lane_detection = True,
+        interval = 1,
+        priority = 0,
+        roi = None):
+
+        if interval < 1:
+            raise ValueError('The interval of a stream must be at least 1: ' + name)
+
+        self.name = name
+        self.frame_source = frame_source
+        self.object_detection = object_detection
+        self.lane_detection = lane_detection
+        self.interval = interval
+        self.priority = priority
+        self.roi = roi
+
+        # detectors of this stream (created by the MultiStreamAssistant)
+        self.object_detector = None
+        self.lane_detector = None
+
+        self.threats = {
+            "COLLISION": False,
+            "PEDESTRIAN": False,
+            "STOP_SIGN": False,
+            "TRAFFIC_LIGHT": False,
+            "VEHICLES": False,
+            "BIKES": False,
+            "FAR_LEFT": False,
+            "FAR_RIGHT": False,
+            "RIGHT": False,
+            "LEFT": False,
+            "CENTER": False,
+            "UNKNOWN": True
+        }
+
+        self.frame_id = 0
+        self.frame_rate_counter = FrameRateCounter()
+
+        # set once the frame source runs out of frames
+        self.finished = False
+
+
+    def frame_rate(self):
+        return self.frame_rate_counter.frame_rate()
+
+
+class MultiStreamAssistant:
+    """
+    - classifier_codename, dataset_codename, classifier_threshold: the shared model (see ObjectClassifier)
+    - streams: a list of Stream objects
+    - schedule: 'priority' or 'round_robin' (see above)
+    """
+    # Constructor
+    def __init__(self,
+        classifier_codename,
+        dataset_codename,
+        classifier_threshold,
+        streams,
+        schedule = 'priority'):
+
+        if schedule not in SCHEDULES:
+            raise ValueError('Unknown schedule: {} (expected one of {})'.format(schedule, ', '.join(SCHEDULES)))
+
+        if len(set(stream.name for stream in streams)) != len(streams):
+            raise ValueError('Every stream must have a unique name')
+
+        from object_classifier.ObjectClassifier import ObjectClassifier
+        from lane_detector.LaneDetector import LaneDetector
+
+        self.streams = list(streams)
+        self.schedule = schedule
+
+        object_streams = [stream for stream in self.streams if stream.object_detection]
+
+        # the optimized graphs are built for a single frame size (see graph_utils.py)
+        frame_sizes = set((stream.frame_source.height, stream.frame_source.width) for stream in object_streams)
+
+        for stream in self.streams:
+            if stream.object_detection:
+                # each stream gets its own ObjectClassifier for its frame size and ROI,
+                # but they all share the session loaded by setup()
+                stream.object_detector = ObjectClassifier(
+                    classifier_codename = classifier_codename,
+                    dataset_codename = dataset_codename,
+                    classifier_threshold = classifier_threshold,
+                    frame_height = stream.frame_source.height,
+                    frame_width = stream.frame_source.width,
+                    use_optimized_graph = len(frame_sizes) == 1)
+
+                if stream.roi:
+                    stream.object_detector.roi.update(stream.roi)
+
+            if stream.lane_detection:
+                # the lane detector keeps track of the lane across frames, so it can't be shared
+                stream.lane_detector = LaneDetector(visualization = False)
+
+        self.tick = 0
+        self.next_stream = 0
+
+
+    def setup(self):
+        """
+        Load the model once, and share its session with the object detector of every stream.
+        """
+        object_detectors = [stream.object_detector for stream in self.streams if stream.object_detection]
+
+        if not object_detectors:
+            return
+
+        shared_detector = object_detectors[0]
+        shared_detector.setup()
+
+        for object_detector in object_detectors[1:]:
+            object_detector.detection_graph = shared_detector.detection_graph
+            object_detector.categories_dict = shared_detector.categories_dict
+            object_detector.sess = shared_detector.sess
+
+
+    def scheduled_streams(self):
+        """
+        Return the streams to be processed on the current tick.
+        """
+        active_streams = [stream for stream in self.streams if not stream.finished]
+
+        if not active_streams:
+            return []
+
+        if self.schedule == 'round_robin':
+            stream = active_streams[self.next_stream % len(active_streams)]
+            self.next_stream = (self.next_stream + 1) % len(active_streams)
+            return [stream]
+
+        due_streams = [stream for stream in active_streams if self.tick % stream.interval == 0]
+
+        return sorted(due_streams, key=lambda stream: -stream.priority)
+
+
+    def process(self, stream):
+        """
+        Capture a frame from the given stream, and run its detectors on it.
+        """
+        with tracer.span('capture'):
+            frame = stream.frame_source.read()
+
+        if frame is None:
+            stream.finished = True
+            return
+
+        if stream.object_detection:
+            (_, stream.threats) = stream.object_detector.scan_road(frame, stream.threats)
+
+        if stream.lane_detection:
+            (_, stream.threats) = stream.lane_detector.detect_lane(frame, stream.threats)
+
+        stream.frame_id += 1
+        stream.frame_rate_counter.tick()
+
+
+    @tracer.traced('MultiStreamAssistant.run')
+    def run(self):
+        """
+        Process the streams scheduled for the current tick.
+        Return False once every stream ran out of frames.
+        """
+        for stream in self.scheduled_streams():
+            with tracer.span('process_stream', stream = stream.name):
+                self.process(stream)
+
+        self.tick += 1
+
+        return not all(stream.finished for stream in self.streams)
+
+
+    def threats(self):
+        """
+        Return a dictionary of stream name => threats dictionary.
+        """
+        return {stream.name: stream.threats for stream in self.streams}
+
+
+    def frame_rates(self):
+        """
+        Return a dictionary of stream name => frame rate (frames/sec processed).
+        """
+        return {stream.name: stream.frame_rate() for stream in self.streams}
+
+
+    def release(self):
+        for stream in self.streams:
+            stream.frame_source.release()
@@ -0,0 +1,277 @@
+# coding: utf-8
+"""
+A multi-process version of the DrivingAssistant.
+
+The DrivingAssistant runs the object and lane detectors one after the other on a single thread,
+where they also contend on the GIL with the GUI and the capture. In this mode:
+    - a capture process writes the frames into a ring of slots in shared memory (see frame_ring_utils.py),
+    - the object detector and the lane detector run in separate worker processes (on separate cores),
+      and read the latest frame straight from the shared memory (zero-copy),
+    - only the small threat dictionaries are sent back to the main process over a pipe.
+
+Each worker always processes the latest captured frame, so a slow object detector never holds back the lane detector.
+
+Note: the frames are shared read-only between the workers, so nothing gets drawn onto them in this mode
+(object/lane visualization and the diagnostic mode are only available in the DrivingAssistant).
+
+- Usage:
+    driving_assistant = ParallelDrivingAssistant(classifier_codename, dataset_codename, classifier_threshold)
+    driving_assistant.start()
+    while driving_assistant.run():
+        print(driving_assistant.threats)
+    driving_assistant.stop()
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import functools
+import multiprocessing
+import multiprocessing.connection
+import time
+
+import driving_assistant.capture_utils as capture_utils
+from driving_assistant.frame_ring_utils import FrameRing
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+# how long (in seconds) a worker sleeps while waiting for a new frame
+POLL_INTERVAL = 0.002
+
+# how long (in seconds) run() waits for new results from the workers
+RESULT_TIMEOUT = 0.1
+
+# how long (in seconds) stop() waits for each process to exit before terminating it
+JOIN_TIMEOUT = 5.0
+# ---------------------------------------------------------------------------- #
+
+
+# Worker processes
+# ---------------------------------------------------------------------------- #
+def capture_worker(source_factory, ring_spec, stop_event):
+    """
+    Capture frames and write them into the ring until the source runs out of frames (or stop() is called).
+    """
+    ring = FrameRing(*ring_spec)
+    frame_source = source_factory()
+
+    try:
+        while not stop_event.is_set():
+            frame = frame_source.read()
+            if frame is None:
+                break
+
+            ring.write(frame)
+    finally:
+        ring.close_writer()
+        frame_source.release()
+        ring.close()
+
+
+def detection_worker(detector_factory, name, ring_spec, reader_id, connection, stop_event):
+    """
+    Run a detector over the latest frame in the ring, and send back (name, frame number, threats dictionary).
+
+    - detector_factory: returns a function (frame => threats dictionary), called once in the worker process
+    """
+    ring = FrameRing(*ring_spec)
+    detect = detector_factory(ring.height, ring.width)
+
+    last_number = 0
+
+    try:
+        while not stop_event.is_set():
+            last_number, frame = ring.acquire(reader_id, last_number)
+
+            if frame is None:
+                # every frame was processed
+                if ring.closed:
+                    break
+
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            try:
+                threats = detect(frame)
+            finally:
+                del frame
+                ring.release(reader_id)
+
+            connection.send((name, last_number, threats))
+    finally:
+        connection.close()
+        ring.close()
+
+
+def object_detector_factory(classifier_codename, dataset_codename, classifier_threshold, frame_height, frame_width):
+    from object_classifier.ObjectClassifier import ObjectClassifier
+
+    object_detector = ObjectClassifier(
+        classifier_codename = classifier_codename,
+        dataset_codename = dataset_codename,
+        classifier_threshold = classifier_threshold,
+        frame_height = frame_height,
+        frame_width = frame_width)
+
+    object_detector.setup()
+
+    return lambda frame: object_detector.scan_road(frame, {})[1]
+
+
+def lane_detector_factory(frame_height, frame_width):
+    from lane_detector.LaneDetector import LaneDetector
+
+    lane_detector = LaneDetector(visualization = False)
+
+    return lambda frame: lane_detector.detect_lane(frame, {})[1]
+# ---------------------------------------------------------------------------- #
+
+
+class ParallelDrivingAssistant:
+    """
+    - object_detection / lane_detection: Boolean flags to run each detector (in its own process)
+    - monitor_id, window_*: region of the screen to be captured (same as the DrivingAssistant)
+    - source_factory: Replace the screen capture with any other source of frames.
+        It's called once in the capture process (and once to get the frame size), so it needs to be picklable,
+        i.e. functools.partial(capture_utils.open_source, 'footage.mp4')
+    """
+    # Constructor
+    def __init__(self,
+        classifier_codename,
+        dataset_codename,
+        classifier_threshold,
+        object_detection = True,
+        lane_detection = True,
+        monitor_id = 1,
+        window_top_offset = 0,
+        window_left_offset = 0,
+        window_width = None,
+        window_height = None,
+        window_scale = 1.0,
+        source_factory = None):
+
+        if source_factory is None:
+            source_factory = functools.partial(capture_utils.ScreenSource,
+                monitor_id = monitor_id,
+                window_top_offset = window_top_offset,
+                window_left_offset = window_left_offset,
+                window_width = window_width,
+                window_height = window_height,
+                window_scale = window_scale)
+
+        self.source_factory = source_factory
+
+        self.detector_factories = []
+        if object_detection:
+            self.detector_factories.append(('objects', functools.partial(object_detector_factory,
+                classifier_codename, dataset_codename, classifier_threshold)))
+        if lane_detection:
+            self.detector_factories.append(('lane', lane_detector_factory))
+
+        self.threats = {
+            "COLLISION": False,
+            "PEDESTRIAN": False,
+            "STOP_SIGN": False,
+            "TRAFFIC_LIGHT": False,
+            "VEHICLES": False,
+            "BIKES": False,
+            "FAR_LEFT": False,
+            "FAR_RIGHT": False,
+            "RIGHT": False,
+            "LEFT": False,
+            "CENTER": False,
+            "UNKNOWN": True
+        }
+
+        # number of the latest frame processed by each worker
+        self.frame_ids = {name: 0 for (name, _) in self.detector_factories}
+        self.frame_id = 0
+
+        self.ring = None
+        self.stop_event = None
+        self.processes = []
+        self.connections = []
+
+
+    def start(self):
+        """
+        Create the frame ring, then start the capture process and a worker process for each detector.
+        """
+        # the frame size is needed to allocate the ring before the capture process starts
+        frame_source = self.source_factory()
+        frame_height, frame_width = frame_source.height, frame_source.width
+        frame_source.release()
+
+        self.ring = FrameRing(frame_height, frame_width,
+            num_readers = len(self.detector_factories),
+            lock = multiprocessing.Lock())
+
+        self.stop_event = multiprocessing.Event()
+        senders = []
+
+        for (reader_id, (name, detector_factory)) in enumerate(self.detector_factories):
+            receiver, sender = multiprocessing.Pipe(duplex = False)
+
+            self.processes.append(multiprocessing.Process(target = detection_worker,
+                args = (detector_factory, name, self.ring.spec(), reader_id, sender, self.stop_event),
+                name = name + '_worker',
+                daemon = True))
+            self.connections.append(receiver)
+            senders.append(sender)
+
+        self.processes.append(multiprocessing.Process(target = capture_worker,
+            args = (self.source_factory, self.ring.spec(), self.stop_event),
+            name = 'capture_worker',
+            daemon = True))
+
+        for process in self.processes:
+            process.start()
+
+        # the sending ends now belong to the workers (a pipe reports EOF once its worker exits)
+        for sender in senders:
+            sender.close()
+
+
+    def run(self, timeout = RESULT_TIMEOUT):
+        """
+        Wait for new results from the workers (up to timeout seconds), and merge them into the threats dictionary.
+        Return False once every worker is done (i.e. the source ran out of frames).
+        """
+        for connection in multiprocessing.connection.wait(self.connections, timeout):
+            try:
+                name, frame_number, threats = connection.recv()
+            except EOFError:
+                self.connections.remove(connection)
+                continue
+
+            self.threats.update(threats)
+            self.frame_ids[name] = frame_number
+
+        self.frame_id = max(self.frame_ids.values()) if self.frame_ids else 0
+
+        return bool(self.connections)
+
+
+    def stop(self):
+        """
+        Stop every process, then free the shared memory.
+        """
+        # never started (or already stopped)
+        if self.ring is None:
+            return
+
+        self.stop_event.set()
+
+        for process in self.processes:
+            process.join(JOIN_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+
+        for connection in self.connections:
+            connection.close()
+
+        self.processes, self.connections = [], []
+
+        self.ring.close()
+        self.ring.unlink()
+        self.ring = None
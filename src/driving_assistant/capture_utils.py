@@ -0,0 +1,156 @@
+# coding: utf-8
+"""
+Frame sources used by the DrivingAssistant to get the frames that will be processed.
+
+Each source returns BGR frames (as Numpy arrays) through its read() method,
+and returns None once there are no more frames to be read.
+
+- ScreenSource: captures a given monitor (or a region of it) using (MSS)
+    For more information about MSS-API refer to http://python-mss.readthedocs.io/examples.html
+
+- VideoSource: replays a recorded video file frame by frame using (cv2.VideoCapture)
+
+- FrameDirectorySource: replays a directory of images (sorted by their file names)
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import numpy as np
+import cv2
+import glob
+import os
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+# ---------------------------------------------------------------------------- #
+
+
+class ScreenSource:
+    """
+    Capture frames from the screen.
+
+    - monitor_id: ID of the monitor to be captured
+        - monitor_id = 0 | grab all monitors together
+        - monitor_id = n | grab a given monitor (n) : where n > 0
+    - window_top_offset: Top Offset in pixels (0 by default)
+    - window_left_offset: Left Offset in pixels (0 by default)
+    - window_width: The desired width of the captured window (full width of the given monitor by default)
+    - window_height: The desired height of the captured window (full height of the given monitor by default)
+    - window_scale: A scaling factor for the captured window (1.0 by default)
+    """
+    def __init__(self,
+        monitor_id = 1,
+        window_top_offset = 0,
+        window_left_offset = 0,
+        window_width = None,
+        window_height = None,
+        window_scale = 1.0):
+
+        import mss
+
+        # Instance of the MSS-API for captureing screenshots
+        self.window_manager = mss.mss()
+
+        self.target_window = dict(self.window_manager.monitors[monitor_id])
+
+        # Update position of the window that will be captured
+        if window_left_offset:
+            self.target_window['left'] += window_left_offset
+            self.target_window['width'] -= window_left_offset
+        if window_top_offset:
+            self.target_window['top'] += window_top_offset
+            self.target_window['height'] -= window_top_offset
+        if window_width:
+            self.target_window['width'] = window_width
+        if window_height:
+            self.target_window['height'] = window_height
+        if window_scale:
+            self.target_window['scale'] = window_scale
+
+        self.height = self.target_window['height']
+        self.width = self.target_window['width']
+
+
+    def read(self):
+        # Get raw pixels from the screen, save it to a Numpy array
+        frame = np.asarray(self.window_manager.grab(self.target_window))
+
+        # convert pixels from BGRA to BGR values
+        return cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+
+
+    def release(self):
+        self.window_manager.close()
+
+
+class VideoSource:
+    """
+    Replay a recorded video file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.capture = cv2.VideoCapture(path)
+
+        if not self.capture.isOpened():
+            raise IOError('Unable to open video file: ' + path)
+
+        self.height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+
+
+    def read(self):
+        success, frame = self.capture.read()
+
+        if not success:
+            return None
+
+        return frame
+
+
+    def release(self):
+        self.capture.release()
+
+
+class FrameDirectorySource:
+    """
+    Replay a directory of images sorted by their file names.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.frame_paths = sorted(
+            frame_path for frame_path in glob.glob(os.path.join(path, '*'))
+            if frame_path.lower().endswith(IMAGE_EXTENSIONS))
+
+        if not self.frame_paths:
+            raise IOError('No frames were found in: ' + path)
+
+        self.frame_index = 0
+
+        # all frames are expected to have the same size as the first one
+        self.height, self.width = cv2.imread(self.frame_paths[0]).shape[:2]
+
+
+    def read(self):
+        if self.frame_index >= len(self.frame_paths):
+            return None
+
+        frame = cv2.imread(self.frame_paths[self.frame_index])
+        self.frame_index += 1
+
+        return frame
+
+
+    def release(self):
+        pass
+
+
+def open_source(path):
+    """
+    Return a frame source for a given video file or directory of images.
+    """
+    if os.path.isdir(path):
+        return FrameDirectorySource(path)
+
+    return VideoSource(path)
@@ -0,0 +1,169 @@
+# coding: utf-8
+"""
+A ring of fixed-size frame slots in shared memory, used to pass the captured frames to the worker processes
+of the ParallelDrivingAssistant without pickling or copying them.
+
+- Layout of the shared memory block:
+    [header: latest slot, latest frame number, closed flag, pinned slot of each reader][slot 0][slot 1]...[slot n-1]
+    Each slot holds a single BGR frame (height x width x 3 bytes).
+
+- Writer (the capture process):
+    Copies each frame into a slot that is neither the latest one nor pinned by any reader,
+    then publishes it as the latest frame.
+
+- Readers (the detection workers):
+    Pin the latest slot, and get a read-only view of it (zero-copy). The slot won't be overwritten
+    until the reader releases it, so the frame never changes while it's being processed.
+    Readers always get the latest frame, and skip any frames they were too slow to process.
+
+    Note: with (num_readers + 2) slots, the writer always finds a free slot and never waits for the readers.
+    The lock is only held to update the header, never while copying or processing frames.
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import sys
+import numpy as np
+
+if sys.version_info < (3, 8):
+    raise ImportError('The frame ring (and the ParallelDrivingAssistant) needs Python 3.8+ for multiprocessing.shared_memory, '
+        'found Python {}.{}'.format(*sys.version_info[:2]))
+
+from multiprocessing import shared_memory
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+# header fields
+LATEST_SLOT, LATEST_NUMBER, CLOSED = 0, 1, 2
+HEADER_FIELDS = 3
+
+# frames start at a cache line boundary
+ALIGNMENT = 64
+
+NOT_PINNED = -1
+# ---------------------------------------------------------------------------- #
+
+
+class FrameRing:
+    """
+    - height, width: size of the frames
+    - num_readers: number of processes reading frames from the ring
+    - lock: a multiprocessing.Lock shared by the writer and the readers
+    - name: name of an existing ring to attach to (a new ring is created by default)
+
+    Note: the process that created the ring should unlink() it once every other process is done with it.
+    """
+    def __init__(self,
+        height,
+        width,
+        num_readers,
+        lock,
+        name = None):
+
+        self.height, self.width = height, width
+        self.num_readers = num_readers
+        self.num_slots = num_readers + 2
+        self.lock = lock
+
+        header_size = -(-(HEADER_FIELDS + num_readers) * 8 // ALIGNMENT) * ALIGNMENT
+        slot_size = height * width * 3
+
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create = True, size = header_size + self.num_slots * slot_size)
+        else:
+            # Note: the worker processes share the resource tracker of the process that created the ring,
+            # so attaching to it doesn't take ownership of the shared memory
+            self.memory = shared_memory.SharedMemory(name = name)
+
+        self.name = self.memory.name
+
+        self.header = np.ndarray((HEADER_FIELDS + num_readers,), dtype=np.int64, buffer=self.memory.buf)
+        self.pins = self.header[HEADER_FIELDS:]
+        self.frames = np.ndarray((self.num_slots, height, width, 3), dtype=np.uint8,
+            buffer=self.memory.buf, offset=header_size)
+
+        if name is None:
+            self.header[LATEST_SLOT] = NOT_PINNED
+            self.header[LATEST_NUMBER] = 0
+            self.header[CLOSED] = 0
+            self.pins[:] = NOT_PINNED
+
+
+    def spec(self):
+        """
+        Return the arguments needed to attach to this ring from another process: FrameRing(*ring.spec())
+        """
+        return (self.height, self.width, self.num_readers, self.lock, self.name)
+
+
+    # Writer
+    # ------------------------------------------------------------------------ #
+    def write(self, frame):
+        """
+        Copy a frame into a free slot, and publish it as the latest frame. Return its frame number.
+        """
+        with self.lock:
+            pinned = set(self.pins.tolist())
+            pinned.add(int(self.header[LATEST_SLOT]))
+            slot = next(slot for slot in range(self.num_slots) if slot not in pinned)
+
+        np.copyto(self.frames[slot], frame)
+
+        with self.lock:
+            number = int(self.header[LATEST_NUMBER]) + 1
+            self.header[LATEST_SLOT] = slot
+            self.header[LATEST_NUMBER] = number
+
+        return number
+
+
+    def close_writer(self):
+        """
+        Let the readers know that no more frames will be written.
+        """
+        self.header[CLOSED] = 1
+
+
+    # Readers
+    # ------------------------------------------------------------------------ #
+    @property
+    def closed(self):
+        return bool(self.header[CLOSED])
+
+
+    def acquire(self, reader_id, last_number = 0):
+        """
+        Pin the latest frame if it's newer than (last_number).
+        Return (frame number, read-only view of the frame), or (last_number, None) if there's no newer frame.
+        """
+        with self.lock:
+            number = int(self.header[LATEST_NUMBER])
+            if number <= last_number:
+                return last_number, None
+
+            slot = int(self.header[LATEST_SLOT])
+            self.pins[reader_id] = slot
+
+        frame = self.frames[slot]
+        frame.flags.writeable = False
+
+        return number, frame
+
+
+    def release(self, reader_id):
+        """
+        Unpin the frame acquired by the given reader.
+        """
+        self.pins[reader_id] = NOT_PINNED
+
+
+    # ------------------------------------------------------------------------ #
+    def close(self):
+        # numpy views must be released before the shared memory gets closed
+        del self.header, self.pins, self.frames
+        self.memory.close()
+
+
+    def unlink(self):
+        self.memory.unlink()
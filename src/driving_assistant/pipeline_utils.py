@@ -0,0 +1,59 @@
+# coding: utf-8
+"""
+Helpers used to pass data between the processing loop and the user interface,
+which run on separate threads.
+
+- Mailbox: a lock-free single-slot mailbox
+    The processing loop publishes the latest snapshot (i.e. threats dictionary, frame rate)
+    and the GUI thread polls it at its own display rate.
+    Snapshots that were never read get overwritten, so the GUI always shows the latest state
+    and the processing loop never waits for the GUI.
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import itertools
+# ---------------------------------------------------------------------------- #
+
+
+class Mailbox:
+    """
+    A single-slot mailbox with one writer and one reader.
+
+    Note: the slot holds a (sequence number, item) tuple that gets replaced as a whole,
+    and assigning/reading a single attribute is atomic in CPython, so no locks are needed.
+    """
+    def __init__(self):
+        self.counter = itertools.count(1)
+        self.slot = (0, None)
+
+        # sequence number of the last item read
+        self.last_read = 0
+
+
+    def put(self, item):
+        """
+        Publish a new item (overwrites any unread item).
+        """
+        self.slot = (next(self.counter), item)
+
+
+    def get(self):
+        """
+        Return the latest item, or None if nothing new was published since the last call.
+        """
+        sequence, item = self.slot
+
+        if sequence == self.last_read:
+            return None
+
+        self.last_read = sequence
+
+        return item
+
+
+    def peek(self):
+        """
+        Return the latest item whether it was read before or not.
+        """
+        return self.slot[1]
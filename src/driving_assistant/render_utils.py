@@ -0,0 +1,127 @@
+# coding: utf-8
+"""
+The render stage of the DrivingAssistant: draws the regions of interest onto the frames and resizes them for the dashboard.
+
+- ROI overlay:
+    The boxes around the regions of interest (and their labels) only depend on the size of the frame,
+    so they are drawn once into a cached overlay (and a mask of the pixels drawn), then copied onto each frame in place,
+    only within the area covered by the boxes. No conversion to PIL (and back) is needed for each frame.
+    The overlay is re-drawn only if the frame size or the regions of interest change.
+
+- Dashboard:
+    The frames are resized into a persistent buffer (640x480 by default), instead of a new array for each frame,
+    using a cheap interpolation (nearest neighbor by default).
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import numpy as np
+import cv2
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+DASHBOARD_SIZE = (640, 480)
+
+# boxes drawn around the regions of interest: (label, color, ROI keys of the top/left/bottom/right boundaries)
+ROI_BOXES = (
+    (' ROI ', (255, 255, 0), ('t', 'l', 'b', 'r')),                 # BGR VALUE
+    (' COLLISION ROI ', (255, 0, 255), ('ct', 'cl', 'b', 'cr')),    # BGR VALUE
+)
+
+LINE_THICKNESS = 4
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.6
+FONT_THICKNESS = 1
+# ---------------------------------------------------------------------------- #
+
+
+def draw_labeled_box(image, top, left, bottom, right, color, label, text_color = (0, 0, 0), thickness = LINE_THICKNESS):
+    """
+    Draw a box onto the given image, with its label in black text on a rectangle filled with the same color
+    above the box (or below it, if there's no room above it).
+    """
+    height, width = image.shape[:2]
+    top, left, bottom, right = int(top), int(left), int(min(bottom, height - 1)), int(min(right, width - 1))
+
+    cv2.rectangle(image, (left, top), (right, bottom), color, thickness)
+
+    (text_width, text_height), baseline = cv2.getTextSize(label, FONT, FONT_SCALE, FONT_THICKNESS)
+    margin = int(np.ceil(0.05 * text_height)) + 2
+    label_height = text_height + baseline + 2 * margin
+
+    if top > label_height:
+        label_bottom = top
+    else:
+        label_bottom = min(bottom + label_height, height - 1)
+
+    cv2.rectangle(image, (left, label_bottom - label_height), (left + text_width + 2 * margin, label_bottom), color, cv2.FILLED)
+    cv2.putText(image, label, (left + margin, label_bottom - baseline - margin),
+        FONT, FONT_SCALE, text_color, FONT_THICKNESS, cv2.LINE_AA)
+
+
+class DashboardRenderer:
+    """
+    - dashboard_size: (width, height) of the frames shown on the dashboard
+    - interpolation: OpenCV interpolation used to resize the frames (i.e. cv2.INTER_AREA for a smoother result)
+    """
+    def __init__(self,
+        dashboard_size = DASHBOARD_SIZE,
+        interpolation = cv2.INTER_NEAREST):
+
+        self.dashboard_size = dashboard_size
+        self.interpolation = interpolation
+
+        # persistent buffer that every frame gets resized into
+        self.dashboard_frame = np.zeros((dashboard_size[1], dashboard_size[0], 3), dtype=np.uint8)
+
+        # cached ROI overlay: (frame shape, ROI boundaries) => (area covered by the boxes, overlay, mask)
+        self.overlay_key = None
+        self.overlay = None
+
+
+    def roi_overlay(self, frame_shape, roi):
+        """
+        Return (area covered by the boxes, overlay, mask) for the given frame size and regions of interest,
+        drawing them only if they changed since the last call.
+        """
+        key = (frame_shape, tuple(sorted(roi.items())))
+
+        if key != self.overlay_key:
+            overlay = np.zeros(frame_shape, dtype=np.uint8)
+            mask = np.zeros(frame_shape[:2], dtype=np.uint8)
+
+            for (label, color, (top, left, bottom, right)) in ROI_BOXES:
+                draw_labeled_box(overlay, roi[top], roi[left], roi[bottom], roi[right], color, label)
+                # the (black) text of the labels is part of the overlay as well
+                draw_labeled_box(mask, roi[top], roi[left], roi[bottom], roi[right], 255, label, text_color = 255)
+
+            # only the area covered by the boxes gets copied onto each frame
+            x, y, width, height = cv2.boundingRect(mask)
+            area = (slice(y, y + height), slice(x, x + width))
+
+            self.overlay_key = key
+            self.overlay = (area, overlay[area].copy(), mask[area].astype(bool)[..., np.newaxis])
+
+        return self.overlay
+
+
+    def draw_roi(self, frame, roi):
+        """
+        Draw boxes around the regions of interest onto the given frame (in place).
+        """
+        area, overlay, mask = self.roi_overlay(frame.shape, roi)
+        np.copyto(frame[area], overlay, where=mask)
+
+        return frame
+
+
+    def resize(self, frame):
+        """
+        Resize the given frame into the dashboard buffer, and return the buffer.
+
+        Note: the buffer gets overwritten by the next call.
+        """
+        cv2.resize(frame, self.dashboard_size, dst=self.dashboard_frame, interpolation=self.interpolation)
+
+        return self.dashboard_frame
@@ -0,0 +1,105 @@
+# coding: utf-8
+"""
+Helpers used to split the cores of the host between tensorflow, OpenCV and the rest of DeepEye.
+
+By default, tensorflow creates as many intra-op/inter-op threads as there are cores,
+and so does OpenCV, so the object detector and the lane detector end up oversubscribing the same cores.
+
+- CPU affinity: restrict the whole process to a given set of cores (i.e. to keep other cores free for the GUI/capture)
+- OpenCV threads: limit the number of threads used by OpenCV functions (i.e. the lane detector)
+- The tensorflow thread pools are configured through the ObjectClassifier (intra_op_threads, inter_op_threads).
+
+See profiling/thread_tuner.py to find the best split for a given host.
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import os, sys
+import cv2
+# ---------------------------------------------------------------------------- #
+
+
+def parse_cpu_list(value):
+    """
+    Parse a list of cores in the format used by taskset/cgroups, i.e. '0-3,6' => [0, 1, 2, 3, 6]
+    """
+    cpus = set()
+
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+
+    return sorted(cpus)
+
+
+def available_cpus():
+    """
+    Return the list of cores the current process is allowed to run on.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+
+    try:
+        import psutil
+        return sorted(psutil.Process().cpu_affinity())
+    except (ImportError, AttributeError):
+        return list(range(os.cpu_count() or 1))
+
+
+def set_cpu_affinity(cpus):
+    """
+    Restrict the current process (every thread of it) to the given list of cores.
+    Return False if CPU affinity is not supported on this platform (i.e. macOS).
+    """
+    cpus = sorted(set(cpus))
+
+    if hasattr(os, 'sched_setaffinity'):
+        # sched_setaffinity only applies to a single thread on Linux,
+        # so it's applied to every running thread (new threads inherit it from their parent)
+        thread_ids = [0]
+        if os.path.isdir('/proc/self/task'):
+            thread_ids += [int(thread_id) for thread_id in os.listdir('/proc/self/task')]
+
+        for thread_id in thread_ids:
+            try:
+                os.sched_setaffinity(thread_id, cpus)
+            except ProcessLookupError:
+                # the thread exited in the meantime
+                pass
+
+        return True
+
+    try:
+        import psutil
+        psutil.Process().cpu_affinity(cpus)
+        return True
+    except (ImportError, AttributeError):
+        print('-- CPU affinity is not supported on this platform ({}), skipping it'.format(sys.platform))
+        return False
+
+
+def set_opencv_threads(num_threads):
+    """
+    Set the number of threads used by OpenCV (0 disables its threading optimizations, -1 restores the default).
+    """
+    cv2.setNumThreads(num_threads)
+
+
+def configure_threads(cpu_affinity = None, opencv_threads = None):
+    """
+    Apply the given settings to the current process (settings left as None are not changed).
+    """
+    if cpu_affinity is not None:
+        if isinstance(cpu_affinity, str):
+            cpu_affinity = parse_cpu_list(cpu_affinity)
+        set_cpu_affinity(cpu_affinity)
+
+    if opencv_threads is not None:
+        set_opencv_threads(opencv_threads)
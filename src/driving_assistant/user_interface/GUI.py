@@ -4,12 +4,17 @@
 # libraries and dependencies
 # ---------------------------------------------------------------------------- #
 import sys, os, threading, time, cv2, keyboard
-import pandas as pd
 
 import driving_assistant.user_interface.gui_utils as gui_utils
-from driving_assistant.DrivingAssistant import *
+import driving_assistant.pipeline_utils as pipeline_utils
+import object_classifier.graph_utils as graph_utils
+import profiling.trace_utils as tracer
 from winsound import *
 
+# Note: the DrivingAssistant (and with it tensorflow and the object_detection package) is imported
+# on a background thread once the user picks a classifier (see preload_model), or when Run is pressed,
+# so that the GUI appears right away
+
 try:
     from Tkinter import *
 except ImportError:
@@ -28,6 +33,32 @@ except ImportError:
 # ---------------------------------------------------------------------------- #
 FOLDER_PATH = os.path.join(os.getcwd(), 'driving_assistant', 'user_interface')
 
+# How often (in milliseconds) the warning interface gets refreshed
+DISPLAY_INTERVAL = 33
+
+# Label of the reduced-precision (8-bit weights) version of each classifier
+QUANTIZED_LABEL = ' (8-bit)'
+
+def preload_model(classifier, dataset, mid, top, left, width, height):
+    '''Download/load the given classifier in the background, so that it's ready by the time the user hits Run.
+       The frame size is needed to pick the same graph that the DrivingAssistant will load (see ObjectClassifier.graph_path).'''
+    import driving_assistant.capture_utils as capture_utils
+    from object_classifier.ObjectClassifier import ObjectClassifier
+
+    frame_source = capture_utils.ScreenSource(
+        monitor_id = mid,
+        window_top_offset = top,
+        window_left_offset = left,
+        window_width = width,
+        window_height = height)
+    frame_source.release()
+
+    ObjectClassifier(
+        classifier_codename = classifier,
+        dataset_codename = dataset,
+        frame_height = frame_source.height,
+        frame_width = frame_source.width).preload()
+
 def start_gui():
     '''Starting point when module is the main routine.'''
     global val, w, root
@@ -59,6 +90,7 @@ class Window:
     def __init__(self, top=None):
         '''This class configures and populates the toplevel window.
            top is the toplevel containing window.'''
+        self.top = top
         _bgcolor = '#0A121C'  
         _fgcolor = '#ffffff'
         _lbcolor = '#A3EFF2'  
@@ -391,6 +423,7 @@ class Window:
         self.ObjectDetectionCheck.configure(justify=LEFT)
         self.ObjectDetectionCheck.configure(text='''Enable Object Detection?                        ''')
         self.ObjectDetectionCheck.configure(variable=gui_utils.ObjectDetection)
+        self.ObjectDetectionCheck.configure(command=self.preloadModel)
 
         self.LaneDetectionCheck = Checkbutton(self.CustomizationFrame, fg=_fgcolor, bg=_bgcolor)
         self.LaneDetectionCheck.place(relx=0.08, rely=0.21, relheight=0.15, relwidth=0.85)
@@ -451,11 +484,13 @@ class Window:
         self.ClassifierCode = ttk.Combobox(self.DatasetFrame)
         self.ClassifierCode.place(relx=0.3, rely=0.1, relheight=0.15, relwidth=0.58)
         self.value_list = ['Nas','Inception-Resnet','Resnet101',]
+        self.value_list += [classifier + QUANTIZED_LABEL for classifier in self.value_list]
         self.ClassifierCode.configure(values=self.value_list)
         self.ClassifierCode.configure(textvariable=gui_utils.ClassiferBox)
         self.ClassifierCode.configure(takefocus="")
         self.ClassifierCode.insert(0,'Resnet101')
         self.ClassifierCode['state'] = 'readonly'
+        self.ClassifierCode.bind('<<ComboboxSelected>>', self.preloadModel)
 
         self.DatasetTitle = ttk.Label(self.DatasetFrame)
         self.DatasetTitle.place(relx=0.05, rely=0.42, relheight=0.15, relwidth=0.3)
@@ -470,6 +505,7 @@ class Window:
         self.DatasetCode.configure(takefocus="")
         self.DatasetCode.insert(0,'Coco')
         self.DatasetCode['state'] = 'readonly'
+        self.DatasetCode.bind('<<ComboboxSelected>>', self.preloadModel)
 
         self.ThresholdTitle = ttk.Label(self.DatasetFrame)
         self.ThresholdTitle.place(relx=0.05, rely=0.73, relheight=0.15, relwidth=0.3)
@@ -530,6 +566,13 @@ class Window:
         self.FramesPerSecond.place(relx=0.95, rely=0.97)
         self.FramesPerSecond.configure(foreground=_fgcolor)
 
+        # state of the warning interface as it was last displayed
+        self.displayedStates = {}
+        self.displayedFrameRate = None
+
+        # a single background thread that plays warning sounds
+        self.audioWorker = AudioWorker(self.playBeep)
+
         sys.stdout = TextRedirector(self.CommandLineOutput)
         print("Welcome to DeepEye Advanced Driver-Assistance Systems.\n")
         print("Configure setup, then press run.")
@@ -544,79 +587,70 @@ class Window:
         widget1.lower(widget2)
 
 
-    def updateState(self, threats):
-        
-        self.FramesPerSecond.configure(text=gui_utils.FrameRateOutput)
-
-        if threats['PEDESTRIAN']:
-            self.show_label(self.Pedestrians, self.HidePedestrians)
-        else:
-            self.hide_label(self.Pedestrians, self.HidePedestrians)
-
-        if threats['BIKES']:
-            self.show_label(self.Bikes, self.HideBikes)
-        else:
-            self.hide_label(self.Bikes, self.HideBikes)
-
-        if threats['VEHICLES']:
-            self.show_label(self.Vehicles, self.HideVehicles)
-        else:
-            self.hide_label(self.Vehicles, self.HideVehicles)
+    def warningStates(self, threats):
+        '''Map the threats dictionary to the desired state of each warning icon.
+           Icons are grouped by the widget they are stacked against, and listed
+           in the order they get lifted/lowered.'''
+        collision = bool(threats['COLLISION'])
+
+        states = {
+            self.HidePedestrians: (
+                (self.Pedestrians, bool(threats['PEDESTRIAN']) and not collision),),
+            self.HideBikes: (
+                (self.Bikes, bool(threats['BIKES']) and not collision),
+                (self.Collision, collision)),
+            self.HideVehicles: (
+                (self.Vehicles, bool(threats['VEHICLES']) and not collision),),
+            self.HideStopSign: (
+                (self.StopSign, bool(threats['STOP_SIGN'])),),
+            self.HideTrafficLights: (
+                (self.TrafficLights, bool(threats['TRAFFIC_LIGHT'])),),
+        }
 
-        if threats['STOP_SIGN']:
-            self.show_label(self.StopSign, self.HideStopSign)
+        #if Lane Detection is enabled
+        if gui_utils.LaneDetection.get() == True:
+            states[self.HideLaneCentered] = (
+                (self.NoLaneDetected, bool(threats['UNKNOWN'])),
+                (self.LaneCentered, bool(threats['CENTER'])))
+            states[self.HideLaneOffLeft] = (
+                (self.LaneOffLeft, bool(threats['LEFT'])),)
+            states[self.HideLaneOffLeftBad] = (
+                (self.LaneOffLeftBad, bool(threats['FAR_LEFT'])),)
+            states[self.HideLaneOffRight] = (
+                (self.LaneOffRight, bool(threats['RIGHT'])),)
+            states[self.HideLaneOffRightBad] = (
+                (self.LaneOffRightBad, bool(threats['FAR_RIGHT'])),)
         else:
-            self.hide_label(self.StopSign, self.HideStopSign)
+            states[self.HideLaneCentered] = (
+                (self.NoLaneDetected, True),)
 
-        if threats['TRAFFIC_LIGHT']:
-            self.show_label(self.TrafficLights, self.HideTrafficLights)
-
-        else:
-            self.hide_label(self.TrafficLights, self.HideTrafficLights)
+        return states
 
-        if threats['COLLISION']:
-            self.hide_label(self.Pedestrians, self.HidePedestrians)
-            self.hide_label(self.Bikes, self.HideBikes)
-            self.hide_label(self.Vehicles, self.HideVehicles)
-            self.show_label(self.Collision, self.HideBikes)
-            threading.Thread(target=self.playBeep).start()
-        else:
-            self.hide_label(self.Collision, self.HideBikes)
 
-        #if Lane Detection is enabled
-        if gui_utils.LaneDetection.get() == True:
-            if threats['UNKNOWN']:
-                self.show_label(self.NoLaneDetected, self.HideLaneCentered)
-            else:
-                self.hide_label(self.NoLaneDetected, self.HideLaneCentered)
+    @tracer.traced('Window.updateState')
+    def updateState(self, threats):
+        # only touch the widgets whose state has changed since the last frame
+        if self.displayedFrameRate != gui_utils.FrameRateOutput:
+            self.displayedFrameRate = gui_utils.FrameRateOutput
+            self.FramesPerSecond.configure(text=gui_utils.FrameRateOutput)
 
-            if threats['CENTER']:
-                self.show_label(self.LaneCentered, self.HideLaneCentered)
-            else:
-                self.hide_label(self.LaneCentered, self.HideLaneCentered)
+        for sibling, states in self.warningStates(threats).items():
+            if self.displayedStates.get(sibling) == states:
+                continue
 
-            if threats['LEFT']:
-                self.show_label(self.LaneOffLeft, self.HideLaneOffLeft)
-            else:
-                self.hide_label(self.LaneOffLeft, self.HideLaneOffLeft)
+            # re-stack the whole group to keep the same order of icons
+            for widget, visible in states:
+                if visible:
+                    self.show_label(widget, sibling)
+                else:
+                    self.hide_label(widget, sibling)
 
-            if threats['FAR_LEFT']:
-                self.show_label(self.LaneOffLeftBad, self.HideLaneOffLeftBad)
-            else:
-                self.hide_label(self.LaneOffLeftBad, self.HideLaneOffLeftBad)
-            
-            if threats['RIGHT']:
-                self.show_label(self.LaneOffRight, self.HideLaneOffRight)
-            else:
-                self.hide_label(self.LaneOffRight, self.HideLaneOffRight)
+            self.displayedStates[sibling] = states
 
-            if threats['FAR_RIGHT']:
-                self.show_label(self.LaneOffRightBad, self.HideLaneOffRightBad)
-            else:
-                self.hide_label(self.LaneOffRightBad, self.HideLaneOffRightBad)
-        else:
-            self.show_label(self.NoLaneDetected, self.HideLaneCentered)
+        if threats['COLLISION']:
+            self.audioWorker.request()
 
+    @tracer.traced('Window.playBeep')
     def playBeep(self):
         PlaySound(os.path.join(FOLDER_PATH, "beep.wav"), SND_FILENAME)
 
@@ -649,12 +683,20 @@ class Window:
             convertedLeftOffset = int(self.LeftOffset.get())
             
         convertedClassifier = ''
-        if self.ClassifierCode.get() == 'Resnet101':
+        classifier = self.ClassifierCode.get()
+        quantized = classifier.endswith(QUANTIZED_LABEL)
+        if quantized:
+            classifier = classifier[:-len(QUANTIZED_LABEL)]
+
+        if classifier == 'Resnet101':
             convertedClassifier = 'faster_rcnn_resnet101_coco_2017_11_08'
-        elif self.ClassifierCode.get() == 'Nas':
+        elif classifier == 'Nas':
             convertedClassifier = 'faster_rcnn_nas_coco_2017_11_08'
-        elif self.ClassifierCode.get() == 'Inception-Resnet':
+        elif classifier == 'Inception-Resnet':
             convertedClassifier = 'mask_rcnn_inception_v2_coco_coco_2017_11_08'
+
+        if quantized:
+            convertedClassifier = graph_utils.quantized_codename(convertedClassifier)
             
         convertedDataset = ''
         if self.DatasetCode.get() == 'Coco':
@@ -677,7 +719,24 @@ class Window:
             convertedWindowHeight
 
 
+    def preloadModel(self, event=None):
+        '''Start loading the selected classifier on a background thread.'''
+        if not gui_utils.ObjectDetection.get():
+            return
+
+        classifier, dataset, _, _, _, _, _, _, \
+        mid, top, left, width, height = self.set_adas_prams()
+
+        preloader = threading.Thread(target=preload_model,
+            args=(classifier, dataset, mid, top, left, width, height),
+            name='ModelPreloader')
+        preloader.daemon = True
+        preloader.start()
+
+
     def mainLoop(self): 
+        from driving_assistant.DrivingAssistant import DrivingAssistant
+
         classifier, dataset, threshold, \
         obj_flag, obj_vis, lane_flag, lane_vis, diagnostic, \
         mid, top, left, width, height = self.set_adas_prams()
@@ -697,27 +756,32 @@ class Window:
             window_width = width,
             window_height = height)
 
-        driving_assistant.object_detector.setup()
-        self.show_label(self.WarningInterfaceFrame, self.setupFrame)
+        # reuses the model preloaded by preloadModel() if it's the same one
+        if obj_flag:
+            driving_assistant.object_detector.setup()
+
+        # HighGUI only needs to process its events if the dashboard is shown
+        show_dashboard = (obj_flag and obj_vis) or (lane_flag and lane_vis)
 
         while(True):
             # Register current time to be used for calculating frame rate
             timer = time.time()
 
             driving_assistant.run()
-            self.updateState(driving_assistant.threats)
 
              # Calculating fps based on the previous registered timer
             frame_rate = 10 / (time.time() - timer)
-            gui_utils.FrameRateOutput = 'FPS: {0}'.format(int(frame_rate))
+
+            # publish a snapshot of the current state to the GUI thread
+            self.mailbox.put((dict(driving_assistant.threats), 'FPS: {0}'.format(int(frame_rate))))
+
+            if show_dashboard:
+                cv2.waitKey(1)
 
             # Press ESC key to exit.
-            if cv2.waitKey(25) & keyboard.is_pressed('escape'):
+            if keyboard.is_pressed('escape'):
                 cv2.destroyAllWindows()
-                self.FramesPerSecond.configure(text="")
                 break
-        
-        self.show_label(self.setupFrame, self.WarningInterfaceFrame)
 
         if driving_assistant.diagnostic_mode:
             timestamp = time.strftime("test/logs/[%Y-%m-%d_%H-%M]--DeepEye.csv")
@@ -727,15 +791,75 @@ class Window:
         print("Returning to Setup Menu")
 
 
+    def pollState(self):
+        '''Runs on the Tk thread at display rate, and updates the warning interface
+           using the latest snapshot published by the processing loop.'''
+        snapshot = self.mailbox.get()
+
+        if snapshot is not None:
+            threats, gui_utils.FrameRateOutput = snapshot
+
+            # switch to the warning interface once the first frame is processed
+            if not self.dashboardShown:
+                self.show_label(self.WarningInterfaceFrame, self.setupFrame)
+                self.dashboardShown = True
+
+            self.updateState(threats)
+
+        if self.processingLoop.is_alive():
+            self.top.after(DISPLAY_INTERVAL, self.pollState)
+        else:
+            self.FramesPerSecond.configure(text="")
+            self.displayedFrameRate = None
+            self.show_label(self.setupFrame, self.WarningInterfaceFrame)
+
+
     def runProgram(self):
-        threading.Thread(target=self.mainLoop).start()
+        # run the processing loop on its own thread, and keep the Tk thread free for the GUI
+        self.mailbox = pipeline_utils.Mailbox()
+        self.dashboardShown = False
+
+        self.processingLoop = threading.Thread(target=self.mainLoop, name='mainLoop')
+        self.processingLoop.start()
+
+        self.top.after(DISPLAY_INTERVAL, self.pollState)
     
 
     def exitProgram(self):
         cv2.destroyAllWindows()
         root.destroy()
 
-   
+
+class AudioWorker(object):
+    '''Plays warning sounds from a single background thread.
+       Requests made while a sound is pending are merged into a single one,
+       and the sound is played at most once every (min_interval) seconds.'''
+    def __init__(self, play, min_interval=1.0):
+        self.play = play
+        self.min_interval = min_interval
+        self.last_played = 0.0
+        self.pending = threading.Event()
+
+        self.thread = threading.Thread(target=self.run, name='AudioWorker')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def request(self):
+        self.pending.set()
+
+    def run(self):
+        while True:
+            self.pending.wait()
+
+            delay = self.last_played + self.min_interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+            self.pending.clear()
+            self.play()
+            self.last_played = time.time()
+
+
 class TextRedirector(object):
     def __init__(self, widget):
         self.widget = widget
@@ -24,6 +24,7 @@ import numpy as np
 import lane_detector.calibration_utils as calibrator
 import lane_detector.graphic_utils as transformer
 import lane_detector.visualization_utils as visualizer
+import profiling.trace_utils as tracer
 # ---------------------------------------------------------------------------- #
 
 class LaneDetector:
@@ -137,6 +138,7 @@ class LaneDetector:
         return lane_dict
 
 
+    @tracer.traced('LaneDetector.detect_lane')
     def detect_lane(self, frame, threats_dict):
         """
         Mark the area enclosed by your lane onto the given frame.
@@ -146,52 +148,58 @@ class LaneDetector:
         height, width = self.frame.shape[:2]
 
         # adjust calibration prams to the given frame 
-        self.calb_frame = calibrator.set_distortion_coefficients(
-            self.frame,
-            self.camera_matrix, 
-            self.distortion_coefficients)
+        with tracer.span('undistort'):
+            self.calb_frame = calibrator.set_distortion_coefficients(
+                self.frame,
+                self.camera_matrix, 
+                self.distortion_coefficients)
 
         # highlight lanes in the frame
-        lanes_bitmap = transformer.convert_to_bitmap(self.calb_frame)
+        with tracer.span('convert_to_bitmap'):
+            lanes_bitmap = transformer.convert_to_bitmap(self.calb_frame)
 
         # compute transformation matrices to get bird's eye view
-        birdseye_view, forward_transformation_matrix, backward_transformation_matrix = transformer.convert_to_birdseye_view(lanes_bitmap)
+        with tracer.span('convert_to_birdseye_view'):
+            birdseye_view, forward_transformation_matrix, backward_transformation_matrix = transformer.convert_to_birdseye_view(lanes_bitmap)
 
         # run a sliding window search to detect lane in the frame  
-        self.lane.detect_pixles(birdseye_view)
+        with tracer.span('detect_pixles'):
+            self.lane.detect_pixles(birdseye_view)
         
         # evaluate the current situation for any potential threats
-        threats_dict.update(self.threat_classifier())
+        with tracer.span('lane_threat_classifier'):
+            threats_dict.update(self.threat_classifier())
 
         # highlight lane onto the given frame if it was detected
         if self.visualization:
-            # lane was not detected
-            if threats_dict["UNKNOWN"]: 
-                pass
-
-            # if car is off-lane => highlight lane in red to alert the driver
-            elif threats_dict["FAR_RIGHT"] or threats_dict["FAR_LEFT"]:  
-                self.frame = self.lane.highlight(
-                    self.frame, 
-                    backward_transformation_matrix,
-                    lane_color=(127, 127, 255) # BGR VALUE
-                )
+            with tracer.span('highlight'):
+                # lane was not detected
+                if threats_dict["UNKNOWN"]: 
+                    pass
+
+                # if car is off-lane => highlight lane in red to alert the driver
+                elif threats_dict["FAR_RIGHT"] or threats_dict["FAR_LEFT"]:  
+                    self.frame = self.lane.highlight(
+                        self.frame, 
+                        backward_transformation_matrix,
+                        lane_color=(127, 127, 255) # BGR VALUE
+                    )
                 
-            # if car is slightly off-lane => highlight lane in yellow
-            elif threats_dict["RIGHT"] or threats_dict["LEFT"]:  
-                self.frame = self.lane.highlight(
-                    self.frame, 
-                    backward_transformation_matrix,
-                    lane_color=(127, 255, 255) # BGR VALUE
-                )
-
-            # if car is relatively in the center of lane => highlight lane in green
-            elif threats_dict["CENTER"]: 
-                self.frame = self.lane.highlight(
-                    self.frame, 
-                    backward_transformation_matrix,
-                    lane_color=(127, 255, 0) # BGR VALUE
-                )
+                # if car is slightly off-lane => highlight lane in yellow
+                elif threats_dict["RIGHT"] or threats_dict["LEFT"]:  
+                    self.frame = self.lane.highlight(
+                        self.frame, 
+                        backward_transformation_matrix,
+                        lane_color=(127, 255, 255) # BGR VALUE
+                    )
+
+                # if car is relatively in the center of lane => highlight lane in green
+                elif threats_dict["CENTER"]: 
+                    self.frame = self.lane.highlight(
+                        self.frame, 
+                        backward_transformation_matrix,
+                        lane_color=(127, 255, 0) # BGR VALUE
+                    )
         else:
             pass
 
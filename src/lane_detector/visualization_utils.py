@@ -131,7 +131,7 @@ class Lane:
         y_ratio = (3.0) * frame_height/frame_width
 
         # set the width & height of the windows used for search
-        self.window_height = np.int(frame_height / self.num_windows)
+        self.window_height = int(frame_height / self.num_windows)
         self.window_width = 100
 
         # minimum number of pixels found to recenter window
@@ -201,10 +201,10 @@ class Lane:
             # take the mean of their position
             # and reset the silder's position to that center point
             if len(left_candidate_pixels) > self.min_window_pixels:
-                slider_position[0] = np.int(np.mean(x_target_pixels[left_candidate_pixels]))
+                slider_position[0] = int(np.mean(x_target_pixels[left_candidate_pixels]))
 
             if len(right_candidate_pixels) > self.min_window_pixels:
-                slider_position[1] = np.int(np.mean(x_target_pixels[right_candidate_pixels]))
+                slider_position[1] = int(np.mean(x_target_pixels[right_candidate_pixels]))
 
          # join/concatenate candidate_pixels arrays along the x-axis.
         left_candidate_pixels = np.concatenate(left_candidate_pixels)
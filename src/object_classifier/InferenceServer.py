@@ -0,0 +1,395 @@
+# coding: utf-8
+"""
+A local model server for the ObjectClassifier.
+
+Each ObjectClassifier loads its own copy of the model into its own tensorflow session, so running several
+DrivingAssistants (i.e. one per camera feed) means several copies of the model. Instead, a single InferenceServer
+process could own the model and serve detection requests to any number of clients on the same machine:
+    - requests are sent over a Unix domain socket (a named pipe on Windows) using multiprocessing.connection,
+    - frames are passed through a shared memory block owned by each client, so they never get pickled,
+    - requests that arrive within (max_latency) seconds of each other get batched into a single sess.run,
+      up to (max_batch_size) requests with frames of the same size.
+
+The RemoteObjectClassifier is a drop-in replacement for the ObjectClassifier, which sends the frames
+to the server instead of running the model itself (the threat classifier and the visualization still run on the client).
+
+- Usage (run from the src folder):
+    python -m object_classifier.InferenceServer <classifier_codename> [--dataset mscoco] [--max-batch-size 4] [--max-latency-ms 10]
+        [--frame-width 1280 --frame-height 720]
+
+    then, pass the address of the server to the DrivingAssistant (inference_server = ...),
+    or to the replay benchmark (--server ...) to run test clients against it.
+
+Note: the optimized graphs (see graph_utils.py) have a fixed batch size of 1 and a fixed frame size,
+so the server only loads them if batching is disabled (--max-batch-size 1) and the size of the frames is given
+(--frame-width, --frame-height), i.e. optimized_inference_graph_1280x720.pb for 1280x720 frames.
+
+Note: multiprocessing.shared_memory was added in Python 3.8, so the server and its clients need Python 3.8+.
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import argparse
+import os, sys
+import queue
+import tempfile
+import threading
+import time
+import numpy as np
+
+if sys.version_info < (3, 8):
+    raise ImportError('The InferenceServer needs Python 3.8+ for multiprocessing.shared_memory, '
+        'found Python {}.{}'.format(*sys.version_info[:2]))
+
+from multiprocessing import shared_memory
+from multiprocessing.connection import Listener, Client
+
+from object_classifier.ObjectClassifier import ObjectClassifier
+import profiling.trace_utils as tracer
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+if sys.platform == 'win32':
+    DEFAULT_ADDRESS = r'\\.\pipe\deepeye_inference'
+else:
+    DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), 'deepeye_inference.sock')
+
+DEFAULT_MAX_BATCH_SIZE = 4
+
+# max time (in seconds) a request waits for other requests to be batched with
+DEFAULT_MAX_LATENCY = 0.01
+# ---------------------------------------------------------------------------- #
+
+
+def attach_shared_memory(name):
+    """
+    Attach to a shared memory block owned by another process.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name = name, track = False)
+
+    memory = shared_memory.SharedMemory(name = name)
+
+    # older versions register every attached block with the resource tracker of this process,
+    # which would destroy the block of the client when the server exits (https://bugs.python.org/issue39959)
+    if sys.platform != 'win32':
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(memory._name, 'shared_memory')
+
+    return memory
+
+
+class ClientSession:
+    """
+    The connection and the shared frame buffer of a single client.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.memory = None
+        self.frames = None
+
+
+    def attach(self, name, shape):
+        self.detach()
+        self.memory = attach_shared_memory(name)
+        self.frames = np.ndarray(shape, dtype=np.uint8, buffer=self.memory.buf)
+
+
+    def detach(self):
+        if self.memory is not None:
+            # numpy views must be released before the shared memory gets closed
+            self.frames = None
+            self.memory.close()
+            self.memory = None
+
+
+class InferenceServer:
+    """
+    - classifier_codename, dataset_codename: the model served (see ObjectClassifier)
+    - address: path of the Unix domain socket (or name of the pipe on Windows)
+    - max_batch_size: max number of requests batched into a single sess.run
+    - max_latency: max time (in seconds) a request waits for other requests to be batched with
+    - frame_height, frame_width: size of the frames, used to load the optimized graph
+      (only if batching is disabled, see graph_utils.py)
+    """
+    def __init__(self,
+        classifier_codename,
+        dataset_codename = 'mscoco',
+        address = DEFAULT_ADDRESS,
+        max_batch_size = DEFAULT_MAX_BATCH_SIZE,
+        max_latency = DEFAULT_MAX_LATENCY,
+        frame_height = 0,
+        frame_width = 0):
+
+        self.address = address
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+
+        self.object_detector = ObjectClassifier(
+            classifier_codename = classifier_codename,
+            dataset_codename = dataset_codename,
+            frame_height = frame_height,
+            frame_width = frame_width,
+            use_optimized_graph = max_batch_size == 1 and frame_height > 0 and frame_width > 0)
+
+        # requests from every client: (session, request) or (session, None) once the client disconnects
+        self.requests = queue.Queue()
+
+
+    def serve_forever(self):
+        self.object_detector.setup()
+
+        if not self.address.startswith('\\\\') and os.path.exists(self.address):
+            os.remove(self.address)
+
+        batcher = threading.Thread(target=self.process_requests, name='InferenceBatcher')
+        batcher.daemon = True
+        batcher.start()
+
+        with Listener(self.address) as listener:
+            print('-- Serving classifier model on:', self.address)
+
+            while True:
+                handler = threading.Thread(target=self.handle_client,
+                    args=(ClientSession(listener.accept()),),
+                    name='InferenceClient')
+                handler.daemon = True
+                handler.start()
+
+
+    def handle_client(self, session):
+        """
+        Receive requests from a single client, and queue them for the batcher.
+        """
+        try:
+            while True:
+                message = session.connection.recv()
+
+                if not isinstance(message, tuple) or not message:
+                    raise ValueError('Malformed request: {!r}'.format(message))
+
+                if message[0] == 'attach' and len(message) == 3:
+                    # a new frame buffer, sent on connection and whenever the frame size changes
+                    _, name, shape = message
+                    self.requests.put((session, ('attach', name, shape)))
+
+                elif message == ('detect',):
+                    self.requests.put((session, 'detect'))
+
+                else:
+                    raise ValueError('Unknown request: {!r}'.format(message))
+
+        except (EOFError, OSError):
+            pass
+
+        except Exception as error:
+            # a malformed (or unpicklable) request: the client is disconnected
+            print('-- InferenceServer: disconnecting a client:', repr(error))
+
+        finally:
+            # the frame buffer is released by the batcher, after any pending requests of this client
+            self.requests.put((session, None))
+
+
+    def next_batch(self):
+        """
+        Wait for a request, then collect any other requests that arrive within (max_latency) seconds.
+        """
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.max_latency
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+
+            try:
+                batch.append(self.requests.get(timeout = timeout))
+            except queue.Empty:
+                break
+
+        return batch
+
+
+    def process_requests(self):
+        while True:
+            # a failed batch must never stop the batcher, or every client would wait for its results forever
+            try:
+                self.process_batch(self.next_batch())
+            except Exception as error:
+                print('-- InferenceServer: failed to process a batch of requests:', repr(error))
+
+
+    def process_batch(self, batch):
+        detections = {}
+        disconnected = []
+
+        try:
+            for (session, request) in batch:
+                if request is None:
+                    # the frame buffer might still be used by a request of the same batch
+                    disconnected.append(session)
+
+                elif request == 'detect':
+                    if session.frames is None:
+                        self.send(session, ValueError('No frame buffer was attached before the detect request'))
+                    else:
+                        # group the frames by size, as each sess.run takes frames of a single size
+                        detections.setdefault(session.frames.shape[1:], []).append(session)
+
+                else:
+                    _, name, shape = request
+                    try:
+                        session.attach(name, shape)
+                    except (OSError, ValueError, TypeError) as error:
+                        self.send(session, error)
+                    else:
+                        self.send(session, ('ready',))
+
+            for sessions in detections.values():
+                self.run_batch(sessions)
+
+        finally:
+            for session in disconnected:
+                session.detach()
+                session.connection.close()
+
+
+    def send(self, session, message):
+        """
+        Send a message to a client, unless it already disconnected (its session is released by the batcher).
+        """
+        try:
+            session.connection.send(message)
+        except (OSError, EOFError):
+            pass
+
+
+    @tracer.traced('InferenceServer.run_batch')
+    def run_batch(self, sessions):
+        """
+        Run the model once over the frames of the given sessions, and send back the detections of each one.
+        """
+        try:
+            if len(sessions) == 1:
+                frames = sessions[0].frames
+            else:
+                frames = np.concatenate([session.frames for session in sessions])
+
+            outputs = self.object_detector.run_inference(frames)
+        except Exception as error:
+            for session in sessions:
+                self.send(session, error)
+            return
+
+        start = 0
+        for session in sessions:
+            end = start + len(session.frames)
+            self.send(session, tuple(output[start:end] for output in outputs))
+            start = end
+
+
+class RemoteObjectClassifier(ObjectClassifier):
+    """
+    A drop-in replacement for the ObjectClassifier that runs the model on an InferenceServer.
+
+    - address: address of the server (same as the one passed to the InferenceServer)
+    - the rest of the parameters are the same as the ObjectClassifier
+    """
+    def __init__(self, address = DEFAULT_ADDRESS, **kwargs):
+        super(RemoteObjectClassifier, self).__init__(**kwargs)
+
+        self.address = address
+        self.connection = None
+        self.memory = None
+        self.frames = None
+
+
+    def setup(self):
+        """
+        Connect to the server, and load the names of the categories in the dataset.
+        """
+        print('\n\n-- Connecting to the classifier server:', self.address)
+        self.connection = Client(self.address)
+        self.load_labels()
+
+
+    def attach_frames(self, shape):
+        """
+        Allocate a shared frame buffer for frames of the given shape, and send it to the server.
+        """
+        self.release_frames()
+
+        self.memory = shared_memory.SharedMemory(create = True, size = int(np.prod(shape)))
+        self.frames = np.ndarray(shape, dtype=np.uint8, buffer=self.memory.buf)
+
+        self.connection.send(('attach', self.memory.name, shape))
+        reply = self.connection.recv()
+
+        if isinstance(reply, Exception):
+            self.release_frames()
+            raise reply
+
+
+    def release_frames(self):
+        if self.memory is not None:
+            self.frames = None
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+
+    def run_inference(self, frames):
+        if self.frames is None or self.frames.shape != frames.shape:
+            self.attach_frames(frames.shape)
+
+        np.copyto(self.frames, frames)
+
+        self.connection.send(('detect',))
+        result = self.connection.recv()
+
+        if isinstance(result, Exception):
+            raise result
+
+        return result
+
+
+    def close(self):
+        """
+        Disconnect from the server, and free the shared frame buffer.
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+        self.release_frames()
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Serve a pre-trained model to the ObjectClassifiers on this machine.')
+    parser.add_argument('classifier_codename', help='codename of the pre-trained model (i.e. faster_rcnn_resnet101_coco_2017_11_08)')
+    parser.add_argument('--dataset', default='mscoco', help='codename of the dataset (mscoco, kitti)')
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help='path of the Unix domain socket (or name of the pipe on Windows)')
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE, help='max number of requests per batch')
+    parser.add_argument('--max-latency-ms', type=float, default=DEFAULT_MAX_LATENCY * 1000,
+        help='max time a request waits for other requests to be batched with')
+    parser.add_argument('--frame-width', type=int, default=0,
+        help='width of the frames, to load the optimized graph of that size (only with --max-batch-size 1)')
+    parser.add_argument('--frame-height', type=int, default=0,
+        help='height of the frames, to load the optimized graph of that size (only with --max-batch-size 1)')
+    args = parser.parse_args(argv)
+
+    server = InferenceServer(args.classifier_codename,
+        dataset_codename = args.dataset,
+        address = args.address,
+        max_batch_size = args.max_batch_size,
+        max_latency = args.max_latency_ms / 1000.0,
+        frame_height = args.frame_height,
+        frame_width = args.frame_width)
+
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+# coding: utf-8
+"""
+Tests for InferenceServer.py, using a fake model so that the requests of the clients could be batched and checked
+without loading a pre-trained model.
+
+- Usage (run from the src folder):
+    python -m unittest object_classifier.InferenceServer_test
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import numpy as np
+from multiprocessing.connection import Client
+
+from object_classifier.InferenceServer import InferenceServer, RemoteObjectClassifier
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+FRAME_SHAPE = (1, 48, 64, 3)
+
+# max time (in seconds) a test waits for a reply of the server
+REPLY_TIMEOUT = 10.0
+# ---------------------------------------------------------------------------- #
+
+
+class FakeObjectDetector:
+    """
+    Return the sum of each frame and the size of its batch, instead of its detections.
+    """
+    def setup(self):
+        pass
+
+
+    def run_inference(self, frames):
+        return (frames.reshape(len(frames), -1).sum(axis=1), np.full(len(frames), len(frames)))
+
+
+class RenamingConnection:
+    """
+    Send the attach requests of a client with the name of a frame buffer that doesn't exist.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+
+
+    def send(self, message):
+        self.connection.send(('attach', 'deepeye_missing_frames', message[2]))
+
+
+    def recv(self):
+        return self.connection.recv()
+
+
+    def close(self):
+        self.connection.close()
+
+
+def serve_fake_model(address):
+    # a long latency, so that the requests sent by the test are batched together
+    server = InferenceServer('fake_model', address = address, max_batch_size = 8, max_latency = 0.5)
+    server.object_detector = FakeObjectDetector()
+    server.serve_forever()
+
+
+@unittest.skipIf(os.name == 'nt', 'the test server listens on a Unix domain socket')
+class InferenceServerTest(unittest.TestCase):
+
+    def setUp(self):
+        # the server runs in a separate python process, like it would for real clients
+        # (a multiprocessing child would share the resource tracker of the clients, see attach_shared_memory)
+        self.address = os.path.join(tempfile.gettempdir(), 'deepeye_test_{}.sock'.format(os.getpid()))
+        self.server = subprocess.Popen([sys.executable, '-c',
+            'from object_classifier.InferenceServer_test import serve_fake_model; serve_fake_model({!r})'.format(self.address)],
+            stdout=subprocess.DEVNULL)
+
+        self.clients = []
+
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+
+        self.server.terminate()
+        self.server.wait()
+        if os.path.exists(self.address):
+            os.remove(self.address)
+
+
+    def connect(self):
+        """
+        Connect a client to the server (without loading the labels, see RemoteObjectClassifier.setup).
+        """
+        for _ in range(int(REPLY_TIMEOUT / 0.05)):
+            if os.path.exists(self.address):
+                break
+            time.sleep(0.05)
+
+        client = RemoteObjectClassifier(address = self.address)
+        client.connection = Client(self.address)
+        self.clients.append(client)
+
+        return client
+
+
+    def connect_with_frames(self, frame_value):
+        """
+        Connect a client to the server, and attach a frame buffer filled with (frame_value).
+        """
+        client = self.connect()
+        client.attach_frames(FRAME_SHAPE)
+        client.frames[:] = frame_value
+
+        return client
+
+
+    def detect(self, client):
+        client.connection.send(('detect',))
+        self.assertTrue(client.connection.poll(REPLY_TIMEOUT), 'the server never replied')
+        return client.connection.recv()
+
+
+    def test_client_disconnecting_mid_request(self):
+        client = self.connect_with_frames(frame_value = 1)
+        disconnected_client = self.connect_with_frames(frame_value = 2)
+
+        # the request of the disconnected client, its disconnection, and the request of the other client
+        # all land in the same batch
+        disconnected_client.connection.send(('detect',))
+        disconnected_client.connection.close()
+        disconnected_client.connection = None
+
+        frame_sums, batch_sizes = self.detect(client)
+        self.assertEqual(frame_sums.tolist(), [np.prod(FRAME_SHAPE)])
+        self.assertEqual(batch_sizes.tolist(), [2])
+
+        # the batcher is still running, for the connected client as well as any new one
+        frame_sums, _ = self.detect(client)
+        self.assertEqual(frame_sums.tolist(), [np.prod(FRAME_SHAPE)])
+
+        frame_sums, _ = self.detect(self.connect_with_frames(frame_value = 3))
+        self.assertEqual(frame_sums.tolist(), [3 * np.prod(FRAME_SHAPE)])
+
+
+    def test_detect_before_attach(self):
+        client = self.connect()
+
+        self.assertIsInstance(self.detect(client), ValueError)
+
+        client.attach_frames(FRAME_SHAPE)
+        client.frames[:] = 1
+        frame_sums, _ = self.detect(client)
+        self.assertEqual(frame_sums.tolist(), [np.prod(FRAME_SHAPE)])
+
+
+    def test_malformed_requests_disconnect_the_client(self):
+        for message in [(), 'detect', ('attach', 'frames'), ('resize', 1, 2)]:
+            client = self.connect_with_frames(frame_value = 1)
+            client.connection.send(message)
+
+            self.assertTrue(client.connection.poll(REPLY_TIMEOUT), 'the server never disconnected the client')
+            with self.assertRaises(EOFError):
+                client.connection.recv()
+            client.connection = None
+
+        # an unpicklable request
+        client = self.connect_with_frames(frame_value = 1)
+        client.connection.send_bytes(b'not a pickle')
+        self.assertTrue(client.connection.poll(REPLY_TIMEOUT), 'the server never disconnected the client')
+        with self.assertRaises(EOFError):
+            client.connection.recv()
+        client.connection = None
+
+        # the server still serves the other clients
+        frame_sums, _ = self.detect(self.connect_with_frames(frame_value = 2))
+        self.assertEqual(frame_sums.tolist(), [2 * np.prod(FRAME_SHAPE)])
+
+
+    def test_attach_error_is_raised_by_the_client(self):
+        client = self.connect()
+        client.connection = RenamingConnection(client.connection)
+
+        with self.assertRaises(OSError):
+            client.attach_frames(FRAME_SHAPE)
+        self.assertIsNone(client.frames)
+        self.assertIsNone(client.memory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -28,19 +28,35 @@ import numpy as np
 import tensorflow as tf
 import cv2
 import os, sys
-import six.moves.urllib as urllib
-import tarfile, zipfile
-import mss
-import mss.tools
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # This is needed for relative paths since the code is stored in the object_detection folder.
 sys.path.append("..")
 
 # imports from the object detection module.
 from object_classifier.object_detection.utils import label_map_util, visualization_utils
+import object_classifier.download_utils as download_utils
+import object_classifier.graph_utils as graph_utils
+import profiling.trace_utils as tracer
 # ---------------------------------------------------------------------------- #
 
+#constant parameters
+# ---------------------------------------------------------------------------- #
+# size of the dummy frame used to warm up a model when the frame size is unknown
+WARM_UP_FRAME_SIZE = (300, 300)
+# ---------------------------------------------------------------------------- #
+
+# Models loaded into memory, shared by every instance of the ObjectClassifier (see ObjectClassifier.preload)
+# (path to graph, path to labels, session threads) => Future of (detection_graph, categories_dict, session)
+loaded_models = {}
+loaded_models_lock = threading.Lock()
+
+# A single background thread used to download/load the models
+model_loader = None
+
+
 class ObjectClassifier:
     """
     Note: The constructor doesn't necessarily require passing any parameters as
@@ -64,9 +80,23 @@ class ObjectClassifier:
         would download any desired model from the api, if it hasn't been already downloaded to your device.
         You could also change the (classifier_threshold), which would limit the displayed detections based on their detection scores.
 
+        An optimized version of the model for CPU inference at a fixed frame size could be generated using graph_utils.py
+        and it will be loaded by default if it was found (set use_optimized_graph to False to load the original model).
+
+        A reduced-precision version of any model (8-bit weights) could be used by appending (graph_utils.QUANTIZED_SUFFIX)
+        to its codename (i.e. faster_rcnn_resnet101_coco_2017_11_08_quantized), and it will be generated from the original model
+        the first time it gets used.
+
         A list of pre-trained models could be found here:
         https://github.com/tensorflow/models/blob/master/research/object_detection/g3doc/detection_model_zoo.md
 
+    - Session Threading:
+        By default, tensorflow creates as many intra-op/inter-op threads as there are cores,
+        which oversubscribes the cores that the lane detector and OpenCV also need.
+        Set (intra_op_threads) and (inter_op_threads) to limit the size of each thread pool (0 lets tensorflow decide).
+        See driving_assistant/thread_utils.py for the CPU affinity and the OpenCV threads,
+        and profiling/thread_tuner.py to find the best split for a given host.
+
     """
     # Constructor
     def __init__(self,
@@ -76,7 +106,10 @@ class ObjectClassifier:
         visualization = False,
         diagnostic_mode = False,
         frame_height = 0,
-        frame_width = 0):
+        frame_width = 0,
+        use_optimized_graph = True,
+        intra_op_threads = 0,
+        inter_op_threads = 0):
 
         # Boolean flag for visualization utils
         self.visualization = visualization
@@ -86,7 +119,8 @@ class ObjectClassifier:
         self.FOLDER_NAME = 'object_detection'
 
         # Compressed file for the pre-trained model
-        self.MODEL_FILE = classifier_codename + '.tar.gz'
+        # Note: reduced-precision models are generated from the original model (see graph_utils.py)
+        self.MODEL_FILE = graph_utils.base_codename(classifier_codename) + '.tar.gz'
 
         # Relative path for the MODEL FOLDER
         self.MODEL_FOLDER_PATH = os.path.join(os.getcwd(), 'object_classifier', self.FOLDER_NAME)
@@ -94,12 +128,16 @@ class ObjectClassifier:
         # Relative path for the MODEL FILE
         self.MODEL_FILE_PATH = os.path.join(self.MODEL_FOLDER_PATH, self.MODEL_FILE)
 
-        # URL for TF Object Detection API
-        self.DOWNLOAD_BASE = 'http://download.tensorflow.org/models/object_detection/'
+        # URL for TF Object Detection API (or a mirror of it, see download_utils.py)
+        self.DOWNLOAD_BASE = download_utils.download_base()
 
         # Path to frozen detection graph. This is the actual model that is used for the object detection.
         self.PATH_TO_CKPT = os.path.join(self.MODEL_FOLDER_PATH, classifier_codename, 'frozen_inference_graph.pb')
 
+        # Path to frozen detection graph of the original model (same as PATH_TO_CKPT unless the model is quantized)
+        self.PATH_TO_BASE_CKPT = os.path.join(self.MODEL_FOLDER_PATH,
+            graph_utils.base_codename(classifier_codename), 'frozen_inference_graph.pb')
+
         # List of the strings that is used to add correct label for each box.
         self.PATH_TO_LABELS = os.path.join(self.MODEL_FOLDER_PATH, 'data', dataset_codename + '_label_map.pbtxt')
 
@@ -140,6 +178,15 @@ class ObjectClassifier:
 
         self.frame_height, self.frame_width = frame_height, frame_width
 
+        # Path to an optimized version of the frozen graph for the given frame size (see graph_utils.py)
+        # it will be loaded instead of the original graph if it was found
+        self.use_optimized_graph = use_optimized_graph
+        self.PATH_TO_OPTIMIZED_CKPT = graph_utils.optimized_graph_path(self.PATH_TO_CKPT, self.frame_width, self.frame_height)
+
+        # Size of the thread pools of the tensorflow session (0 lets tensorflow decide)
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+
         # Region of Interest (ROI) -- targeted detection area
         self.roi = {
             # VEHICLES/PEDESTRIAN Detection Area
@@ -180,20 +227,30 @@ class ObjectClassifier:
     def download_model(self):
         """
         Download pre-trained model from the tensorflow object detection API.
+        The download is resumed if it was interrupted, and verified against the manifest (see download_utils.py).
         """
         if not os.path.exists(self.MODEL_FILE_PATH):
             print('\n\n-- Downloading classifier model...')
-            opener = urllib.request.URLopener()
-            opener.retrieve(self.DOWNLOAD_BASE + self.MODEL_FILE, self.MODEL_FILE_PATH)
+            download_utils.download_file(self.MODEL_FILE, self.MODEL_FILE_PATH, base = self.DOWNLOAD_BASE)
 
 
-        if not os.path.exists(self.PATH_TO_CKPT):
+        if not os.path.exists(self.PATH_TO_BASE_CKPT):
             print('\n\n-- Extracting classifier model...')
-            tar_file = tarfile.open(self.MODEL_FILE_PATH)
-            for file in tar_file.getmembers():
-                file_name = os.path.basename(file.name)
-                if 'frozen_inference_graph.pb' in file_name:
-                    tar_file.extract(file, os.path.join(self.MODEL_FOLDER_PATH))
+            download_utils.extract_file(self.MODEL_FILE_PATH, 'frozen_inference_graph.pb', self.PATH_TO_BASE_CKPT)
+
+
+        if not os.path.exists(self.PATH_TO_CKPT):
+            graph_utils.quantize_frozen_graph(self.PATH_TO_BASE_CKPT, self.PATH_TO_CKPT)
+
+
+    def graph_path(self):
+        """
+        Return the path of the frozen graph that will be loaded.
+        """
+        if self.use_optimized_graph and os.path.exists(self.PATH_TO_OPTIMIZED_CKPT):
+            return self.PATH_TO_OPTIMIZED_CKPT
+
+        return self.PATH_TO_CKPT
 
 
     def load_model(self):
@@ -201,14 +258,26 @@ class ObjectClassifier:
         Load pre-trained model into memory.
         """
         print('\n\n-- Loading classifier model into memory...')
+        graph_path = self.graph_path()
+        if graph_path == self.PATH_TO_OPTIMIZED_CKPT:
+            print('-- Using optimized classifier model:', graph_path)
+
         self.detection_graph = tf.Graph()
         with self.detection_graph.as_default():
-            od_graph_def = tf.GraphDef()
-            with tf.gfile.GFile(self.PATH_TO_CKPT, 'rb') as fid:
-                serialized_graph = fid.read()
-                od_graph_def.ParseFromString(serialized_graph)
-                tf.import_graph_def(od_graph_def, name='')
+            # the model file is memory-mapped rather than read into memory (see graph_utils.load_graph_def)
+            od_graph_def = graph_utils.load_graph_def(graph_path)
+            tf.import_graph_def(od_graph_def, name='')
+
+        # the graph holds its own copy of the weights, so the parsed GraphDef could be freed right away
+        del od_graph_def
+
+        self.load_labels()
+
 
+    def load_labels(self):
+        """
+        Load the names of the categories in the dataset.
+        """
         # label mapping - to map indices to category names,
         label_map = label_map_util.load_labelmap(self.PATH_TO_LABELS)
         categories = label_map_util.convert_label_map_to_categories(label_map,
@@ -217,16 +286,81 @@ class ObjectClassifier:
         self.categories_dict = label_map_util.create_category_index(categories)
 
 
+    def warm_up(self):
+        """
+        Run the model once on a dummy frame, so that the first real frame doesn't pay
+        for the lazy initialization of the session (i.e. memory allocations, kernel selection).
+        """
+        print('\n\n-- Warming up classifier model...')
+        if self.frame_height and self.frame_width:
+            frame_shape = (1, int(self.frame_height), int(self.frame_width), 3)
+        else:
+            frame_shape = (1,) + WARM_UP_FRAME_SIZE + (3,)
+
+        self.run_inference(np.zeros(frame_shape, dtype=np.uint8))
+
+
+    def session_config(self):
+        """
+        Return the configuration of the tensorflow session (i.e. the size of its thread pools).
+
+        Note: tensorflow creates its thread pools along with the first session in the process,
+        so any later session with different settings still shares the same pools.
+        """
+        return tf.ConfigProto(
+            intra_op_parallelism_threads = self.intra_op_threads,
+            inter_op_parallelism_threads = self.inter_op_threads)
+
+
+    def start_session(self):
+        """
+        Download and load the model, then initiate a tensorflow session and warm it up.
+        """
+        self.download_model()
+        self.load_model()
+        self.detection_graph.as_default()
+        self.sess = tf.Session(graph = self.detection_graph, config = self.session_config())
+        self.warm_up()
+
+        return self.detection_graph, self.categories_dict, self.sess
+
+
+    def preload(self):
+        """
+        Start downloading/loading the model on a background thread, unless it's already loaded (or being loaded).
+        Return a Future of the loaded model.
+
+        Note: only the most recently requested model is kept in memory,
+        as each model could take up to several hundreds of MB.
+        """
+        global model_loader
+
+        key = (self.graph_path(), self.PATH_TO_LABELS, self.intra_op_threads, self.inter_op_threads)
+
+        with loaded_models_lock:
+            future = loaded_models.get(key)
+
+            # retry if the previous attempt failed (i.e. no network connection)
+            if future is None or (future.done() and future.exception() is not None):
+                if model_loader is None:
+                    model_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ModelLoader')
+
+                future = model_loader.submit(self.start_session)
+                loaded_models.clear()
+                loaded_models[key] = future
+
+        return future
+
+
     def setup(self):
         """
         This method would download a trained model from the API if necessary files were not found.
         And, it loads the trained model into memory - preferably GPU memory.
         Then, prep. the tensorflow computation graph and initiates a tensorflow session.
+
+        Note: if the model was already preloaded (see preload), it gets reused instead.
         """
-        self.download_model()
-        self.load_model()
-        self.detection_graph.as_default()
-        self.sess = tf.Session(graph = self.detection_graph)
+        self.detection_graph, self.categories_dict, self.sess = self.preload().result()
 
 
     def threat_classifier(self):
@@ -333,45 +467,59 @@ class ObjectClassifier:
         return objects_dict
 
 
-    def scan_road(self, frame, threats_dict):
+    def run_inference(self, frames):
         """
-        Detect objects and classify them into one of the defined categories in the dataset.
+        Run the model over a batch of frames with shape [batch size, height, width, 3].
+        Return (boxes, scores, classes, num_detections) for each frame in the batch.
         """
-        self.frame = frame
-
-        # Expand dimensions since the model expects images to have shape: [1, None, None, 3]
-        frame_expanded = np.expand_dims(self.frame, axis=0)
-
         # Definite input and output Tensors for detection_graph
-        self.image_tensor = self.detection_graph.get_tensor_by_name('image_tensor:0')
+        image_tensor = self.detection_graph.get_tensor_by_name('image_tensor:0')
 
         # Each box represents a part of the image where a particular object was detected.
-        self.detection_boxes = self.detection_graph.get_tensor_by_name('detection_boxes:0')
+        detection_boxes = self.detection_graph.get_tensor_by_name('detection_boxes:0')
 
         # Each score represent how level of confidence for each of the objects.
         # Score is shown on the result image, together with the class label.
-        self.detection_scores = self.detection_graph.get_tensor_by_name('detection_scores:0')
-        self.detection_classes = self.detection_graph.get_tensor_by_name('detection_classes:0')
-        self.num_detections = self.detection_graph.get_tensor_by_name('num_detections:0')
+        detection_scores = self.detection_graph.get_tensor_by_name('detection_scores:0')
+        detection_classes = self.detection_graph.get_tensor_by_name('detection_classes:0')
+        num_detections = self.detection_graph.get_tensor_by_name('num_detections:0')
+
+        return self.sess.run(
+            [detection_boxes, detection_scores, detection_classes, num_detections],
+            feed_dict={image_tensor: frames})
+
+
+    @tracer.traced('ObjectClassifier.scan_road')
+    def scan_road(self, frame, threats_dict):
+        """
+        Detect objects and classify them into one of the defined categories in the dataset.
+        """
+        self.frame = frame
+
+        # Expand dimensions since the model expects images to have shape: [1, None, None, 3]
+        frame_expanded = np.expand_dims(self.frame, axis=0)
 
         # Run session to get detections.
-        (self.detection_boxes, self.detection_scores, self.detection_classes, self.num_detections) = self.sess.run(
-            [self.detection_boxes, self.detection_scores, self.detection_classes, self.num_detections],
-            feed_dict={self.image_tensor: frame_expanded})
+        with tracer.span('inference'):
+            (self.detection_boxes, self.detection_scores, self.detection_classes, self.num_detections) = \
+                self.run_inference(frame_expanded)
         
         # Run threat_classifier() method
-        threats_dict.update(self.threat_classifier())
+        with tracer.span('object_threat_classifier'):
+            threats_dict.update(self.threat_classifier())
 
         if self.visualization:
             # Visualization of the results of a detection.
-            visualization_utils.visualize_boxes_and_labels_on_image_array(
-                self.frame,
-                np.squeeze(self.detection_boxes),
-                np.squeeze(self.detection_classes).astype(np.int32),
-                np.squeeze(self.detection_scores),
-                self.categories_dict,
-                use_normalized_coordinates=True,
-                min_score_thresh=self.classifier_threshold, 
-                line_thickness=1)        
+            with tracer.span('object_visualization'):
+                visualization_utils.visualize_boxes_and_labels_on_image_array(
+                    self.frame,
+                    np.squeeze(self.detection_boxes),
+                    np.squeeze(self.detection_classes).astype(np.int32),
+                    np.squeeze(self.detection_scores),
+                    self.categories_dict,
+                    use_normalized_coordinates=True,
+                    min_score_thresh=self.classifier_threshold, 
+                    line_thickness=1,
+                    backend='cv2')
 
         return (self.frame, threats_dict)
\ No newline at end of file
@@ -0,0 +1,322 @@
+# coding: utf-8
+"""
+The functions below download the pre-trained models of the Tensorflow Object Detection API,
+and extract their frozen inference graphs.
+
+- Downloads:
+    The model is streamed into a temporary (.part) file, which is only renamed once the download is complete and verified.
+    If the download gets interrupted, the next attempt resumes from where it stopped (using HTTP range requests).
+    Every download is verified against the SHA-256 checksum listed in the manifest shipped with DeepEye
+    (object_detection/model_checksums.json), and a corrupted or tampered copy is deleted before it's ever extracted.
+    Models that are not listed (or listed without a checksum) can't be verified, so their download fails and gets deleted.
+    Record the checksum of a trusted copy of the model in the manifest first:
+        python -m object_classifier.download_utils --record object_classifier/object_detection/<model>.tar.gz
+    Or, to use unverified models anyway (at your own risk), set the DEEPEYE_ALLOW_UNVERIFIED_MODELS environment variable:
+        DEEPEYE_ALLOW_UNVERIFIED_MODELS=1 python main.py
+
+- Mirrors:
+    The models are downloaded from download.tensorflow.org by default.
+    Set the DEEPEYE_MODEL_MIRROR environment variable to download them from somewhere else instead,
+    i.e. a local directory holding the same files, a (file://) URL, or any other HTTP server:
+        DEEPEYE_MODEL_MIRROR=/path/to/models python main.py
+
+- Extraction:
+    Only the frozen inference graph gets extracted from the model's tarball, in a single streaming pass over the archive.
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import time
+import six.moves.urllib as urllib
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+DEFAULT_DOWNLOAD_BASE = 'http://download.tensorflow.org/models/object_detection/'
+
+# environment variable used to download the models from a mirror (a directory or a URL)
+MIRROR_ENV_VARIABLE = 'DEEPEYE_MODEL_MIRROR'
+
+# environment variable used to opt out of the verification of the models that are not listed in the manifest
+ALLOW_UNVERIFIED_ENV_VARIABLE = 'DEEPEYE_ALLOW_UNVERIFIED_MODELS'
+
+MANIFEST_NAME = 'model_checksums.json'
+
+# the manifest shipped with DeepEye, listing the checksum of every model offered by the GUI
+DEFAULT_MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'object_detection', MANIFEST_NAME)
+
+# timeout (in seconds) of each blocking operation on the connection
+DEFAULT_TIMEOUT = 30
+
+# number of times a download is resumed after a network error before giving up
+MAX_RETRIES = 3
+
+CHUNK_SIZE = 1024 * 1024
+
+# how often (in seconds) the download progress is printed
+PROGRESS_INTERVAL = 2.0
+# ---------------------------------------------------------------------------- #
+
+
+def download_base():
+    """
+    Return the base URL (or directory) that the models are downloaded from.
+    """
+    return os.environ.get(MIRROR_ENV_VARIABLE) or DEFAULT_DOWNLOAD_BASE
+
+
+def allow_unverified_models():
+    """
+    Return True if the models that are not listed in the manifest should be used anyway.
+    """
+    return os.environ.get(ALLOW_UNVERIFIED_ENV_VARIABLE, '').lower() in ('1', 'true', 'yes')
+
+
+def file_url(base, file_name):
+    """
+    Return the location of a given file on the given server (or directory).
+    """
+    if '://' not in base:
+        return os.path.join(base, file_name)
+
+    return base.rstrip('/') + '/' + file_name
+
+
+def local_path(url):
+    """
+    Return the local path that the given URL refers to (None if it's not a local file).
+    """
+    if url.startswith('file://'):
+        return urllib.request.url2pathname(urllib.parse.urlparse(url).path)
+
+    if '://' not in url:
+        return url
+
+    return None
+
+
+def sha256sum(path):
+    sha256 = hashlib.sha256()
+
+    with open(path, 'rb') as fid:
+        for chunk in iter(lambda: fid.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+
+    with open(manifest_path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(manifest_path, manifest):
+    with open(manifest_path + '.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+        manifest_file.write('\n')
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def record_checksum(path, manifest_path = DEFAULT_MANIFEST_PATH):
+    """
+    Record the checksum of a (trusted) copy of a model in the manifest, so that any later download gets verified against it.
+    """
+    checksum = sha256sum(path)
+
+    manifest = load_manifest(manifest_path)
+    manifest[os.path.basename(path)] = checksum
+    save_manifest(manifest_path, manifest)
+
+    return checksum
+
+
+def warn_unverified(file_name, checksum, manifest_path):
+    print('\n' + '!' * 80)
+    print('-- WARNING: {} is not listed in {}, so it could NOT be verified.'.format(file_name, manifest_path))
+    print('-- Its SHA-256 checksum is: {}'.format(checksum))
+    print('-- It is used anyway, since {} is set.'.format(ALLOW_UNVERIFIED_ENV_VARIABLE))
+    print('!' * 80 + '\n')
+
+
+class ProgressPrinter:
+    """
+    Print the progress of a download at most once every (interval) seconds.
+    """
+    def __init__(self, total_size, interval = PROGRESS_INTERVAL):
+        self.total_size = total_size
+        self.interval = interval
+        self.last_printed = 0.0
+
+
+    def update(self, downloaded_size, done = False):
+        now = time.time()
+        if not done and now - self.last_printed < self.interval:
+            return
+
+        self.last_printed = now
+
+        if self.total_size:
+            print('-- Downloaded {:.1f}/{:.1f} MB ({:.0f}%)'.format(
+                downloaded_size / 1024.0 ** 2,
+                self.total_size / 1024.0 ** 2,
+                100.0 * downloaded_size / self.total_size))
+        else:
+            print('-- Downloaded {:.1f} MB'.format(downloaded_size / 1024.0 ** 2))
+
+
+def copy_local_file(source_path, part_path):
+    """
+    Copy a file from a local mirror into the (.part) file.
+    """
+    if not os.path.isfile(source_path):
+        raise IOError('Model was not found in the mirror: ' + source_path)
+
+    shutil.copyfile(source_path, part_path)
+
+
+def fetch_url(url, part_path, timeout = DEFAULT_TIMEOUT):
+    """
+    Stream a file from a given URL into the (.part) file, resuming from its current size if it already exists.
+    """
+    resume_from = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+    request = urllib.request.Request(url)
+    if resume_from:
+        request.add_header('Range', 'bytes={}-'.format(resume_from))
+
+    try:
+        response = urllib.request.urlopen(request, timeout = timeout)
+    except urllib.error.HTTPError as error:
+        # the (.part) file is already complete
+        if error.code == 416 and resume_from:
+            return
+        raise
+
+    with response:
+        # the server might not support range requests, and send the whole file instead
+        if resume_from and response.getcode() != 206:
+            resume_from = 0
+
+        content_length = response.headers.get('Content-Length')
+        total_size = resume_from + int(content_length) if content_length else None
+
+        if resume_from:
+            print('-- Resuming download from {:.1f} MB'.format(resume_from / 1024.0 ** 2))
+
+        progress = ProgressPrinter(total_size)
+        downloaded_size = resume_from
+
+        with open(part_path, 'ab' if resume_from else 'wb') as part_file:
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                part_file.write(chunk)
+                downloaded_size += len(chunk)
+                progress.update(downloaded_size)
+
+        progress.update(downloaded_size, done = True)
+
+        if total_size is not None and downloaded_size < total_size:
+            raise IOError('Download was interrupted at {} of {} bytes'.format(downloaded_size, total_size))
+
+
+def download_file(file_name, destination_path,
+    base = None,
+    manifest_path = None,
+    allow_unverified = None,
+    timeout = DEFAULT_TIMEOUT,
+    max_retries = MAX_RETRIES):
+    """
+    Download a given file from the given server (or mirror directory) to (destination_path),
+    then verify its checksum against the manifest (DEFAULT_MANIFEST_PATH by default).
+    Files that are not listed in the manifest are deleted, unless (allow_unverified) is set
+    (by default, if the DEEPEYE_ALLOW_UNVERIFIED_MODELS environment variable is set).
+    """
+    if base is None:
+        base = download_base()
+
+    if manifest_path is None:
+        manifest_path = DEFAULT_MANIFEST_PATH
+
+    if allow_unverified is None:
+        allow_unverified = allow_unverified_models()
+
+    url = file_url(base, file_name)
+    part_path = destination_path + '.part'
+
+    source_path = local_path(url)
+    if source_path is not None:
+        copy_local_file(source_path, part_path)
+    else:
+        for attempt in range(max_retries + 1):
+            try:
+                fetch_url(url, part_path, timeout)
+                break
+            except (IOError, OSError) as error:
+                # HTTP errors (i.e. 404) won't go away by retrying
+                if isinstance(error, urllib.error.HTTPError) or attempt == max_retries:
+                    raise
+                print('-- Download failed ({}), retrying...'.format(error))
+
+    checksum = sha256sum(part_path)
+    expected_checksum = load_manifest(manifest_path).get(file_name)
+
+    if expected_checksum is None:
+        if not allow_unverified:
+            os.remove(part_path)
+            raise IOError(('{} is not listed in {}, so it could not be verified (its SHA-256 checksum is {}). '
+                'Record the checksum of a trusted copy using: python -m object_classifier.download_utils --record <path to {}>, '
+                'or set {}=1 to use unverified models anyway.').format(
+                file_name, manifest_path, checksum, file_name, ALLOW_UNVERIFIED_ENV_VARIABLE))
+
+        warn_unverified(file_name, checksum, manifest_path)
+
+    elif checksum != expected_checksum:
+        os.remove(part_path)
+        raise IOError('Checksum mismatch for {}: expected {}, got {}'.format(file_name, expected_checksum, checksum))
+
+    os.replace(part_path, destination_path)
+
+    return destination_path
+
+
+def extract_file(archive_path, file_name, destination_path):
+    """
+    Extract a given file from a (.tar.gz) archive to (destination_path), in a single streaming pass over the archive.
+    """
+    with tarfile.open(archive_path, 'r|gz') as tar_file:
+        for member in tar_file:
+            if member.isfile() and os.path.basename(member.name) == file_name:
+                destination_directory = os.path.dirname(destination_path)
+                if destination_directory and not os.path.exists(destination_directory):
+                    os.makedirs(destination_directory)
+
+                with tar_file.extractfile(member) as source_file, open(destination_path + '.tmp', 'wb') as destination_file:
+                    shutil.copyfileobj(source_file, destination_file, CHUNK_SIZE)
+                os.replace(destination_path + '.tmp', destination_path)
+
+                return destination_path
+
+    raise IOError('{} was not found in: {}'.format(file_name, archive_path))
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Record the checksums of trusted copies of the models in the manifest.')
+    parser.add_argument('--record', nargs='+', required=True, metavar='MODEL_FILE',
+        help='path of a (.tar.gz) model, i.e. object_classifier/object_detection/faster_rcnn_resnet101_coco_2017_11_08.tar.gz')
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST_PATH, help='path of the manifest')
+    args = parser.parse_args(argv)
+
+    for path in args.record:
+        print('-- {}: {}'.format(os.path.basename(path), record_checksum(path, args.manifest)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+# coding: utf-8
+"""
+Tests for download_utils.py, using a local (file://) mirror and a local HTTP server as stand-ins for the model server.
+
+- Usage (run from the src folder):
+    python -m unittest object_classifier.download_utils_test
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import six.moves.urllib as urllib
+
+import object_classifier.download_utils as download_utils
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+MODEL_FILE = 'test_model_2017_11_08.tar.gz'
+MODEL_CONTENT = b'not really a tarball' * 1000
+# ---------------------------------------------------------------------------- #
+
+
+class DownloadFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        self.mirror = os.path.join(self.directory, 'mirror')
+        os.makedirs(self.mirror)
+        with open(os.path.join(self.mirror, MODEL_FILE), 'wb') as model_file:
+            model_file.write(MODEL_CONTENT)
+
+        self.base = 'file://' + urllib.request.pathname2url(self.mirror)
+        self.manifest_path = os.path.join(self.directory, download_utils.MANIFEST_NAME)
+        self.destination_path = os.path.join(self.directory, 'models', MODEL_FILE)
+        os.makedirs(os.path.dirname(self.destination_path))
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def write_manifest(self, checksum):
+        with open(self.manifest_path, 'w') as manifest_file:
+            json.dump({MODEL_FILE: checksum}, manifest_file)
+
+
+    def download(self, **kwargs):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            download_utils.download_file(MODEL_FILE, self.destination_path,
+                base = self.base,
+                manifest_path = self.manifest_path,
+                **kwargs)
+        return output.getvalue()
+
+
+    def test_matching_checksum(self):
+        self.write_manifest(hashlib.sha256(MODEL_CONTENT).hexdigest())
+
+        output = self.download()
+
+        with open(self.destination_path, 'rb') as model_file:
+            self.assertEqual(model_file.read(), MODEL_CONTENT)
+        self.assertFalse(os.path.exists(self.destination_path + '.part'))
+        self.assertNotIn('WARNING', output)
+
+
+    def test_mismatched_checksum(self):
+        self.write_manifest(hashlib.sha256(b'the trusted copy').hexdigest())
+
+        with self.assertRaises(IOError):
+            self.download()
+
+        # the corrupted copy is deleted, so the next attempt downloads it again
+        self.assertFalse(os.path.exists(self.destination_path))
+        self.assertFalse(os.path.exists(self.destination_path + '.part'))
+
+
+    def test_unlisted_model_is_not_trusted(self):
+        self.write_manifest(None)
+
+        with self.assertRaises(IOError) as context:
+            self.download(allow_unverified = False)
+
+        self.assertIn(hashlib.sha256(MODEL_CONTENT).hexdigest(), str(context.exception))
+        self.assertFalse(os.path.exists(self.destination_path))
+        self.assertFalse(os.path.exists(self.destination_path + '.part'))
+        # the checksum of an unverified download is never recorded
+        self.assertEqual(download_utils.load_manifest(self.manifest_path), {MODEL_FILE: None})
+
+
+    def test_unlisted_model_is_used_when_allowed(self):
+        self.write_manifest(None)
+
+        output = self.download(allow_unverified = True)
+
+        self.assertIn('WARNING', output)
+        self.assertIn(hashlib.sha256(MODEL_CONTENT).hexdigest(), output)
+        self.assertTrue(os.path.exists(self.destination_path))
+        self.assertEqual(download_utils.load_manifest(self.manifest_path), {MODEL_FILE: None})
+
+
+    def test_record_checksum(self):
+        self.write_manifest(None)
+
+        download_utils.record_checksum(os.path.join(self.mirror, MODEL_FILE), self.manifest_path)
+
+        self.assertEqual(download_utils.load_manifest(self.manifest_path),
+            {MODEL_FILE: hashlib.sha256(MODEL_CONTENT).hexdigest()})
+        self.download()
+
+
+
+class ModelRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serve MODEL_CONTENT, honoring (or ignoring) range requests, and cutting off the first (truncated_responses) responses halfway.
+    """
+    def do_GET(self):
+        server = self.server
+        server.range_headers.append(self.headers.get('Range'))
+
+        start = 0
+        if server.support_ranges and self.headers.get('Range'):
+            start = int(self.headers['Range'].split('=')[1].rstrip('-'))
+
+        if start >= len(MODEL_CONTENT):
+            self.send_response(416)
+            self.end_headers()
+            return
+
+        body = MODEL_CONTENT[start:]
+
+        self.send_response(206 if start else 200)
+        self.send_header('Content-Length', str(len(body)))
+        if start:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, len(MODEL_CONTENT) - 1, len(MODEL_CONTENT)))
+        self.end_headers()
+
+        if server.truncated_responses:
+            server.truncated_responses -= 1
+            body = body[:len(body) // 2]
+            self.close_connection = True
+
+        self.wfile.write(body)
+
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPDownloadTest(DownloadFileTest):
+
+    def setUp(self):
+        DownloadFileTest.setUp(self)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ModelRequestHandler)
+        self.server.support_ranges = True
+        self.server.truncated_responses = 0
+        self.server.range_headers = []
+
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+
+        self.base = 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+        self.write_manifest(hashlib.sha256(MODEL_CONTENT).hexdigest())
+
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+        DownloadFileTest.tearDown(self)
+
+
+    def write_part(self, content):
+        with open(self.destination_path + '.part', 'wb') as part_file:
+            part_file.write(content)
+
+
+    def read_destination(self):
+        with open(self.destination_path, 'rb') as model_file:
+            return model_file.read()
+
+
+    def test_resume_with_partial_content(self):
+        self.write_part(MODEL_CONTENT[:5000])
+
+        output = self.download()
+
+        self.assertEqual(self.server.range_headers, ['bytes=5000-'])
+        self.assertIn('Resuming', output)
+        self.assertEqual(self.read_destination(), MODEL_CONTENT)
+        self.assertFalse(os.path.exists(self.destination_path + '.part'))
+
+
+    def test_resume_without_range_support(self):
+        # the server sends the whole file (200) instead, so the (.part) file has to be overwritten rather than appended to
+        self.server.support_ranges = False
+        self.write_part(b'x' * 5000)
+
+        self.download()
+
+        self.assertEqual(self.server.range_headers, ['bytes=5000-'])
+        self.assertEqual(self.read_destination(), MODEL_CONTENT)
+
+
+    def test_complete_part_file(self):
+        self.write_part(MODEL_CONTENT)
+
+        self.download()
+
+        self.assertEqual(self.read_destination(), MODEL_CONTENT)
+
+
+    def test_truncated_download_is_resumed(self):
+        self.server.truncated_responses = 1
+
+        self.download()
+
+        self.assertEqual(len(self.server.range_headers), 2)
+        self.assertEqual(self.server.range_headers[0], None)
+        self.assertEqual(self.server.range_headers[1], 'bytes={}-'.format(len(MODEL_CONTENT) // 2))
+        self.assertEqual(self.read_destination(), MODEL_CONTENT)
+
+
+    def test_truncated_download_keeps_part_file(self):
+        self.server.truncated_responses = 1
+
+        with self.assertRaises(IOError):
+            self.download(max_retries = 0)
+
+        # the next attempt resumes from there
+        self.assertEqual(os.path.getsize(self.destination_path + '.part'), len(MODEL_CONTENT) // 2)
+        self.assertFalse(os.path.exists(self.destination_path))
+
+
+    def test_mismatched_resumed_download_is_deleted(self):
+        self.write_part(b'x' * 5000)
+
+        with self.assertRaises(IOError):
+            self.download()
+
+        self.assertFalse(os.path.exists(self.destination_path))
+        self.assertFalse(os.path.exists(self.destination_path + '.part'))
+
+        self.download()
+        self.assertEqual(self.read_destination(), MODEL_CONTENT)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+# coding: utf-8
+"""
+The functions below optimize a frozen inference graph downloaded from the Tensorflow Object Detection API
+for CPU inference at a fixed frame size, and cache the result next to the original graph.
+
+The optimized graph is produced using the Graph Transform Tool, which applies the following transformations:
+    - strip_unused_nodes: remove the nodes that are not needed to compute the detections,
+        and fix the shape of the input tensor to the size of the captured frames.
+    - remove_nodes / remove_device / remove_attribute: strip leftovers of the training process
+        (i.e. numeric checks, device placements and colocation constraints).
+    - fold_constants: pre-compute every part of the graph that only depends on constants
+        (with a fixed input shape, this includes most of the pre-processing).
+    - fold_batch_norms / fold_old_batch_norms: merge batch normalization into the weights of the convolutions.
+    - quantize_weights (optional): store the weights of the model as 8-bit integers.
+
+- Usage (run from the src folder):
+    python -m object_classifier.graph_utils <classifier_codename> --width 1280 --height 720 [--quantize]
+
+    The ObjectClassifier loads the optimized graph by default if it was found for the size of the captured frames.
+
+- Reduced-precision models:
+    Appending QUANTIZED_SUFFIX to the codename of any pre-trained model (i.e. faster_rcnn_resnet101_coco_2017_11_08_quantized)
+    refers to a copy of the model with its weights stored as 8-bit integers, which is generated from the original model
+    the first time it gets used. Note: only the weights are quantized (the model is about 4x smaller on disk);
+    they are converted back to float32 when the graph is loaded, so the detections may differ slightly from the original model.
+    Use profiling/classifier_report.py to compare the accuracy and speed of both models.
+
+----------------------
+
+Sources:
+- Graph Transform Tool:
+    https://github.com/tensorflow/tensorflow/blob/master/tensorflow/tools/graph_transforms/README.md
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import argparse
+import contextlib
+import mmap
+import os
+
+# Note: tensorflow is imported by the functions that need it,
+# so that the GUI could use the codename helpers below without loading it at startup
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+# file name of the optimized graph (cached next to the original frozen graph)
+OPTIMIZED_GRAPH_NAME = 'optimized_inference_graph_{width}x{height}.pb'
+
+# suffix of the codename of the reduced-precision (8-bit weights) version of a pre-trained model
+QUANTIZED_SUFFIX = '_quantized'
+
+INPUT_NODE = 'image_tensor'
+OUTPUT_NODES = ['detection_boxes', 'detection_scores', 'detection_classes', 'num_detections']
+
+# only available in Mask R-CNN models
+MASK_OUTPUT_NODE = 'detection_masks'
+# ---------------------------------------------------------------------------- #
+
+
+def is_quantized(classifier_codename):
+    return classifier_codename.endswith(QUANTIZED_SUFFIX)
+
+
+def base_codename(classifier_codename):
+    """
+    Return the codename of the original model that a (quantized) codename refers to.
+    """
+    if is_quantized(classifier_codename):
+        return classifier_codename[:-len(QUANTIZED_SUFFIX)]
+
+    return classifier_codename
+
+
+def quantized_codename(classifier_codename):
+    return base_codename(classifier_codename) + QUANTIZED_SUFFIX
+
+
+def optimized_graph_path(frozen_graph_path, frame_width, frame_height):
+    """
+    Return the path of the optimized graph cached next to the given frozen graph.
+    """
+    return os.path.join(
+        os.path.dirname(frozen_graph_path),
+        OPTIMIZED_GRAPH_NAME.format(width = int(frame_width), height = int(frame_height)))
+
+
+def load_graph_def(graph_path):
+    """
+    Read a serialized GraphDef from the given file.
+
+    The file is memory-mapped and parsed in place, instead of being read into a bytes object first,
+    which avoids an extra read buffer holding the whole file while it's parsed.
+    The parsed GraphDef (and the graph it's imported into) still holds its own private copy of the weights.
+    """
+    import tensorflow as tf
+
+    graph_def = tf.GraphDef()
+    with open(graph_path, 'rb') as fid:
+        with contextlib.closing(mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ)) as mapped_file:
+            # the file is read once from start to end
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mapped_file.madvise(mmap.MADV_SEQUENTIAL)
+
+            # the view needs to be released before the file gets unmapped
+            with memoryview(mapped_file) as serialized_graph:
+                graph_def.ParseFromString(serialized_graph)
+
+    return graph_def
+
+
+def get_transforms(frame_width = None, frame_height = None, quantize = False):
+    """
+    Return the list of transformations applied to the frozen graph.
+    The input shape is only fixed if the frame size was given.
+    """
+    transforms = []
+
+    if frame_width and frame_height:
+        transforms.append(
+            'strip_unused_nodes(type=uint8, shape="1,{},{},3")'.format(int(frame_height), int(frame_width)))
+
+    transforms += [
+        'remove_nodes(op=CheckNumerics)',
+        'remove_device',
+        'remove_attribute(attribute_name=_class)',
+        'fold_constants(ignore_errors=true)',
+        'fold_batch_norms',
+        'fold_old_batch_norms',
+    ]
+
+    if quantize:
+        transforms.append('quantize_weights')
+
+    transforms.append('sort_by_execution_order')
+
+    return transforms
+
+
+def transform_graph(input_path, output_path, transforms):
+    """
+    Apply the given transformations to a frozen graph, and save the result to (output_path).
+    """
+    import tensorflow as tf
+    from tensorflow.tools.graph_transforms import TransformGraph
+
+    input_graph_def = load_graph_def(input_path)
+
+    output_nodes = list(OUTPUT_NODES)
+    if any(node.name == MASK_OUTPUT_NODE for node in input_graph_def.node):
+        output_nodes.append(MASK_OUTPUT_NODE)
+
+    output_graph_def = TransformGraph(
+        input_graph_def,
+        [INPUT_NODE],
+        output_nodes,
+        transforms)
+
+    # write to a temporary file first, so that an interrupted run never leaves a broken cache behind
+    with tf.gfile.GFile(output_path + '.tmp', 'wb') as fid:
+        fid.write(output_graph_def.SerializeToString())
+    os.replace(output_path + '.tmp', output_path)
+
+    print('-- Nodes: {} => {}'.format(len(input_graph_def.node), len(output_graph_def.node)))
+    print('-- Size: {:.1f} MB => {:.1f} MB'.format(
+        os.path.getsize(input_path) / 1024.0 ** 2,
+        os.path.getsize(output_path) / 1024.0 ** 2))
+
+
+def optimize_frozen_graph(frozen_graph_path, frame_width, frame_height, quantize = False, output_path = None):
+    """
+    Optimize a frozen inference graph for a fixed frame size, then save it next to the original graph.
+    Return the path of the optimized graph.
+    """
+    if output_path is None:
+        output_path = optimized_graph_path(frozen_graph_path, frame_width, frame_height)
+
+    print('\n\n-- Optimizing classifier model for {}x{} frames...'.format(int(frame_width), int(frame_height)))
+    transform_graph(frozen_graph_path, output_path, get_transforms(frame_width, frame_height, quantize))
+    print('-- Saved optimized classifier model to:', output_path)
+
+    return output_path
+
+
+def quantize_frozen_graph(frozen_graph_path, output_path):
+    """
+    Store the weights of a frozen inference graph as 8-bit integers (for any frame size).
+    Return the path of the quantized graph.
+    """
+    output_directory = os.path.dirname(output_path)
+    if output_directory and not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+
+    print('\n\n-- Quantizing classifier model weights...')
+    transform_graph(frozen_graph_path, output_path, get_transforms(quantize = True))
+    print('-- Saved quantized classifier model to:', output_path)
+
+    return output_path
+
+
+def main(argv = None):
+    from object_classifier.ObjectClassifier import ObjectClassifier
+
+    parser = argparse.ArgumentParser(
+        description='Optimize a pre-trained model of the Tensorflow Object Detection API for CPU inference.')
+    parser.add_argument('classifier_codename', help='codename of the pre-trained model (i.e. faster_rcnn_resnet101_coco_2017_11_08)')
+    parser.add_argument('--width', type=int, required=True, help='width of the captured frames')
+    parser.add_argument('--height', type=int, required=True, help='height of the captured frames')
+    parser.add_argument('--quantize', action='store_true',
+        help='store the weights of the model as 8-bit integers (same as passing the quantized codename)')
+    args = parser.parse_args(argv)
+
+    classifier_codename = args.classifier_codename
+    if args.quantize:
+        classifier_codename = quantized_codename(classifier_codename)
+
+    object_detector = ObjectClassifier(
+        classifier_codename = classifier_codename,
+        frame_height = args.height,
+        frame_width = args.width)
+
+    # download the model if it hasn't been already downloaded to your device
+    object_detector.download_model()
+
+    # Note: the weights get quantized after folding constants, so quantized models are optimized
+    # from the original graph (folding the quantized graph would convert its weights back to float32)
+    optimize_frozen_graph(object_detector.PATH_TO_BASE_CKPT, args.width, args.height,
+        quantize = is_quantized(classifier_codename),
+        output_path = object_detector.PATH_TO_OPTIMIZED_CKPT)
+
+
+if __name__ == '__main__':
+    main()
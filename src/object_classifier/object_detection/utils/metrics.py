@@ -67,15 +67,24 @@ def compute_precision_recall(scores, labels, num_gt):
   return precision, recall
 
 
-def compute_average_precision(precision, recall):
+def compute_average_precision(precision, recall, num_recall_points=None):
   """Compute Average Precision according to the definition in VOCdevkit.
 
   Precision is modified to ensure that it does not decrease as recall
   decrease.
 
+  If num_recall_points is given, the interpolated Average Precision is computed
+  instead, as done in the COCO API (101 points): the mean of the modified
+  precision at `num_recall_points` evenly spaced recall thresholds in [0, 1],
+  where the precision at a threshold is the one at the first recall that
+  reaches it (0 if no recall reaches it).
+
   Args:
     precision: A float [N, 1] numpy array of precisions
     recall: A float [N, 1] numpy array of recalls
+    num_recall_points: (optional) number of recall thresholds used to
+      interpolate the precision, e.g. 101 for COCO. If None, the area under the
+      precision recall curve is computed instead.
 
   Raises:
     ValueError: if the input is not of the correct format
@@ -97,21 +106,26 @@ def compute_average_precision(precision, recall):
     raise ValueError("input must be float numpy array.")
   if len(precision) != len(recall):
     raise ValueError("precision and recall must be of the same size.")
+  if num_recall_points is not None and num_recall_points < 2:
+    raise ValueError("num_recall_points must be at least 2.")
   if not precision.size:
     return 0.0
   if np.amin(precision) < 0 or np.amax(precision) > 1:
     raise ValueError("Precision must be in the range of [0, 1].")
   if np.amin(recall) < 0 or np.amax(recall) > 1:
     raise ValueError("recall must be in the range of [0, 1].")
-  if not all(recall[i] <= recall[i + 1] for i in range(len(recall) - 1)):
+  if not np.all(np.diff(recall) >= 0):
     raise ValueError("recall must be a non-decreasing array")
 
+  if num_recall_points is not None:
+    return _compute_interpolated_average_precision(precision, recall,
+                                                   num_recall_points)
+
   recall = np.concatenate([[0], recall, [1]])
   precision = np.concatenate([[0], precision, [0]])
 
   # Preprocess precision to be a non-decreasing array
-  for i in range(len(precision) - 2, -1, -1):
-    precision[i] = np.maximum(precision[i], precision[i + 1])
+  precision = np.maximum.accumulate(precision[::-1])[::-1]
 
   indices = np.where(recall[1:] != recall[:-1])[0] + 1
   average_precision = np.sum(
@@ -119,6 +133,28 @@ def compute_average_precision(precision, recall):
   return average_precision
 
 
+def _compute_interpolated_average_precision(precision, recall,
+                                            num_recall_points):
+  """Computes the interpolated Average Precision of a validated curve.
+
+  Args:
+    precision: A float [N] numpy array of precisions
+    recall: A float [N] non-decreasing numpy array of recalls
+    num_recall_points: number of evenly spaced recall thresholds in [0, 1]
+
+  Returns:
+    average_precison: The mean interpolated precision over the recall
+      thresholds.
+  """
+  precision = np.maximum.accumulate(precision[::-1])[::-1]
+  recall_thresholds = np.linspace(0.0, 1.0, num_recall_points)
+  indices = np.searchsorted(recall, recall_thresholds, side="left")
+  interpolated_precision = np.zeros(num_recall_points, dtype=float)
+  reached = indices < len(recall)
+  interpolated_precision[reached] = precision[indices[reached]]
+  return np.mean(interpolated_precision)
+
+
 def compute_cor_loc(num_gt_imgs_per_class,
                     num_images_correctly_detected_per_class):
   """Compute CorLoc according to the definition in the following paper.
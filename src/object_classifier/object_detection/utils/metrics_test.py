@@ -62,6 +62,39 @@ class MetricsTest(tf.test.TestCase):
     mean_ap = metrics.compute_average_precision(precision, recall)
     self.assertAlmostEqual(expected_mean_ap, mean_ap)
 
+  def test_compute_average_precision_matches_envelope_loop(self):
+    np.random.seed(0)
+    scores = np.random.rand(1000)
+    labels = np.random.rand(1000) < 0.3
+    precision, recall = metrics.compute_precision_recall(scores, labels, 400)
+    padded_recall = np.concatenate([[0], recall, [1]])
+    padded_precision = np.concatenate([[0], precision, [0]])
+    for i in range(len(padded_precision) - 2, -1, -1):
+      padded_precision[i] = np.maximum(padded_precision[i],
+                                       padded_precision[i + 1])
+    indices = np.where(padded_recall[1:] != padded_recall[:-1])[0] + 1
+    expected_mean_ap = np.sum(
+        (padded_recall[indices] - padded_recall[indices - 1]) *
+        padded_precision[indices])
+    mean_ap = metrics.compute_average_precision(precision, recall)
+    self.assertEqual(expected_mean_ap, mean_ap)
+
+  def test_compute_interpolated_average_precision(self):
+    precision = np.array([0.8, 0.76, 0.9, 0.65, 0.7, 0.5, 0.55, 0], dtype=float)
+    recall = np.array([0.3, 0.3, 0.4, 0.4, 0.45, 0.45, 0.5, 0.5], dtype=float)
+    # Thresholds 0.0 to 0.4 reach a precision of 0.9, 0.41 to 0.45 reach 0.7,
+    # 0.46 to 0.5 reach 0.55 and the rest are never reached.
+    expected_mean_ap = (41 * 0.9 + 5 * 0.7 + 5 * 0.55) / 101
+    mean_ap = metrics.compute_average_precision(
+        precision, recall, num_recall_points=101)
+    self.assertAlmostEqual(expected_mean_ap, mean_ap)
+
+  def test_compute_average_precision_with_decreasing_recall(self):
+    precision = np.array([0.5, 0.5, 0.5], dtype=float)
+    recall = np.array([0.1, 0.3, 0.2], dtype=float)
+    with self.assertRaises(ValueError):
+      metrics.compute_average_precision(precision, recall)
+
   def test_compute_precision_recall_and_ap_no_groundtruth(self):
     num_gt = 0
     scores = np.array([0.4, 0.3, 0.6, 0.2, 0.7, 0.1], dtype=float)
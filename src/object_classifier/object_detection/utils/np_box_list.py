@@ -15,6 +15,8 @@
 
 """Numpy BoxList classes and functions."""
 
+import collections
+
 import numpy as np
 
 
@@ -28,13 +30,31 @@ class BoxList(object):
 
   Optionally, users can add additional related fields (such as
   objectness/classification scores).
+
+  The fields are stored as columns, each one along with the index array of its
+  rows (or None if the column is already in the order of the boxes). Gathering
+  boxes (see gather) only composes these index arrays, and shares the columns
+  with the original BoxList: the rows of a field are copied the first time the
+  field is accessed, so chained operations (i.e. filtering, then sorting, then
+  non maximum suppression) never copy the fields that they don't use.
+
+  As a result, a gathered BoxList is not a snapshot of the original one: until
+  a field is first accessed on it, it reads the rows from the array that was
+  passed to the constructor or to add_field. Modifying that array in place
+  after a gather changes the gathered field as well; copy the array first (or
+  access the gathered fields) to avoid it.
   """
 
-  def __init__(self, data):
+  __slots__ = ('_fields', '_num_boxes')
+
+  def __init__(self, data, validate=True):
     """Constructs box collection.
 
     Args:
       data: a numpy array of shape [N, 4] representing box coordinates
+      validate: whether to check that y_min <= y_max and x_min <= x_max for
+        every box. Operations that build a BoxList from an existing (valid)
+        BoxList skip this check.
 
     Raises:
       ValueError: if bbox data is not a numpy array
@@ -46,21 +66,22 @@ class BoxList(object):
       raise ValueError('Invalid dimensions for box data.')
     if data.dtype != np.float32 and data.dtype != np.float64:
       raise ValueError('Invalid data type for box data: float is required.')
-    if not self._is_valid_boxes(data):
+    if validate and not self._is_valid_boxes(data):
       raise ValueError('Invalid box data. data must be a numpy array of '
                        'N*[y_min, x_min, y_max, x_max]')
-    self.data = {'boxes': data}
+    self._fields = collections.OrderedDict([('boxes', (data, None))])
+    self._num_boxes = data.shape[0]
 
   def num_boxes(self):
     """Return number of boxes held in collections."""
-    return self.data['boxes'].shape[0]
+    return self._num_boxes
 
   def get_extra_fields(self):
     """Return all non-box fields."""
-    return [k for k in self.data.keys() if k != 'boxes']
+    return [k for k in self._fields.keys() if k != 'boxes']
 
   def has_field(self, field):
-    return field in self.data
+    return field in self._fields
 
   def add_field(self, field, field_data):
     """Add data to a specified field.
@@ -77,7 +98,7 @@ class BoxList(object):
       raise ValueError('Field ' + field + 'already exists')
     if len(field_data.shape) < 1 or field_data.shape[0] != self.num_boxes():
       raise ValueError('Invalid dimensions for field data')
-    self.data[field] = field_data
+    self._fields[field] = (field_data, None)
 
   def get(self):
     """Convenience function for accesssing box coordinates.
@@ -101,7 +122,12 @@ class BoxList(object):
     """
     if not self.has_field(field):
       raise ValueError('field {} does not exist'.format(field))
-    return self.data[field]
+    column, indices = self._fields[field]
+    if indices is not None:
+      # The rows are gathered only once, on first access.
+      column = column[indices, ...]
+      self._fields[field] = (column, None)
+    return column
 
   def get_coordinates(self):
     """Get corner coordinates of boxes.
@@ -116,6 +142,44 @@ class BoxList(object):
     x_max = box_coordinates[:, 3]
     return [y_min, x_min, y_max, x_max]
 
+  def gather(self, indices, fields=None):
+    """Returns a BoxList holding the given rows, without copying any field.
+
+    The new BoxList shares the columns of this one, along with the composed
+    index arrays of their rows, so the rows of a field are only gathered when
+    the field is accessed. Until then, in-place changes to the original arrays
+    show up in the new BoxList. Indices are not checked (see
+    np_box_list_ops.gather).
+
+    Args:
+      indices: a 1-d numpy array of integer indices into the boxes.
+      fields: (optional) list of extra fields to keep. If None (default), all
+        fields are kept.
+
+    Returns:
+      a BoxList holding len(indices) boxes.
+
+    Raises:
+      ValueError: if a specified field does not exist.
+    """
+    if fields is None:
+      fields = self.get_extra_fields()
+    subboxlist = BoxList.__new__(BoxList)
+    subboxlist._fields = collections.OrderedDict()
+    subboxlist._num_boxes = indices.shape[0]
+    # Fields gathered with the same index array share the composed one.
+    composed_indices = {}
+    for field in ['boxes'] + list(fields):
+      if not self.has_field(field):
+        raise ValueError('field {} does not exist'.format(field))
+      column, column_indices = self._fields[field]
+      key = id(column_indices)
+      if key not in composed_indices:
+        composed_indices[key] = (indices if column_indices is None
+                                 else column_indices[indices])
+      subboxlist._fields[field] = (column, composed_indices[key])
+    return subboxlist
+
   def _is_valid_boxes(self, data):
     """Check whether data fullfills the format of N*[ymin, xmin, ymax, xmin].
 
@@ -126,8 +190,5 @@ class BoxList(object):
       a boolean indicating whether all ymax of boxes are equal or greater than
           ymin, and all xmax of boxes are equal or greater than xmin.
     """
-    if data.shape[0] > 0:
-      for i in range(data.shape[0]):
-        if data[i, 0] > data[i, 2] or data[i, 1] > data[i, 3]:
-          return False
-    return True
+    return not (np.any(data[:, 0] > data[:, 2]) or
+                np.any(data[:, 1] > data[:, 3]))
@@ -20,11 +20,15 @@ Example box operations that are supported:
   * IOU: pairwise intersection-over-union scores
 """
 
+import binascii
+
 import numpy as np
 
 from object_detection.utils import np_box_list
 from object_detection.utils import np_box_ops
 
+# Number of boxes whose overlaps are computed at once by non_max_suppression.
+_NMS_BLOCK_SIZE = 256
 
 class SortOrder(object):
   """Enum class for sort order.
@@ -93,6 +97,38 @@ def ioa(boxlist1, boxlist2):
   return np_box_ops.ioa(boxlist1.get(), boxlist2.get())
 
 
+def max_iou(boxlist1, boxlist2):
+  """Computes the max intersection-over-union of each box with a collection.
+
+  Args:
+    boxlist1: BoxList holding N boxes
+    boxlist2: BoxList holding M boxes, M > 0
+
+  Returns:
+    max_ious: a numpy array with shape [N] representing the max iou score of
+      each box in boxlist1.
+    max_iou_ids: an integer numpy array with shape [N] representing the index
+      of the box in boxlist2 with the max iou score.
+  """
+  return np_box_ops.max_iou(boxlist1.get(), boxlist2.get())
+
+
+def max_ioa(boxlist1, boxlist2):
+  """Computes the max intersection-over-area of each box of boxlist2.
+
+  Args:
+    boxlist1: BoxList holding N boxes, N > 0
+    boxlist2: BoxList holding M boxes
+
+  Returns:
+    max_ioas: a numpy array with shape [M] representing the max ioa score of
+      each box in boxlist2, over the boxes of boxlist1.
+    max_ioa_ids: an integer numpy array with shape [M] representing the index
+      of the box in boxlist1 with the max ioa score.
+  """
+  return np_box_ops.max_ioa(boxlist1.get(), boxlist2.get())
+
+
 def gather(boxlist, indices, fields=None):
   """Gather boxes from BoxList according to indices and return new BoxList.
 
@@ -101,6 +137,12 @@ def gather(boxlist, indices, fields=None):
   first dimension).  However one can optionally only gather from a
   subset of fields.
 
+  No field is copied: the returned BoxList shares the fields of the input
+  BoxList, and their rows are only gathered when they are accessed (see
+  BoxList.gather). So, until a field of the returned BoxList is accessed,
+  modifying the array it was gathered from in place also modifies it; copy
+  the array first if it's going to be modified.
+
   Args:
     boxlist: BoxList holding N boxes
     indices: a 1-d numpy array of type int_
@@ -116,22 +158,23 @@ def gather(boxlist, indices, fields=None):
     ValueError: if specified field is not contained in boxlist or if the
         indices are not of type int_
   """
+  if len(indices.shape) != 1:
+    raise ValueError('indices must be a 1-d array.')
   if indices.size:
+    if not np.issubdtype(indices.dtype, np.integer):
+      raise ValueError('indices must be integers.')
     if np.amax(indices) >= boxlist.num_boxes() or np.amin(indices) < 0:
       raise ValueError('indices are out of valid range.')
-  subboxlist = np_box_list.BoxList(boxlist.get()[indices, :])
-  if fields is None:
-    fields = boxlist.get_extra_fields()
-  for field in fields:
-    extra_field_data = boxlist.get_field(field)
-    subboxlist.add_field(field, extra_field_data[indices, ...])
-  return subboxlist
+  return boxlist.gather(indices.astype(np.int_, copy=False), fields)
 
 
 def sort_by_field(boxlist, field, order=SortOrder.DESCEND):
   """Sort boxes and associated fields according to a scalar field.
 
   A common use case is reordering the boxes according to descending scores.
+  The sort is stable, so boxes with equal values keep their relative order
+  (reversed when sorting in descending order). Like gather, the sorted BoxList
+  shares the fields of the input BoxList until they are accessed.
 
   Args:
     boxlist: BoxList holding N boxes.
@@ -139,7 +182,8 @@ def sort_by_field(boxlist, field, order=SortOrder.DESCEND):
     order: (Optional) 'descend' or 'ascend'. Default is descend.
 
   Returns:
-    sorted_boxlist: A sorted BoxList with the field in the specified order.
+    sorted_boxlist: A sorted BoxList with the field in the specified order,
+      whose fields are gathered lazily from the input BoxList (see gather).
 
   Raises:
     ValueError: if specified field does not exist or is not of single dimension.
@@ -153,7 +197,7 @@ def sort_by_field(boxlist, field, order=SortOrder.DESCEND):
     raise ValueError('Invalid sort order')
 
   field_to_sort = boxlist.get_field(field)
-  sorted_indices = np.argsort(field_to_sort)
+  sorted_indices = np.argsort(field_to_sort, kind='mergesort')
   if order == SortOrder.DESCEND:
     sorted_indices = sorted_indices[::-1]
   return gather(boxlist, sorted_indices)
@@ -208,29 +252,155 @@ def non_max_suppression(boxlist,
     else:
       return boxlist
 
-  boxes = boxlist.get()
-  num_boxes = boxlist.num_boxes()
-  # is_index_valid is True only for all remaining valid boxes,
-  is_index_valid = np.full(num_boxes, 1, dtype=bool)
+  selected_indices = _greedy_non_max_suppression(
+      boxlist.get(), max_output_size, iou_threshold)
+  return gather(boxlist, selected_indices)
+
+
+def _greedy_non_max_suppression(boxes, max_output_size, iou_threshold,
+                                classes=None, block_size=_NMS_BLOCK_SIZE):
+  """Greedy non maximum suppression over boxes sorted by decreasing score.
+
+  Instead of computing the IOU of one selected box against all remaining boxes
+  at a time, the boxes are swept in blocks of block_size boxes:
+    1. The pairwise overlaps between the remaining boxes of the block are
+       computed at once, and each row of the upper triangular overlap mask is
+       packed into an integer bitmask.
+    2. Suppression within the block is resolved by a sweep over the bitmasks.
+    3. The boxes selected in the block suppress all later boxes with a single
+       overlap matrix and reduction.
+  The selected indices are identical to the box-by-box version.
+
+  If classes are given, the boxes must be sorted by class first (then by
+  decreasing score within each class). Boxes only suppress boxes of the same
+  class, and max_output_size applies to each class, which gives the same
+  selection as running non maximum suppression on each class separately, while
+  small classes share the same blocks. As with non_max_suppression, no box is
+  suppressed if iou_threshold is 1.0.
+
+  Args:
+    boxes: a numpy array with shape [N, 4] holding N boxes, sorted by
+      decreasing score (within each class if classes are given).
+    max_output_size: maximum number of retained boxes (per class if classes
+      are given).
+    iou_threshold: intersection over union threshold.
+    classes: (optional) a 1-d numpy array of N non-negative integer class
+      labels, in increasing order.
+    block_size: number of boxes per block.
+
+  Returns:
+    a 1-d numpy array of type int_ with the indices of the selected boxes, in
+    increasing order.
+  """
+  num_boxes = boxes.shape[0]
+  coordinates = np.ascontiguousarray(boxes.T)
+  areas = np_box_ops.area(boxes)
+  is_suppressed = np.zeros(num_boxes, dtype=bool)
   selected_indices = []
-  num_output = 0
-  for i in xrange(num_boxes):
-    if num_output < max_output_size:
-      if is_index_valid[i]:
-        num_output += 1
-        selected_indices.append(i)
-        is_index_valid[i] = False
-        valid_indices = np.where(is_index_valid)[0]
-        if valid_indices.size == 0:
+  if classes is not None:
+    num_selected_per_class = [0] * (np.max(classes) + 1 if classes.size else 1)
+  for start in range(0, num_boxes, block_size):
+    if classes is None and len(selected_indices) >= max_output_size:
+      break
+    end = min(start + block_size, num_boxes)
+    block_indices = start + np.flatnonzero(~is_suppressed[start:end])
+    if block_indices.size == 0:
+      continue
+
+    # The i-th box of the block is the (top_bit - i)-th bit of each bitmask.
+    # Class labels only need to be compared if the block spans several classes.
+    block_classes = None
+    if classes is not None and classes[block_indices[0]] != classes[
+        block_indices[-1]]:
+      block_classes = classes
+    is_overlapping = _is_overlapping(coordinates, areas, block_classes,
+                                     block_indices, block_indices,
+                                     iou_threshold)
+    overlap_masks = np.packbits(np.triu(is_overlapping, k=1), axis=1)
+    top_bit = 8 * overlap_masks.shape[1] - 1
+
+    suppressed_mask = 0
+    block_selection = []
+    if classes is None:
+      for i in range(block_indices.size):
+        if (suppressed_mask >> (top_bit - i)) & 1:
+          continue
+        block_selection.append(i)
+        if len(selected_indices) + len(block_selection) >= max_output_size:
           break
+        suppressed_mask |= int(
+            binascii.hexlify(overlap_masks[i].tobytes()), 16)
+    else:
+      for i, class_label in enumerate(classes[block_indices].tolist()):
+        if ((suppressed_mask >> (top_bit - i)) & 1 or
+            num_selected_per_class[class_label] >= max_output_size):
+          continue
+        block_selection.append(i)
+        num_selected_per_class[class_label] += 1
+        suppressed_mask |= int(
+            binascii.hexlify(overlap_masks[i].tobytes()), 16)
+
+    block_selection = block_indices[block_selection]
+    selected_indices.extend(block_selection)
+    if classes is None:
+      remaining_indices = end + np.flatnonzero(~is_suppressed[end:])
+    else:
+      # Only the remaining boxes of the last class of the block can be
+      # suppressed by the boxes selected in this block.
+      last_class = classes[end - 1]
+      class_end = np.searchsorted(classes, last_class, side='right')
+      if num_selected_per_class[last_class] >= max_output_size:
+        is_suppressed[end:class_end] = True
+      remaining_indices = end + np.flatnonzero(~is_suppressed[end:class_end])
+      block_selection = block_selection[classes[block_selection] == last_class]
+    if remaining_indices.size and block_selection.size:
+      is_suppressed[remaining_indices] = np.any(
+          _is_overlapping(coordinates, areas, None, block_selection,
+                          remaining_indices, iou_threshold), axis=0)
+  return np.array(selected_indices, dtype=np.int_)
+
+
+def _is_overlapping(coordinates, areas, classes, indices1, indices2,
+                    iou_threshold):
+  """Computes whether the IOU between two subsets of boxes exceeds a threshold.
+
+  This computes the same IOU as np_box_ops.iou (operation by operation, so that
+  the results are identical), from coordinates and areas computed once for all
+  boxes, and with fewer [N, M] temporaries.
+
+  Args:
+    coordinates: a numpy array with shape [4, K] holding the [y_min, x_min,
+      y_max, x_max] coordinates of K boxes.
+    areas: a numpy array with shape [K] holding the areas of the K boxes.
+    classes: a numpy array with shape [K] holding the class labels of the K
+      boxes, or None. Boxes of different classes never overlap.
+    indices1: a 1-d numpy array of N indices into the K boxes.
+    indices2: a 1-d numpy array of M indices into the K boxes.
+    iou_threshold: intersection over union threshold.
 
-        intersect_over_union = np_box_ops.iou(
-            np.expand_dims(boxes[i, :], axis=0), boxes[valid_indices, :])
-        intersect_over_union = np.squeeze(intersect_over_union, axis=0)
-        is_index_valid[valid_indices] = np.logical_and(
-            is_index_valid[valid_indices],
-            intersect_over_union <= iou_threshold)
-  return gather(boxlist, np.array(selected_indices))
+  Returns:
+    a boolean numpy array with shape [N, M], True where the IOU is greater than
+    iou_threshold or undefined (boxes with zero area), unless iou_threshold is
+    1.0.
+  """
+  if iou_threshold == 1.0:
+    return np.zeros([len(indices1), len(indices2)], dtype=bool)
+  y_min1, x_min1, y_max1, x_max1 = coordinates[:, indices1, np.newaxis]
+  y_min2, x_min2, y_max2, x_max2 = coordinates[:, indices2]
+  # np_box_ops.intersection computes the intersection in float64.
+  intersect = np.minimum(y_max1, y_max2) - np.maximum(y_min1, y_min2)
+  intersect = np.maximum(intersect, 0.0, out=np.empty(intersect.shape))
+  intersect_widths = np.minimum(x_max1, x_max2) - np.maximum(x_min1, x_min2)
+  intersect_widths = np.maximum(intersect_widths, 0.0,
+                                out=np.empty(intersect_widths.shape))
+  intersect *= intersect_widths
+  union = np.subtract(areas[indices1, np.newaxis] + areas[indices2], intersect,
+                      out=intersect_widths)
+  np.divide(intersect, union, out=intersect)
+  is_overlapping = np.logical_not(intersect <= iou_threshold)
+  if classes is not None:
+    is_overlapping &= classes[indices1, np.newaxis] == classes[indices2]
+  return is_overlapping
 
 
 def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
@@ -242,7 +412,9 @@ def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
   with already selected boxes.  It operates independently for each class for
   which scores are provided (via the scores field of the input box_list),
   pruning boxes with score less than a provided threshold prior to
-  applying NMS.
+  applying NMS. All classes are processed in a single pass, where boxes only
+  suppress boxes of the same class, and classes without any box above the
+  threshold are skipped.
 
   Args:
     boxlist: BoxList holding N boxes.  Must contain a 'scores' field
@@ -282,26 +454,34 @@ def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
     raise ValueError('scores field must be of rank 1 or 2')
   num_boxes = boxlist.num_boxes()
   num_scores = scores.shape[0]
-  num_classes = scores.shape[1]
 
   if num_boxes != num_scores:
     raise ValueError('Incorrect scores field length: actual vs expected.')
 
-  selected_boxes_list = []
-  for class_idx in range(num_classes):
-    boxlist_and_class_scores = np_box_list.BoxList(boxlist.get())
-    class_scores = np.reshape(scores[0:num_scores, class_idx], [-1])
-    boxlist_and_class_scores.add_field('scores', class_scores)
-    boxlist_filt = filter_scores_greater_than(boxlist_and_class_scores,
-                                              score_thresh)
-    nms_result = non_max_suppression(boxlist_filt,
-                                     max_output_size=max_output_size,
-                                     iou_threshold=iou_thresh,
-                                     score_threshold=score_thresh)
-    nms_result.add_field(
-        'classes', np.zeros_like(nms_result.get_field('scores')) + class_idx)
-    selected_boxes_list.append(nms_result)
-  selected_boxes = concatenate(selected_boxes_list)
+  # Only the (box, class) pairs above the threshold are considered, and classes
+  # without any are skipped. The pairs are sorted by class, then by decreasing
+  # score (with the same order of ties as sort_by_field, which sorts the scores
+  # of each class on its own), and suppressed in a single pass where boxes only suppress boxes of
+  # the same class.
+  box_indices, class_indices = np.nonzero(np.greater(scores, score_thresh))
+  sorted_indices = np.lexsort((-box_indices,
+                               -scores[box_indices, class_indices],
+                               class_indices))
+  box_indices = box_indices[sorted_indices]
+  class_indices = class_indices[sorted_indices]
+  selected_indices = _greedy_non_max_suppression(
+      boxlist.get()[box_indices, :], max_output_size, iou_thresh,
+      classes=class_indices)
+
+  # The selected boxes are already concatenated class by class, as if each
+  # class was processed separately, before being sorted by score.
+  box_indices = box_indices[selected_indices]
+  class_indices = class_indices[selected_indices]
+  selected_boxes = gather(boxlist, box_indices, fields=[])
+  selected_scores = scores[box_indices, class_indices]
+  selected_boxes.add_field('scores', selected_scores)
+  selected_boxes.add_field('classes',
+                           class_indices.astype(selected_scores.dtype))
   sorted_boxes = sort_by_field(selected_boxes, 'scores')
   return sorted_boxes
 
@@ -451,7 +631,7 @@ def concatenate(boxlists, fields=None):
     if not isinstance(boxlist, np_box_list.BoxList):
       raise ValueError('all elements of boxlists should be BoxList objects')
   concatenated = np_box_list.BoxList(
-      np.vstack([boxlist.get() for boxlist in boxlists]))
+      np.vstack([boxlist.get() for boxlist in boxlists]), validate=False)
   if fields is None:
     fields = boxlists[0].get_extra_fields()
   for field in fields:
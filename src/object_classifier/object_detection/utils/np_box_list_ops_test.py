@@ -20,6 +20,7 @@ import tensorflow as tf
 
 from object_detection.utils import np_box_list
 from object_detection.utils import np_box_list_ops
+from object_detection.utils import np_box_ops
 
 
 class AreaRelatedTest(tf.test.TestCase):
@@ -382,6 +383,36 @@ class NonMaximumSuppressionTest(tf.test.TestCase):
         boxlist, max_output_size, iou_threshold)
     self.assertAllClose(nms_boxlist.get(), expected_boxes)
 
+  def test_matches_box_by_box_suppression_across_blocks(self):
+    np.random.seed(0)
+    corners = np.random.uniform(0, 100, size=[300, 2])
+    sizes = np.random.uniform(1, 30, size=[300, 2])
+    boxes = np.hstack([corners, corners + sizes])
+    scores = np.random.uniform(size=300)
+    sorted_boxes = boxes[np.argsort(scores)[::-1]]
+
+    for iou_threshold in [0.0, 0.3, 0.7]:
+      for max_output_size in [5, 10000]:
+        is_index_valid = np.ones(300, dtype=bool)
+        expected_indices = []
+        for i in range(300):
+          if is_index_valid[i] and len(expected_indices) < max_output_size:
+            expected_indices.append(i)
+            overlaps = np_box_ops.iou(sorted_boxes[i:i + 1, :],
+                                      sorted_boxes)[0]
+            is_index_valid &= overlaps <= iou_threshold
+        for block_size in [1, 7, 64, 1000]:
+          selected_indices = np_box_list_ops._greedy_non_max_suppression(
+              sorted_boxes, max_output_size, iou_threshold,
+              block_size=block_size)
+          self.assertAllEqual(selected_indices, expected_indices)
+
+      boxlist = np_box_list.BoxList(boxes)
+      boxlist.add_field('scores', scores)
+      nms_boxlist = np_box_list_ops.non_max_suppression(
+          boxlist, 10000, iou_threshold)
+      self.assertAllEqual(nms_boxlist.get(), sorted_boxes[expected_indices])
+
   def test_multiclass_nms(self):
     boxlist = np_box_list.BoxList(
         np.array(
@@ -410,5 +441,68 @@ class NonMaximumSuppressionTest(tf.test.TestCase):
     self.assertAllClose(boxes, expected_boxes)
 
 
+  def test_multiclass_nms_matches_nms_per_class(self):
+    np.random.seed(0)
+    corners = np.random.uniform(0, 100, size=[200, 2])
+    sizes = np.random.uniform(1, 30, size=[200, 2])
+    boxes = np.hstack([corners, corners + sizes])
+    # Most classes have no box above the threshold.
+    scores = np.random.uniform(size=[200, 20]) ** 8
+    scores[:, 3] = 0.0
+    self._assert_multiclass_nms_matches_nms_per_class(boxes, scores)
+
+  def test_multiclass_nms_matches_nms_per_class_with_tied_scores(self):
+    np.random.seed(0)
+    corners = np.random.uniform(0, 100, size=[200, 2])
+    sizes = np.random.uniform(1, 30, size=[200, 2])
+    boxes = np.hstack([corners, corners + sizes])
+    scores = np.round(np.random.uniform(size=[200, 20]), 1)
+    self._assert_multiclass_nms_matches_nms_per_class(boxes, scores)
+
+    # A chain of boxes with the same score, each one overlapping the next.
+    corners = np.arange(40, dtype=float).reshape([40, 1]) * [5.0, 0.0]
+    boxes = np.hstack([corners, corners + 10.0])
+    scores = np.full([40, 1], 0.5)
+    self._assert_multiclass_nms_matches_nms_per_class(boxes, scores)
+
+  def _assert_multiclass_nms_matches_nms_per_class(self, boxes, scores):
+    boxlist = np_box_list.BoxList(boxes)
+    boxlist.add_field('scores', scores)
+    num_classes = scores.shape[1]
+
+    for iou_thresh in [0.2, 0.6, 1.0]:
+      for max_output_size in [3, 1000]:
+        expected_boxes = []
+        expected_scores = []
+        expected_classes = []
+        for class_idx in range(num_classes):
+          class_boxlist = np_box_list.BoxList(boxes)
+          class_boxlist.add_field('scores', scores[:, class_idx])
+          nms_boxlist = np_box_list_ops.non_max_suppression(
+              class_boxlist, max_output_size, iou_thresh, score_threshold=0.2)
+          expected_boxes.append(nms_boxlist.get())
+          expected_scores.append(nms_boxlist.get_field('scores'))
+          expected_classes += [class_idx] * nms_boxlist.num_boxes()
+        expected_scores = np.concatenate(expected_scores)
+        sorted_indices = np.argsort(expected_scores, kind='mergesort')[::-1]
+
+        boxlist_clean = np_box_list_ops.multi_class_non_max_suppression(
+            boxlist, score_thresh=0.2, iou_thresh=iou_thresh,
+            max_output_size=max_output_size)
+        self.assertAllEqual(boxlist_clean.get(),
+                            np.vstack(expected_boxes)[sorted_indices])
+        self.assertAllEqual(boxlist_clean.get_field('scores'),
+                            expected_scores[sorted_indices])
+        self.assertAllEqual(boxlist_clean.get_field('classes'),
+                            np.array(expected_classes)[sorted_indices])
+
+  def test_multiclass_nms_without_boxes_above_threshold(self):
+    boxlist = np_box_list.BoxList(self._boxes)
+    boxlist.add_field('scores', np.zeros([6, 3]))
+    boxlist_clean = np_box_list_ops.multi_class_non_max_suppression(
+        boxlist, score_thresh=0.5, iou_thresh=0.5, max_output_size=3)
+    self.assertEqual(boxlist_clean.num_boxes(), 0)
+    self.assertEqual(boxlist_clean.get_field('classes').shape, (0,))
+
 if __name__ == '__main__':
   tf.test.main()
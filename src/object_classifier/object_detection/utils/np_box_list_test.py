@@ -36,6 +36,19 @@ class BoxListTest(tf.test.TestCase):
     with self.assertRaises(ValueError):
       np_box_list.BoxList(np.array([[0, 1, 1, 3], [3, 1, 1, 5]], dtype=float))
 
+  def test_invalid_box_data_without_validation(self):
+    boxes = np.array([[0, 1, 1, 3], [3, 1, 1, 5]], dtype=float)
+    boxlist = np_box_list.BoxList(boxes, validate=False)
+    self.assertEqual(boxlist.num_boxes(), 2)
+
+    with self.assertRaises(ValueError):
+      np_box_list.BoxList(np.array([[0, 0, 1, 1]], dtype=int), validate=False)
+
+  def test_no_instance_attributes(self):
+    boxlist = np_box_list.BoxList(np.zeros([2, 4]))
+    with self.assertRaises(AttributeError):
+      boxlist.scores = np.zeros(2)
+
   def test_has_field_with_existed_field(self):
     boxes = np.array([[3.0, 4.0, 6.0, 8.0], [14.0, 14.0, 15.0, 15.0],
                       [0.0, 0.0, 20.0, 20.0]],
@@ -131,5 +144,45 @@ class AddExtraFieldTest(tf.test.TestCase):
     self.assertEquals(boxlist.num_boxes(), expected_num_boxes)
 
 
+class GatherTest(tf.test.TestCase):
+
+  def setUp(self):
+    boxes = np.array([[3.0, 4.0, 6.0, 8.0], [14.0, 14.0, 15.0, 15.0],
+                      [0.0, 0.0, 20.0, 20.0]],
+                     dtype=float)
+    self.boxlist = np_box_list.BoxList(boxes)
+    self.boxlist.add_field('scores', np.array([0.5, 0.7, 0.9], dtype=float))
+    self.boxlist.add_field('labels', np.array([[1, 0], [0, 1], [1, 1]]))
+
+  def test_chained_gathers(self):
+    subboxlist = self.boxlist.gather(np.array([2, 0, 1])).gather(
+        np.array([1, 2]), fields=['scores'])
+    self.assertEqual(subboxlist.num_boxes(), 2)
+    self.assertSameElements(subboxlist.get_extra_fields(), ['scores'])
+    self.assertAllEqual(subboxlist.get(), [[3.0, 4.0, 6.0, 8.0],
+                                           [14.0, 14.0, 15.0, 15.0]])
+    self.assertAllEqual(subboxlist.get_field('scores'), [0.5, 0.7])
+
+  def test_gathered_fields_are_independent(self):
+    subboxlist = self.boxlist.gather(np.array([2, 0]))
+    subboxlist.add_field('classes', np.array([3, 1]))
+    self.assertFalse(self.boxlist.has_field('classes'))
+    self.assertAllEqual(subboxlist.get_field('labels'), [[1, 1], [1, 0]])
+    self.assertAllEqual(self.boxlist.get_field('labels'),
+                        [[1, 0], [0, 1], [1, 1]])
+
+  def test_gathered_fields_are_copied_on_access(self):
+    scores = self.boxlist.get_field('scores')
+    subboxlist = self.boxlist.gather(np.array([2, 0]))
+    # The rows are only gathered once the field is accessed.
+    scores[0] = 0.1
+    self.assertAllEqual(subboxlist.get_field('scores'), [0.9, 0.1])
+    scores[2] = 0.2
+    self.assertAllEqual(subboxlist.get_field('scores'), [0.9, 0.1])
+
+  def test_gather_with_invalid_field(self):
+    with self.assertRaises(ValueError):
+      self.boxlist.gather(np.array([0]), fields=['objectness'])
+
 if __name__ == '__main__':
   tf.test.main()
@@ -21,6 +21,17 @@ Example box operations that are supported:
 """
 import numpy as np
 
+# Default max number of bytes of the temporary arrays of max_iou and max_ioa.
+DEFAULT_MAX_MEMORY = 64 * 1024 * 1024
+
+# Min number of pairs of boxes with the same range computed as a block, instead
+# of one pair at a time.
+_MIN_DENSE_BLOCK_SIZE = 4096
+
+# Normalizations of the pairwise intersections.
+_UNION = 'union'
+_AREA2 = 'area2'
+
 
 def area(boxes):
   """Computes area of boxes.
@@ -34,51 +45,43 @@ def area(boxes):
   return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
 
 
-def intersection(boxes1, boxes2):
+def intersection(boxes1, boxes2, dtype=None, out=None, max_memory=None):
   """Compute pairwise intersection areas between boxes.
 
   Args:
     boxes1: a numpy array with shape [N, 4] holding N boxes
     boxes2: a numpy array with shape [M, 4] holding M boxes
+    dtype: (optional) float type of the result, float64 by default. float32
+      halves the memory used, at the cost of precision.
+    out: (optional) a numpy array with shape [N, M] the result is written to.
+      Its type takes precedence over dtype.
+    max_memory: (optional) max number of bytes of the temporary arrays. The
+      pairs are computed in chunks of boxes1 rows to stay within this budget
+      (at least one row at a time). By default, all pairs are computed at once.
 
   Returns:
     a numpy array with shape [N*M] representing pairwise intersection area
   """
-  [y_min1, x_min1, y_max1, x_max1] = np.split(boxes1, 4, axis=1)
-  [y_min2, x_min2, y_max2, x_max2] = np.split(boxes2, 4, axis=1)
-
-  all_pairs_min_ymax = np.minimum(y_max1, np.transpose(y_max2))
-  all_pairs_max_ymin = np.maximum(y_min1, np.transpose(y_min2))
-  intersect_heights = np.maximum(
-      np.zeros(all_pairs_max_ymin.shape),
-      all_pairs_min_ymax - all_pairs_max_ymin)
-  all_pairs_min_xmax = np.minimum(x_max1, np.transpose(x_max2))
-  all_pairs_max_xmin = np.maximum(x_min1, np.transpose(x_min2))
-  intersect_widths = np.maximum(
-      np.zeros(all_pairs_max_xmin.shape),
-      all_pairs_min_xmax - all_pairs_max_xmin)
-  return intersect_heights * intersect_widths
-
-
-def iou(boxes1, boxes2):
+  return _pairwise_overlaps(boxes1, boxes2, None, dtype, out, max_memory)
+
+
+def iou(boxes1, boxes2, dtype=None, out=None, max_memory=None):
   """Computes pairwise intersection-over-union between box collections.
 
   Args:
     boxes1: a numpy array with shape [N, 4] holding N boxes.
     boxes2: a numpy array with shape [M, 4] holding N boxes.
+    dtype: (optional) float type of the result, float64 by default.
+    out: (optional) a numpy array with shape [N, M] the result is written to.
+    max_memory: (optional) max number of bytes of the temporary arrays.
 
   Returns:
     a numpy array with shape [N, M] representing pairwise iou scores.
   """
-  intersect = intersection(boxes1, boxes2)
-  area1 = area(boxes1)
-  area2 = area(boxes2)
-  union = np.expand_dims(area1, axis=1) + np.expand_dims(
-      area2, axis=0) - intersect
-  return intersect / union
+  return _pairwise_overlaps(boxes1, boxes2, _UNION, dtype, out, max_memory)
 
 
-def ioa(boxes1, boxes2):
+def ioa(boxes1, boxes2, dtype=None, out=None, max_memory=None):
   """Computes pairwise intersection-over-area between box collections.
 
   Intersection-over-area (ioa) between two boxes box1 and box2 is defined as
@@ -88,10 +91,395 @@ def ioa(boxes1, boxes2):
   Args:
     boxes1: a numpy array with shape [N, 4] holding N boxes.
     boxes2: a numpy array with shape [M, 4] holding N boxes.
+    dtype: (optional) float type of the result, float64 by default.
+    out: (optional) a numpy array with shape [N, M] the result is written to.
+    max_memory: (optional) max number of bytes of the temporary arrays.
 
   Returns:
     a numpy array with shape [N, M] representing pairwise ioa scores.
   """
-  intersect = intersection(boxes1, boxes2)
-  areas = np.expand_dims(area(boxes2), axis=0)
-  return intersect / areas
+  return _pairwise_overlaps(boxes1, boxes2, _AREA2, dtype, out, max_memory)
+
+
+def max_iou(boxes1, boxes2, dtype=None, max_memory=DEFAULT_MAX_MEMORY):
+  """Computes the max intersection-over-union of each box with a collection.
+
+  This is the same as np.max and np.argmax of iou(boxes1, boxes2) along the
+  second axis, without holding the full [N, M] matrix in memory.
+
+  Args:
+    boxes1: a numpy array with shape [N, 4] holding N boxes.
+    boxes2: a numpy array with shape [M, 4] holding M boxes, M > 0.
+    dtype: (optional) float type of the result, float64 by default.
+    max_memory: max number of bytes of the temporary arrays.
+
+  Returns:
+    max_ious: a numpy array with shape [N] representing the max iou score of
+      each box in boxes1.
+    max_iou_ids: an integer numpy array with shape [N] representing the index
+      of the box in boxes2 with the max iou score (the first one if tied).
+  """
+  return _max_pairwise_overlaps(boxes1, boxes2, _UNION, dtype, max_memory)
+
+
+def max_ioa(boxes1, boxes2, dtype=None, max_memory=DEFAULT_MAX_MEMORY):
+  """Computes the max intersection-over-area of each box of boxes2.
+
+  This is the same as np.max and np.argmax of ioa(boxes1, boxes2) along the
+  first axis (i.e. over the boxes of boxes1), without holding the full [N, M]
+  matrix in memory.
+
+  Args:
+    boxes1: a numpy array with shape [N, 4] holding N boxes, N > 0.
+    boxes2: a numpy array with shape [M, 4] holding M boxes.
+    dtype: (optional) float type of the result, float64 by default.
+    max_memory: max number of bytes of the temporary arrays.
+
+  Returns:
+    max_ioas: a numpy array with shape [M] representing the max ioa score of
+      each box in boxes2.
+    max_ioa_ids: an integer numpy array with shape [M] representing the index
+      of the box in boxes1 with the max ioa score (the first one if tied).
+  """
+  # The intersection over the area of each box in boxes2 is maximal where the
+  # intersection is, so only the max intersection of each box is divided.
+  max_intersections, max_ioa_ids = _max_pairwise_overlaps(
+      boxes2, boxes1, None, dtype, max_memory)
+  max_ioas = np.divide(max_intersections, area(boxes2),
+                       out=max_intersections)
+  return max_ioas, max_ioa_ids
+
+
+def max_iou_in_ranges(boxes1, boxes2, starts, ends, dtype=None,
+                      max_memory=DEFAULT_MAX_MEMORY):
+  """Computes the max intersection-over-union of each box with a range of boxes.
+
+  This is the same as max_iou(boxes1[i:i + 1], boxes2[starts[i]:ends[i]]) for
+  each box i in boxes1 (e.g. the boxes2 of the same class as box i, with boxes2
+  sorted by class), but only the pairs within the ranges are computed, all at
+  once.
+
+  Args:
+    boxes1: a numpy array with shape [N, 4] holding N boxes.
+    boxes2: a numpy array with shape [M, 4] holding M boxes.
+    starts: an integer numpy array with shape [N] holding the first index of
+      the range of boxes2 of each box in boxes1.
+    ends: an integer numpy array with shape [N] holding the end (exclusive) of
+      the range of boxes2 of each box in boxes1.
+    dtype: (optional) float type of the result, float64 by default.
+    max_memory: max number of bytes of the temporary arrays.
+
+  Returns:
+    max_ious: a numpy array with shape [N] representing the max iou score of
+      each box in boxes1 within its range.
+    max_iou_ids: an integer numpy array with shape [N] representing the index
+      of the box in boxes2 with the max iou score (the first one if tied).
+
+  Raises:
+    ValueError: if any range is empty.
+  """
+  return _max_overlaps_in_ranges(boxes1, boxes2, starts, ends, _UNION, dtype,
+                                 max_memory)
+
+
+def max_ioa_in_ranges(boxes1, boxes2, starts, ends, dtype=None,
+                      max_memory=DEFAULT_MAX_MEMORY):
+  """Computes the max intersection-over-area of each box of boxes2 in a range.
+
+  This is the same as max_ioa(boxes1[starts[j]:ends[j]], boxes2[j:j + 1]) for
+  each box j in boxes2, but only the pairs within the ranges are computed, all
+  at once.
+
+  Args:
+    boxes1: a numpy array with shape [N, 4] holding N boxes.
+    boxes2: a numpy array with shape [M, 4] holding M boxes.
+    starts: an integer numpy array with shape [M] holding the first index of
+      the range of boxes1 of each box in boxes2.
+    ends: an integer numpy array with shape [M] holding the end (exclusive) of
+      the range of boxes1 of each box in boxes2.
+    dtype: (optional) float type of the result, float64 by default.
+    max_memory: max number of bytes of the temporary arrays.
+
+  Returns:
+    max_ioas: a numpy array with shape [M] representing the max ioa score of
+      each box in boxes2 within its range.
+    max_ioa_ids: an integer numpy array with shape [M] representing the index
+      of the box in boxes1 with the max ioa score (the first one if tied).
+
+  Raises:
+    ValueError: if any range is empty.
+  """
+  max_intersections, max_ioa_ids = _max_overlaps_in_ranges(
+      boxes2, boxes1, starts, ends, None, dtype, max_memory)
+  max_ioas = np.divide(max_intersections, area(boxes2),
+                       out=max_intersections)
+  return max_ioas, max_ioa_ids
+
+
+def _chunk_size(num_rows, num_columns, itemsizes, max_memory):
+  """Returns the number of rows of [num_rows, num_columns] temporary arrays.
+
+  Args:
+    num_rows: number of rows to be computed.
+    num_columns: number of columns of each row.
+    itemsizes: the item sizes of the temporary arrays, in bytes.
+    max_memory: max number of bytes of the temporary arrays, or None.
+
+  Returns:
+    the number of rows to be computed at once, at least 1.
+  """
+  if max_memory is None:
+    return max(num_rows, 1)
+  row_size = max(num_columns * sum(itemsizes), 1)
+  return int(min(max(max_memory // row_size, 1), max(num_rows, 1)))
+
+
+def _pairwise_overlaps(boxes1, boxes2, normalization, dtype, out, max_memory):
+  """Computes pairwise intersection areas, normalized by a union or an area.
+
+  The operations (and their types) are the same as computing the intersection
+  of all pairs at once, so the results are identical, but each chunk of rows
+  is computed in place using a few reused temporary arrays.
+
+  Args:
+    boxes1: a numpy array with shape [N, 4] holding N boxes.
+    boxes2: a numpy array with shape [M, 4] holding M boxes.
+    normalization: None (intersection), _UNION (iou) or _AREA2 (ioa).
+    dtype: float type of the result, or None (float64).
+    out: a numpy array with shape [N, M] the result is written to, or None.
+    max_memory: max number of bytes of the temporary arrays, or None.
+
+  Returns:
+    a numpy array with shape [N, M].
+
+  Raises:
+    ValueError: if out does not have the shape [N, M].
+  """
+  num_boxes1 = boxes1.shape[0]
+  num_boxes2 = boxes2.shape[0]
+  if out is None:
+    out = np.empty([num_boxes1, num_boxes2], dtype=dtype or np.float64)
+  elif out.shape != (num_boxes1, num_boxes2):
+    raise ValueError('out must have the shape [%d, %d]' %
+                     (num_boxes1, num_boxes2))
+
+  coordinates_type = np.result_type(boxes1, boxes2)
+  chunk_size = _chunk_size(
+      num_boxes1, num_boxes2,
+      [coordinates_type.itemsize] * 2 + [out.dtype.itemsize], max_memory)
+  differences = np.empty([chunk_size, num_boxes2], dtype=coordinates_type)
+  bounds = np.empty([chunk_size, num_boxes2], dtype=coordinates_type)
+  widths = np.empty([chunk_size, num_boxes2], dtype=out.dtype)
+
+  [y_min1, x_min1, y_max1, x_max1] = np.split(boxes1, 4, axis=1)
+  [y_min2, x_min2, y_max2, x_max2] = np.transpose(boxes2)
+  if normalization == _UNION:
+    areas1 = np.expand_dims(area(boxes1), axis=1)
+  if normalization is not None:
+    areas2 = area(boxes2)
+
+  for start in range(0, num_boxes1, chunk_size):
+    end = min(start + chunk_size, num_boxes1)
+    rows = slice(start, end)
+    chunk = out[rows]
+    chunk_differences = differences[:end - start]
+    chunk_bounds = bounds[:end - start]
+    chunk_widths = widths[:end - start]
+
+    np.minimum(y_max1[rows], y_max2, out=chunk_differences)
+    np.maximum(y_min1[rows], y_min2, out=chunk_bounds)
+    np.subtract(chunk_differences, chunk_bounds, out=chunk_differences)
+    np.maximum(chunk_differences, 0, out=chunk)
+    np.minimum(x_max1[rows], x_max2, out=chunk_differences)
+    np.maximum(x_min1[rows], x_min2, out=chunk_bounds)
+    np.subtract(chunk_differences, chunk_bounds, out=chunk_differences)
+    np.maximum(chunk_differences, 0, out=chunk_widths)
+    np.multiply(chunk, chunk_widths, out=chunk)
+
+    if normalization == _UNION:
+      np.add(areas1[rows], areas2, out=chunk_differences)
+      np.subtract(chunk_differences, chunk, out=chunk_widths)
+      np.divide(chunk, chunk_widths, out=chunk)
+    elif normalization == _AREA2:
+      np.divide(chunk, areas2, out=chunk)
+  return out
+
+
+def _max_pairwise_overlaps(boxes1, boxes2, normalization, dtype, max_memory):
+  """Computes the max (and argmax) pairwise overlap of each box in boxes1.
+
+  Args:
+    boxes1: a numpy array with shape [N, 4] holding N boxes.
+    boxes2: a numpy array with shape [M, 4] holding M boxes, M > 0.
+    normalization: None (intersection), _UNION (iou) or _AREA2 (ioa).
+    dtype: float type of the result, or None (float64).
+    max_memory: max number of bytes of the temporary arrays, or None.
+
+  Returns:
+    max_overlaps: a numpy array with shape [N].
+    max_overlap_ids: an integer numpy array with shape [N].
+  """
+  num_boxes1 = boxes1.shape[0]
+  num_boxes2 = boxes2.shape[0]
+  dtype = np.dtype(dtype or np.float64)
+  max_overlaps = np.empty(num_boxes1, dtype=dtype)
+  max_overlap_ids = np.empty(num_boxes1, dtype=np.int_)
+
+  # The chunks of overlaps count towards the memory budget, along with the
+  # temporary arrays of _pairwise_overlaps.
+  coordinates_type = np.result_type(boxes1, boxes2)
+  chunk_size = _chunk_size(
+      num_boxes1, num_boxes2,
+      [coordinates_type.itemsize] * 2 + [dtype.itemsize] * 2, max_memory)
+  overlaps = np.empty([chunk_size, num_boxes2], dtype=dtype)
+  rows = np.arange(chunk_size)
+
+  for start in range(0, num_boxes1, chunk_size):
+    end = min(start + chunk_size, num_boxes1)
+    chunk = _pairwise_overlaps(boxes1[start:end], boxes2, normalization, dtype,
+                               overlaps[:end - start], None)
+    np.argmax(chunk, axis=1, out=max_overlap_ids[start:end])
+    max_overlaps[start:end] = chunk[rows[:end - start],
+                                    max_overlap_ids[start:end]]
+  return max_overlaps, max_overlap_ids
+
+
+def _max_overlaps_in_ranges(boxes1, boxes2, starts, ends, normalization, dtype,
+                            max_memory):
+  """Computes the max (and argmax) overlap of each box with a range of boxes.
+
+  Consecutive boxes of boxes1 with the same range (e.g. the boxes of the same
+  class) are computed as a block by _max_pairwise_overlaps if the block is
+  large enough, and the pairs of all the other boxes are computed at once by
+  _max_paired_overlaps, so the results are identical to computing the overlaps
+  of each range separately.
+
+  Args:
+    boxes1: a numpy array with shape [N, 4] holding N boxes.
+    boxes2: a numpy array with shape [M, 4] holding M boxes.
+    starts: an integer numpy array with shape [N], the start of each range.
+    ends: an integer numpy array with shape [N], the end of each range.
+    normalization: None (intersection) or _UNION (iou).
+    dtype: float type of the result, or None (float64).
+    max_memory: max number of bytes of the temporary arrays, or None.
+
+  Returns:
+    max_overlaps: a numpy array with shape [N].
+    max_overlap_ids: an integer numpy array with shape [N].
+
+  Raises:
+    ValueError: if any range is empty.
+  """
+  num_boxes1 = boxes1.shape[0]
+  dtype = np.dtype(dtype or np.float64)
+  starts = np.asarray(starts, dtype=np.int_)
+  ends = np.asarray(ends, dtype=np.int_)
+  if np.any(ends <= starts):
+    raise ValueError('Each box must have a non-empty range of boxes.')
+  max_overlaps = np.empty(num_boxes1, dtype=dtype)
+  max_overlap_ids = np.empty(num_boxes1, dtype=np.int_)
+
+  is_block_start = np.ones(num_boxes1, dtype=bool)
+  is_block_start[1:] = (starts[1:] != starts[:-1]) | (ends[1:] != ends[:-1])
+  block_starts = np.flatnonzero(is_block_start)
+  block_ends = np.append(block_starts[1:], num_boxes1)
+  is_dense = ((block_ends - block_starts) *
+              (ends[block_starts] - starts[block_starts]) >=
+              _MIN_DENSE_BLOCK_SIZE)
+
+  for block_start, block_end, start, end in zip(
+      block_starts[is_dense].tolist(), block_ends[is_dense].tolist(),
+      starts[block_starts[is_dense]].tolist(),
+      ends[block_starts[is_dense]].tolist()):
+    block_max_overlaps, block_max_overlap_ids = _max_pairwise_overlaps(
+        boxes1[block_start:block_end], boxes2[start:end], normalization, dtype,
+        max_memory)
+    max_overlaps[block_start:block_end] = block_max_overlaps
+    max_overlap_ids[block_start:block_end] = block_max_overlap_ids + start
+
+  is_paired = np.repeat(~is_dense, block_ends - block_starts)
+  if np.any(is_paired):
+    paired = np.flatnonzero(is_paired)
+    max_overlaps[paired], max_overlap_ids[paired] = _max_paired_overlaps(
+        boxes1[paired], boxes2, starts[paired], ends[paired], normalization,
+        dtype, max_memory)
+  return max_overlaps, max_overlap_ids
+
+
+def _max_paired_overlaps(boxes1, boxes2, starts, ends, normalization, dtype,
+                         max_memory):
+  """Computes the max (and argmax) overlap of each box with a range of boxes.
+
+  The pairs of each chunk of rows are laid out one after the other, and the
+  overlap of each pair is computed with the same operations (and types) as
+  _pairwise_overlaps.
+
+  Args:
+    boxes1: a numpy array with shape [N, 4] holding N boxes.
+    boxes2: a numpy array with shape [M, 4] holding M boxes.
+    starts: an integer numpy array with shape [N], the start of each range.
+    ends: an integer numpy array with shape [N], the end of each non-empty
+      range.
+    normalization: None (intersection) or _UNION (iou).
+    dtype: float numpy dtype of the result.
+    max_memory: max number of bytes of the temporary arrays, or None.
+
+  Returns:
+    max_overlaps: a numpy array with shape [N].
+    max_overlap_ids: an integer numpy array with shape [N].
+  """
+  num_boxes1 = boxes1.shape[0]
+  counts = ends - starts
+  max_overlaps = np.empty(num_boxes1, dtype=dtype)
+  max_overlap_ids = np.empty(num_boxes1, dtype=np.int_)
+
+  # Each pair holds its row and column indices, a few temporary coordinates and
+  # a few temporary overlaps.
+  coordinates_type = np.result_type(boxes1, boxes2)
+  max_pairs = _chunk_size(
+      np.sum(counts), 1,
+      [np.dtype(np.int_).itemsize] * 2 + [coordinates_type.itemsize] * 2 +
+      [dtype.itemsize] * 2, max_memory)
+  pair_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+  [y_min1, x_min1, y_max1, x_max1] = np.transpose(boxes1)
+  [y_min2, x_min2, y_max2, x_max2] = np.transpose(boxes2)
+  if normalization == _UNION:
+    areas1 = area(boxes1)
+    areas2 = area(boxes2)
+
+  start = 0
+  while start < num_boxes1:
+    end = np.searchsorted(pair_offsets, pair_offsets[start] + max_pairs,
+                          side='right') - 1
+    end = min(max(end, start + 1), num_boxes1)
+    chunk_counts = counts[start:end]
+    first_pairs = pair_offsets[start:end] - pair_offsets[start]
+    rows = np.repeat(np.arange(start, end), chunk_counts)
+    columns = np.arange(pair_offsets[end] - pair_offsets[start]) + np.repeat(
+        starts[start:end] - first_pairs, chunk_counts)
+
+    differences = np.minimum(y_max1[rows], y_max2[columns])
+    np.subtract(differences, np.maximum(y_min1[rows], y_min2[columns]),
+                out=differences)
+    overlaps = np.maximum(differences, 0).astype(dtype)
+    np.minimum(x_max1[rows], x_max2[columns], out=differences)
+    np.subtract(differences, np.maximum(x_min1[rows], x_min2[columns]),
+                out=differences)
+    np.multiply(overlaps, np.maximum(differences, 0).astype(dtype),
+                out=overlaps)
+    if normalization == _UNION:
+      np.add(areas1[rows], areas2[columns], out=differences)
+      np.divide(overlaps, (differences - overlaps).astype(dtype), out=overlaps)
+
+    # The first max of each row (or its first NaN, as np.argmax does).
+    chunk_max_overlaps = np.maximum.reduceat(overlaps, first_pairs)
+    max_pairs_of_rows = np.flatnonzero(
+        (overlaps == np.repeat(chunk_max_overlaps, chunk_counts)) |
+        np.isnan(overlaps))
+    max_rows = rows[max_pairs_of_rows]
+    is_first_max = np.concatenate([[True], max_rows[1:] != max_rows[:-1]])
+    max_overlaps[start:end] = chunk_max_overlaps
+    max_overlap_ids[start:end] = columns[max_pairs_of_rows[is_first_max]]
+    start = end
+  return max_overlaps, max_overlap_ids
@@ -64,5 +64,85 @@ class BoxOpsTests(tf.test.TestCase):
     self.assertAllClose(ioa21, expected_ioa21)
 
 
+  def testChunkedOverlapsMatchOverlaps(self):
+    np.random.seed(0)
+    corners1 = np.random.uniform(0, 100, size=[50, 2])
+    boxes1 = np.hstack([corners1, corners1 + np.random.uniform(1, 30, [50, 2])])
+    corners2 = np.random.uniform(0, 100, size=[40, 2])
+    boxes2 = np.hstack([corners2, corners2 + np.random.uniform(1, 30, [40, 2])])
+    for overlap in [np_box_ops.intersection, np_box_ops.iou, np_box_ops.ioa]:
+      expected_overlaps = overlap(boxes1, boxes2)
+      for max_memory in [1, 1000, 10000]:
+        self.assertAllEqual(overlap(boxes1, boxes2, max_memory=max_memory),
+                            expected_overlaps)
+
+      out = np.zeros([50, 40], dtype=np.float32)
+      overlaps = overlap(boxes1, boxes2, out=out, max_memory=1000)
+      self.assertIs(overlaps, out)
+      self.assertAllClose(out, expected_overlaps)
+      self.assertEqual(overlap(boxes1, boxes2, dtype=np.float32).dtype,
+                       np.float32)
+
+  def testOverlapsWithInvalidOutShape(self):
+    with self.assertRaises(ValueError):
+      np_box_ops.iou(self.boxes1, self.boxes2, out=np.zeros([3, 2]))
+
+  def testMaxIOU(self):
+    max_ious, max_iou_ids = np_box_ops.max_iou(self.boxes1, self.boxes2,
+                                               max_memory=1)
+    self.assertAllClose(max_ious, [2.0 / 16.0, 1.0 / 16.0])
+    self.assertAllEqual(max_iou_ids, [0, 0])
+
+  def testMaxIOA(self):
+    boxes1 = np.array([[0.25, 0.25, 0.75, 0.75],
+                       [0.0, 0.0, 0.5, 0.75]],
+                      dtype=np.float32)
+    boxes2 = np.array([[0.5, 0.25, 1.0, 1.0],
+                       [0.0, 0.0, 1.0, 1.0]],
+                      dtype=np.float32)
+    max_ioas, max_ioa_ids = np_box_ops.max_ioa(boxes2, boxes1, max_memory=1)
+    self.assertAllClose(max_ioas, [1.0, 1.0])
+    self.assertAllEqual(max_ioa_ids, [1, 1])
+    max_ioas, max_ioa_ids = np_box_ops.max_ioa(boxes1, boxes2)
+    self.assertAllClose(max_ioas, np.max(np_box_ops.ioa(boxes1, boxes2),
+                                         axis=0))
+    self.assertAllEqual(max_ioa_ids, np.argmax(np_box_ops.ioa(boxes1, boxes2),
+                                               axis=0))
+
+  def testMaxIOUInRanges(self):
+    boxes1 = np.array([[0.0, 0.0, 1.0, 1.0],
+                       [0.0, 0.0, 2.0, 2.0],
+                       [1.0, 1.0, 3.0, 3.0]],
+                      dtype=float)
+    boxes2 = np.array([[0.0, 0.0, 2.0, 2.0],
+                       [0.0, 0.0, 1.0, 1.0],
+                       [1.0, 1.0, 3.0, 3.0]],
+                      dtype=float)
+    starts = np.array([0, 0, 1])
+    ends = np.array([2, 2, 2])
+    for max_memory in [None, 1]:
+      max_ious, max_iou_ids = np_box_ops.max_iou_in_ranges(
+          boxes1, boxes2, starts, ends, max_memory=max_memory)
+      self.assertAllClose(max_ious, [1.0, 1.0, 0.0])
+      self.assertAllEqual(max_iou_ids, [1, 0, 1])
+
+  def testMaxIOAInRanges(self):
+    boxes1 = np.array([[0.25, 0.25, 0.75, 0.75],
+                       [0.0, 0.0, 0.5, 0.75]],
+                      dtype=np.float32)
+    boxes2 = np.array([[0.5, 0.25, 1.0, 1.0],
+                       [0.0, 0.0, 1.0, 1.0]],
+                      dtype=np.float32)
+    max_ioas, max_ioa_ids = np_box_ops.max_ioa_in_ranges(
+        boxes1, boxes2, np.array([0, 1]), np.array([2, 2]))
+    ioas = np_box_ops.ioa(boxes1, boxes2)
+    self.assertAllClose(max_ioas, [np.max(ioas[:, 0]), ioas[1, 1]])
+    self.assertAllEqual(max_ioa_ids, [np.argmax(ioas[:, 0]), 1])
+
+  def testMaxIOUInEmptyRange(self):
+    with self.assertRaises(ValueError):
+      np_box_ops.max_iou_in_ranges(self.boxes1, self.boxes2, np.array([0, 1]),
+                                   np.array([2, 1]))
+
 if __name__ == '__main__':
   tf.test.main()
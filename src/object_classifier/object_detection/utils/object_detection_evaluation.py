@@ -382,8 +382,41 @@ ObjectDetectionEvalMetrics = collections.namedtuple(
     ])
 
 
+def _append_to_array(array, size, values):
+  """Appends values to a growable array.
+
+  Args:
+    array: A 1-d numpy array whose first `size` elements are in use.
+    size: The number of elements of array in use.
+    values: A 1-d numpy array of the values to append.
+
+  Returns:
+    A 1-d numpy array whose first size + len(values) elements are the elements
+    in use of array followed by values. Its capacity is doubled (and its
+    elements copied) only when it is full, so appending n values costs O(n)
+    amortized.
+  """
+  new_size = size + len(values)
+  if new_size > array.shape[0]:
+    grown_array = np.empty(max(new_size, 2 * array.shape[0]),
+                           dtype=array.dtype)
+    grown_array[:size] = array[:size]
+    array = grown_array
+  array[size:new_size] = values
+  return array
+
+
 class ObjectDetectionEvaluation(object):
-  """Internal implementation of Pascal object detection metrics."""
+  """Internal implementation of Pascal object detection metrics.
+
+  In streaming mode, the groundtruth of an image is evicted as soon as its
+  detections are scored, and the scores and tp/fp labels of all the detections
+  are kept in growable typed arrays instead of lists of per-image arrays, so
+  that memory only grows with the number of (kept) detections. The partial
+  states of evaluations run on disjoint images (e.g. in several processes) can
+  be combined with merge(). Since the groundtruth is gone, the detections
+  can't be cleared and scored again (see clear_detections()).
+  """
 
   def __init__(self,
                num_groundtruth_classes,
@@ -391,23 +424,26 @@ class ObjectDetectionEvaluation(object):
                nms_iou_threshold=1.0,
                nms_max_output_boxes=10000,
                use_weighted_mean_ap=False,
-               label_id_offset=0):
+               label_id_offset=0,
+               num_recall_points=None,
+               streaming=False):
     self.per_image_eval = per_image_evaluation.PerImageEvaluation(
         num_groundtruth_classes, matching_iou_threshold, nms_iou_threshold,
         nms_max_output_boxes)
     self.num_class = num_groundtruth_classes
     self.label_id_offset = label_id_offset
+    self.streaming = streaming
 
     self.groundtruth_boxes = {}
     self.groundtruth_class_labels = {}
     self.groundtruth_is_difficult_list = {}
     self.groundtruth_is_group_of_list = {}
+    self.evicted_groundtruth_keys = set()
     self.num_gt_instances_per_class = np.zeros(self.num_class, dtype=int)
     self.num_gt_imgs_per_class = np.zeros(self.num_class, dtype=int)
 
     self.detection_keys = set()
-    self.scores_per_class = [[] for _ in range(self.num_class)]
-    self.tp_fp_labels_per_class = [[] for _ in range(self.num_class)]
+    self._reset_detection_results()
     self.num_images_correctly_detected_per_class = np.zeros(self.num_class)
     self.average_precision_per_class = np.empty(self.num_class, dtype=float)
     self.average_precision_per_class.fill(np.nan)
@@ -416,17 +452,41 @@ class ObjectDetectionEvaluation(object):
     self.corloc_per_class = np.ones(self.num_class, dtype=float)
 
     self.use_weighted_mean_ap = use_weighted_mean_ap
+    self.num_recall_points = num_recall_points
 
   def clear_detections(self):
-    self.detection_keys = {}
-    self.scores_per_class = [[] for _ in range(self.num_class)]
-    self.tp_fp_labels_per_class = [[] for _ in range(self.num_class)]
+    """Drops the detections so that they can be added again.
+
+    Raises:
+      ValueError: in streaming mode, since the groundtruth of the images whose
+        detections were added is already evicted, and the detections added
+        again couldn't be scored against it. Use a new
+        ObjectDetectionEvaluation instead.
+    """
+    if self.streaming:
+      raise ValueError('Detections cannot be cleared in streaming mode, since '
+                       'the groundtruth of their images is already evicted.')
+    self.detection_keys = set()
+    self._reset_detection_results()
     self.num_images_correctly_detected_per_class = np.zeros(self.num_class)
     self.average_precision_per_class = np.zeros(self.num_class, dtype=float)
     self.precisions_per_class = []
     self.recalls_per_class = []
     self.corloc_per_class = np.ones(self.num_class, dtype=float)
 
+  def _reset_detection_results(self):
+    """Drops the scores and tp/fp labels of all the detections."""
+    if self.streaming:
+      self.scores_per_class = None
+      self.tp_fp_labels_per_class = None
+      self.num_detections = 0
+      self.detection_class_labels = np.empty(0, dtype=int)
+      self.detection_scores = np.empty(0, dtype=float)
+      self.detection_tp_fp_labels = np.empty(0, dtype=bool)
+    else:
+      self.scores_per_class = [[] for _ in range(self.num_class)]
+      self.tp_fp_labels_per_class = [[] for _ in range(self.num_class)]
+
   def add_single_ground_truth_image_info(self,
                                          image_key,
                                          groundtruth_boxes,
@@ -435,6 +495,10 @@ class ObjectDetectionEvaluation(object):
                                          groundtruth_is_group_of_list=None):
     """Adds groundtruth for a single image to be used for evaluation.
 
+    In streaming mode, the groundtruth of an image whose detections were
+    already added is only counted in the groundtruth statistics, since those
+    detections were scored without it.
+
     Args:
       image_key: A unique string/integer identifier for the image.
       groundtruth_boxes: float32 numpy array of shape [num_boxes, 4]
@@ -449,34 +513,45 @@ class ObjectDetectionEvaluation(object):
           whether a ground truth box is a group-of box or not. To support
           the case that no boxes are groups-of, it is by default set as None.
     """
-    if image_key in self.groundtruth_boxes:
+    if (image_key in self.groundtruth_boxes or
+        image_key in self.evicted_groundtruth_keys):
       logging.warn(
           'image %s has already been added to the ground truth database.',
           image_key)
       return
 
-    self.groundtruth_boxes[image_key] = groundtruth_boxes
-    self.groundtruth_class_labels[image_key] = groundtruth_class_labels
     if groundtruth_is_difficult_list is None:
       num_boxes = groundtruth_boxes.shape[0]
       groundtruth_is_difficult_list = np.zeros(num_boxes, dtype=bool)
-    self.groundtruth_is_difficult_list[
-        image_key] = groundtruth_is_difficult_list.astype(dtype=bool)
+    groundtruth_is_difficult_list = groundtruth_is_difficult_list.astype(
+        dtype=bool)
     if groundtruth_is_group_of_list is None:
       num_boxes = groundtruth_boxes.shape[0]
       groundtruth_is_group_of_list = np.zeros(num_boxes, dtype=bool)
-    self.groundtruth_is_group_of_list[
-        image_key] = groundtruth_is_group_of_list.astype(dtype=bool)
+    groundtruth_is_group_of_list = groundtruth_is_group_of_list.astype(
+        dtype=bool)
+    if self.streaming and image_key in self.detection_keys:
+      self.evicted_groundtruth_keys.add(image_key)
+    else:
+      self.groundtruth_boxes[image_key] = groundtruth_boxes
+      self.groundtruth_class_labels[image_key] = groundtruth_class_labels
+      self.groundtruth_is_difficult_list[
+          image_key] = groundtruth_is_difficult_list
+      self.groundtruth_is_group_of_list[
+          image_key] = groundtruth_is_group_of_list
 
     self._update_ground_truth_statistics(
         groundtruth_class_labels,
-        groundtruth_is_difficult_list.astype(dtype=bool),
-        groundtruth_is_group_of_list.astype(dtype=bool))
+        groundtruth_is_difficult_list,
+        groundtruth_is_group_of_list)
 
   def add_single_detected_image_info(self, image_key, detected_boxes,
                                      detected_scores, detected_class_labels):
     """Adds detections for a single image to be used for evaluation.
 
+    In streaming mode, the groundtruth of the image is evicted once its
+    detections are scored.
+
     Args:
       image_key: A unique string/integer identifier for the image.
       detected_boxes: float32 numpy array of shape [num_boxes, 4]
@@ -512,6 +587,8 @@ class ObjectDetectionEvaluation(object):
           image_key]
       groundtruth_is_group_of_list = self.groundtruth_is_group_of_list[
           image_key]
+      if self.streaming:
+        self._evict_ground_truth(image_key)
     else:
       groundtruth_boxes = np.empty(shape=[0, 4], dtype=float)
       groundtruth_class_labels = np.array([], dtype=int)
@@ -523,13 +600,134 @@ class ObjectDetectionEvaluation(object):
             groundtruth_boxes, groundtruth_class_labels,
             groundtruth_is_difficult_list, groundtruth_is_group_of_list))
 
-    for i in range(self.num_class):
-      if scores[i].shape[0] > 0:
-        self.scores_per_class[i].append(scores[i])
-        self.tp_fp_labels_per_class[i].append(tp_fp_labels[i])
+    num_detections_per_class = [len(class_scores) for class_scores in scores]
+    if any(num_detections_per_class):
+      self._add_detection_results(
+          np.repeat(np.arange(self.num_class), num_detections_per_class),
+          np.concatenate(scores), np.concatenate(tp_fp_labels))
     (self.num_images_correctly_detected_per_class
     ) += is_class_correctly_detected_in_image
 
+  def _evict_ground_truth(self, image_key):
+    """Drops the groundtruth of an image, but remembers it was added."""
+    del self.groundtruth_boxes[image_key]
+    del self.groundtruth_class_labels[image_key]
+    del self.groundtruth_is_difficult_list[image_key]
+    del self.groundtruth_is_group_of_list[image_key]
+    self.evicted_groundtruth_keys.add(image_key)
+
+  def _add_detection_results(self, class_labels, scores, tp_fp_labels):
+    """Adds the scores and tp/fp labels of detections of one or more images.
+
+    Args:
+      class_labels: An integer numpy array of length N of the class of each
+          detection, in [0, num_class).
+      scores: A float numpy array of length N of the detection scores.
+      tp_fp_labels: A boolean numpy array of length N indicating whether a
+          detection is a true positive.
+    """
+    if self.streaming:
+      self.detection_class_labels = _append_to_array(
+          self.detection_class_labels, self.num_detections, class_labels)
+      self.detection_scores = _append_to_array(
+          self.detection_scores, self.num_detections, scores)
+      self.detection_tp_fp_labels = _append_to_array(
+          self.detection_tp_fp_labels, self.num_detections, tp_fp_labels)
+      self.num_detections += len(scores)
+      return
+
+    order = np.argsort(class_labels, kind='mergesort')
+    class_labels = class_labels[order]
+    scores = scores[order]
+    tp_fp_labels = tp_fp_labels[order]
+    classes, starts, counts = np.unique(class_labels, return_index=True,
+                                        return_counts=True)
+    for class_index, start, end in zip(classes.tolist(), starts.tolist(),
+                                       (starts + counts).tolist()):
+      self.scores_per_class[class_index].append(scores[start:end])
+      self.tp_fp_labels_per_class[class_index].append(tp_fp_labels[start:end])
+
+  def _get_detection_results(self):
+    """Gets the scores and tp/fp labels of all the detections, by class.
+
+    Returns:
+      class_labels: A sorted integer numpy array of length N of the class of
+          each detection.
+      scores: A float numpy array of length N of the detection scores, in the
+          order they were added within each class.
+      tp_fp_labels: A boolean numpy array of length N indicating whether a
+          detection is a true positive.
+    """
+    if self.streaming:
+      class_labels = self.detection_class_labels[:self.num_detections]
+      order = np.argsort(class_labels, kind='mergesort')
+      return (class_labels[order],
+              self.detection_scores[:self.num_detections][order],
+              self.detection_tp_fp_labels[:self.num_detections][order])
+
+    num_detections_per_class = [
+        sum(len(scores) for scores in class_scores)
+        for class_scores in self.scores_per_class]
+    class_labels = np.repeat(np.arange(self.num_class),
+                             num_detections_per_class)
+    if not class_labels.size:
+      return (class_labels, np.array([], dtype=float),
+              np.array([], dtype=bool))
+    return (class_labels,
+            np.concatenate([scores for class_scores in self.scores_per_class
+                            for scores in class_scores]),
+            np.concatenate([tp_fp_labels
+                            for class_tp_fp_labels in
+                            self.tp_fp_labels_per_class
+                            for tp_fp_labels in class_tp_fp_labels]))
+
+  def merge(self, other):
+    """Merges the state of another evaluation into this one.
+
+    This combines the groundtruth statistics, the pending groundtruth and the
+    detection results of evaluations run on disjoint sets of images, e.g. one
+    shard of a dataset per process. The detections of other are ordered after
+    the detections of this evaluation.
+
+    Args:
+      other: An ObjectDetectionEvaluation with the same number of classes.
+
+    Raises:
+      ValueError: if other does not have the same number of classes, or if
+        both evaluations have the groundtruth or the detections of the same
+        image.
+    """
+    if other.num_class != self.num_class:
+      raise ValueError('Cannot merge evaluations of %d and %d classes.' %
+                       (self.num_class, other.num_class))
+    groundtruth_keys = (set(self.groundtruth_boxes) |
+                        self.evicted_groundtruth_keys)
+    other_groundtruth_keys = (set(other.groundtruth_boxes) |
+                              other.evicted_groundtruth_keys)
+    if (groundtruth_keys & other_groundtruth_keys or
+        self.detection_keys & other.detection_keys):
+      raise ValueError('Cannot merge evaluations of the same images.')
+
+    self.groundtruth_boxes.update(other.groundtruth_boxes)
+    self.groundtruth_class_labels.update(other.groundtruth_class_labels)
+    self.groundtruth_is_difficult_list.update(
+        other.groundtruth_is_difficult_list)
+    self.groundtruth_is_group_of_list.update(other.groundtruth_is_group_of_list)
+    self.evicted_groundtruth_keys |= other.evicted_groundtruth_keys
+    self.num_gt_instances_per_class += other.num_gt_instances_per_class
+    self.num_gt_imgs_per_class += other.num_gt_imgs_per_class
+
+    self.detection_keys |= other.detection_keys
+    class_labels, scores, tp_fp_labels = other._get_detection_results()  # pylint: disable=protected-access
+    if class_labels.size:
+      self._add_detection_results(class_labels, scores, tp_fp_labels)
+    (self.num_images_correctly_detected_per_class
+    ) += other.num_images_correctly_detected_per_class
+
+    if self.streaming:
+      for image_key in self.detection_keys & set(self.groundtruth_boxes):
+        self._evict_ground_truth(image_key)
+
   def _update_ground_truth_statistics(self, groundtruth_class_labels,
                                       groundtruth_is_difficult_list,
                                       groundtruth_is_group_of_list):
@@ -548,13 +746,18 @@ class ObjectDetectionEvaluation(object):
       groundtruth_is_group_of_list: A boolean numpy array of length M denoting
           whether a ground truth box is a group-of box or not
     """
-    for class_index in range(self.num_class):
-      num_gt_instances = np.sum(groundtruth_class_labels[
-          ~groundtruth_is_difficult_list
-          & ~groundtruth_is_group_of_list] == class_index)
-      self.num_gt_instances_per_class[class_index] += num_gt_instances
-      if np.any(groundtruth_class_labels == class_index):
-        self.num_gt_imgs_per_class[class_index] += 1
+    # Labels which are not one of the classes are not counted.
+    groundtruth_class_labels = np.asarray(groundtruth_class_labels)
+    is_valid = ((groundtruth_class_labels >= 0) &
+                (groundtruth_class_labels < self.num_class) &
+                (groundtruth_class_labels ==
+                 np.floor(groundtruth_class_labels)))
+    class_labels = groundtruth_class_labels[is_valid].astype(int)
+    is_counted = (~groundtruth_is_difficult_list[is_valid] &
+                  ~groundtruth_is_group_of_list[is_valid])
+    self.num_gt_instances_per_class += np.bincount(
+        class_labels[is_counted], minlength=self.num_class)
+    self.num_gt_imgs_per_class[np.unique(class_labels)] += 1
 
   def evaluate(self):
     """Compute evaluation result.
@@ -576,27 +779,22 @@ class ObjectDetectionEvaluation(object):
           np.squeeze(np.argwhere(self.num_gt_instances_per_class == 0)) +
           self.label_id_offset)
 
-    if self.use_weighted_mean_ap:
-      all_scores = np.array([], dtype=float)
-      all_tp_fp_labels = np.array([], dtype=bool)
-
+    class_labels, all_scores, all_tp_fp_labels = self._get_detection_results()
+    starts = np.searchsorted(class_labels, np.arange(self.num_class),
+                             side='left').tolist()
+    ends = np.searchsorted(class_labels, np.arange(self.num_class),
+                           side='right').tolist()
     for class_index in range(self.num_class):
       if self.num_gt_instances_per_class[class_index] == 0:
         continue
-      if not self.scores_per_class[class_index]:
-        scores = np.array([], dtype=float)
-        tp_fp_labels = np.array([], dtype=bool)
-      else:
-        scores = np.concatenate(self.scores_per_class[class_index])
-        tp_fp_labels = np.concatenate(self.tp_fp_labels_per_class[class_index])
-      if self.use_weighted_mean_ap:
-        all_scores = np.append(all_scores, scores)
-        all_tp_fp_labels = np.append(all_tp_fp_labels, tp_fp_labels)
+      scores = all_scores[starts[class_index]:ends[class_index]]
+      tp_fp_labels = all_tp_fp_labels[starts[class_index]:ends[class_index]]
       precision, recall = metrics.compute_precision_recall(
           scores, tp_fp_labels, self.num_gt_instances_per_class[class_index])
       self.precisions_per_class.append(precision)
       self.recalls_per_class.append(recall)
-      average_precision = metrics.compute_average_precision(precision, recall)
+      average_precision = metrics.compute_average_precision(
+          precision, recall, num_recall_points=self.num_recall_points)
       self.average_precision_per_class[class_index] = average_precision
 
     self.corloc_per_class = metrics.compute_cor_loc(
@@ -605,9 +803,12 @@ class ObjectDetectionEvaluation(object):
 
     if self.use_weighted_mean_ap:
       num_gt_instances = np.sum(self.num_gt_instances_per_class)
+      has_groundtruth = self.num_gt_instances_per_class[class_labels] > 0
       precision, recall = metrics.compute_precision_recall(
-          all_scores, all_tp_fp_labels, num_gt_instances)
-      mean_ap = metrics.compute_average_precision(precision, recall)
+          all_scores[has_groundtruth].astype(float),
+          all_tp_fp_labels[has_groundtruth], num_gt_instances)
+      mean_ap = metrics.compute_average_precision(
+          precision, recall, num_recall_points=self.num_recall_points)
     else:
       mean_ap = np.nanmean(self.average_precision_per_class)
     mean_corloc = np.nanmean(self.corloc_per_class)
@@ -432,5 +432,102 @@ class ObjectDetectionEvaluationTest(tf.test.TestCase):
     self.assertAlmostEqual(expected_mean_corloc, mean_corloc)
 
 
+class StreamingObjectDetectionEvaluationTest(tf.test.TestCase):
+
+  def setUp(self):
+    np.random.seed(0)
+    self.num_groundtruth_classes = 4
+    self.images = []
+    for image_index in range(20):
+      num_groundtruth_boxes = np.random.randint(0, 5)
+      corners = np.random.uniform(0, 50, size=[num_groundtruth_boxes, 2])
+      groundtruth_boxes = np.hstack([corners, corners + 10])
+      groundtruth_class_labels = np.random.randint(
+          0, self.num_groundtruth_classes, size=num_groundtruth_boxes)
+      groundtruth_is_difficult_list = (
+          np.random.uniform(size=num_groundtruth_boxes) < 0.2)
+      detected_boxes = np.vstack([
+          groundtruth_boxes + np.random.uniform(-2, 2, groundtruth_boxes.shape),
+          np.hstack([corners, corners + 5])])
+      detected_scores = np.random.uniform(size=detected_boxes.shape[0])
+      detected_class_labels = np.concatenate([
+          groundtruth_class_labels,
+          np.random.randint(0, self.num_groundtruth_classes,
+                            size=num_groundtruth_boxes)])
+      self.images.append(('img%d' % image_index, groundtruth_boxes,
+                          groundtruth_class_labels,
+                          groundtruth_is_difficult_list, detected_boxes,
+                          detected_scores, detected_class_labels))
+
+  def _evaluate_images(self, images, **kwargs):
+    od_eval = object_detection_evaluation.ObjectDetectionEvaluation(
+        self.num_groundtruth_classes, **kwargs)
+    for (image_key, groundtruth_boxes, groundtruth_class_labels,
+         groundtruth_is_difficult_list, detected_boxes, detected_scores,
+         detected_class_labels) in images:
+      od_eval.add_single_ground_truth_image_info(
+          image_key, groundtruth_boxes, groundtruth_class_labels,
+          groundtruth_is_difficult_list)
+      od_eval.add_single_detected_image_info(
+          image_key, detected_boxes, detected_scores, detected_class_labels)
+    return od_eval
+
+  def _assert_same_metrics(self, expected_metrics, metrics):
+    self.assertAllClose(expected_metrics.average_precisions,
+                        metrics.average_precisions)
+    self.assertAllClose(expected_metrics.mean_ap, metrics.mean_ap)
+    for expected_precision, precision in zip(expected_metrics.precisions,
+                                             metrics.precisions):
+      self.assertAllClose(expected_precision, precision)
+    for expected_recall, recall in zip(expected_metrics.recalls,
+                                       metrics.recalls):
+      self.assertAllClose(expected_recall, recall)
+    self.assertAllClose(expected_metrics.corlocs, metrics.corlocs)
+
+  def test_streaming_evaluation_evicts_groundtruth(self):
+    for use_weighted_mean_ap in [False, True]:
+      expected_metrics = self._evaluate_images(
+          self.images, use_weighted_mean_ap=use_weighted_mean_ap).evaluate()
+      od_eval = self._evaluate_images(
+          self.images, use_weighted_mean_ap=use_weighted_mean_ap,
+          streaming=True)
+      self.assertFalse(od_eval.groundtruth_boxes)
+      self.assertEqual(len(od_eval.evicted_groundtruth_keys), 20)
+      self._assert_same_metrics(expected_metrics, od_eval.evaluate())
+
+  def test_streaming_evaluation_ignores_duplicate_groundtruth(self):
+    od_eval = self._evaluate_images(self.images, streaming=True)
+    num_gt_instances_per_class = od_eval.num_gt_instances_per_class.copy()
+    _, groundtruth_boxes, groundtruth_class_labels = self.images[0][:3]
+    od_eval.add_single_ground_truth_image_info(
+        'img0', groundtruth_boxes, groundtruth_class_labels)
+    self.assertAllEqual(num_gt_instances_per_class,
+                        od_eval.num_gt_instances_per_class)
+
+  def test_streaming_evaluation_cannot_clear_detections(self):
+    od_eval = self._evaluate_images(self.images[:1])
+    od_eval.clear_detections()
+    self.assertFalse(od_eval.detection_keys)
+
+    od_eval = self._evaluate_images(self.images[:1], streaming=True)
+    with self.assertRaises(ValueError):
+      od_eval.clear_detections()
+    self.assertEqual(od_eval.detection_keys, set(['img0']))
+
+  def test_merge(self):
+    expected_metrics = self._evaluate_images(self.images).evaluate()
+    for streaming in [False, True]:
+      od_eval = self._evaluate_images(self.images[:12], streaming=streaming)
+      od_eval.merge(self._evaluate_images(self.images[12:],
+                                          streaming=not streaming))
+      self.assertEqual(len(od_eval.detection_keys), 20)
+      self._assert_same_metrics(expected_metrics, od_eval.evaluate())
+
+  def test_merge_raises_on_same_images(self):
+    od_eval = self._evaluate_images(self.images[:12], streaming=True)
+    with self.assertRaises(ValueError):
+      od_eval.merge(self._evaluate_images(self.images[10:], streaming=True))
+
+
 if __name__ == '__main__':
   tf.test.main()
@@ -22,6 +22,7 @@ import numpy as np
 
 from object_detection.utils import np_box_list
 from object_detection.utils import np_box_list_ops
+from object_detection.utils import np_box_ops
 
 
 class PerImageEvaluation(object):
@@ -123,46 +124,31 @@ class PerImageEvaluation(object):
     """
     is_class_correctly_detected_in_image = np.zeros(
         self.num_groundtruth_classes, dtype=int)
-    for i in range(self.num_groundtruth_classes):
-      gt_boxes_at_ith_class = groundtruth_boxes[groundtruth_class_labels ==
-                                                i, :]
-      detected_boxes_at_ith_class = detected_boxes[detected_class_labels ==
-                                                   i, :]
-      detected_scores_at_ith_class = detected_scores[detected_class_labels == i]
-      is_class_correctly_detected_in_image[i] = (
-          self._compute_is_aclass_correctly_detected_in_image(
-              detected_boxes_at_ith_class, detected_scores_at_ith_class,
-              gt_boxes_at_ith_class))
+    detected_classes, detected_indices, detected_starts, detected_ends = (
+        self._group_by_class(detected_class_labels))
+    groundtruth_starts, groundtruth_ends = self._find_class_ranges(
+        groundtruth_class_labels, detected_classes)
+    has_groundtruth = np.flatnonzero(groundtruth_ends > groundtruth_starts)
+    if has_groundtruth.size == 0:
+      return is_class_correctly_detected_in_image
+
+    # The detection with the highest score of each class is matched against the
+    # groundtruth boxes of the same class.
+    max_score_ids = [
+        detected_indices[start:end][np.argmax(
+            detected_scores[detected_indices[start:end]])]
+        for start, end in zip(detected_starts[has_groundtruth].tolist(),
+                              detected_ends[has_groundtruth].tolist())]
+    groundtruth_indices = np.argsort(groundtruth_class_labels, kind='mergesort')
+    max_ious, _ = np_box_ops.max_iou_in_ranges(
+        detected_boxes[max_score_ids, :],
+        groundtruth_boxes[groundtruth_indices, :],
+        groundtruth_starts[has_groundtruth], groundtruth_ends[has_groundtruth])
+    is_class_correctly_detected_in_image[detected_classes[has_groundtruth]] = (
+        max_ious >= self.matching_iou_threshold)
 
     return is_class_correctly_detected_in_image
 
-  def _compute_is_aclass_correctly_detected_in_image(
-      self, detected_boxes, detected_scores, groundtruth_boxes):
-    """Compute CorLoc score for a single class.
-
-    Args:
-      detected_boxes: A numpy array of shape [N, 4] representing detected box
-          coordinates
-      detected_scores: A 1-d numpy array of length N representing classification
-          score
-      groundtruth_boxes: A numpy array of shape [M, 4] representing ground truth
-          box coordinates
-
-    Returns:
-      is_class_correctly_detected_in_image: An integer 1 or 0 denoting whether a
-          class is correctly detected in the image or not
-    """
-    if detected_boxes.size > 0:
-      if groundtruth_boxes.size > 0:
-        max_score_id = np.argmax(detected_scores)
-        detected_boxlist = np_box_list.BoxList(
-            np.expand_dims(detected_boxes[max_score_id, :], axis=0))
-        gt_boxlist = np_box_list.BoxList(groundtruth_boxes)
-        iou = np_box_list_ops.iou(detected_boxlist, gt_boxlist)
-        if np.max(iou) >= self.matching_iou_threshold:
-          return 1
-    return 0
-
   def _compute_tp_fp(self, detected_boxes, detected_scores,
                      detected_class_labels, groundtruth_boxes,
                      groundtruth_class_labels, groundtruth_is_difficult_lists,
@@ -194,26 +180,195 @@ class PerImageEvaluation(object):
           shape [K, 1], representing K True/False positive label of object
           instances detected with class label c
     """
-    result_scores = []
-    result_tp_fp_labels = []
-    for i in range(self.num_groundtruth_classes):
-      gt_boxes_at_ith_class = groundtruth_boxes[(groundtruth_class_labels == i
-                                                ), :]
-      groundtruth_is_difficult_list_at_ith_class = (
-          groundtruth_is_difficult_lists[groundtruth_class_labels == i])
-      groundtruth_is_group_of_list_at_ith_class = (
-          groundtruth_is_group_of_list[groundtruth_class_labels == i])
-      detected_boxes_at_ith_class = detected_boxes[(detected_class_labels == i
-                                                   ), :]
-      detected_scores_at_ith_class = detected_scores[detected_class_labels == i]
-      scores, tp_fp_labels = self._compute_tp_fp_for_single_class(
-          detected_boxes_at_ith_class, detected_scores_at_ith_class,
-          gt_boxes_at_ith_class, groundtruth_is_difficult_list_at_ith_class,
-          groundtruth_is_group_of_list_at_ith_class)
-      result_scores.append(scores)
-      result_tp_fp_labels.append(tp_fp_labels)
+    # Classes without any detection have no scores, whether or not they have
+    # groundtruth boxes, so only the classes detected in the image are
+    # evaluated. The other classes share the same (read-only) empty arrays.
+    empty_scores = np.array([], dtype=float)
+    empty_tp_fp_labels = np.array([], dtype=bool)
+    empty_scores.flags.writeable = False
+    empty_tp_fp_labels.flags.writeable = False
+    result_scores = [empty_scores] * self.num_groundtruth_classes
+    result_tp_fp_labels = [empty_tp_fp_labels] * self.num_groundtruth_classes
+
+    detected_classes, detected_indices, detected_starts, detected_ends = (
+        self._group_by_class(detected_class_labels))
+    groundtruth_starts, groundtruth_ends = self._find_class_ranges(
+        groundtruth_class_labels, detected_classes)
+    scores, tp_fp_labels = self._compute_tp_fp_for_classes(
+        detected_boxes, detected_scores, detected_indices, detected_starts,
+        detected_ends, groundtruth_boxes,
+        np.argsort(groundtruth_class_labels, kind='mergesort'),
+        groundtruth_starts, groundtruth_ends, groundtruth_is_difficult_lists,
+        groundtruth_is_group_of_list)
+    for i, class_scores, class_tp_fp_labels in zip(detected_classes.tolist(),
+                                                   scores, tp_fp_labels):
+      result_scores[i] = class_scores
+      result_tp_fp_labels[i] = class_tp_fp_labels
     return result_scores, result_tp_fp_labels
 
+  def _group_by_class(self, class_labels):
+    """Groups the indices of boxes by class label.
+
+    Args:
+      class_labels: A numpy array of length N representing the class labels of
+          N boxes.
+
+    Returns:
+      classes: An integer numpy array of the K class labels in
+          [0, num_groundtruth_classes) that have at least one box, in
+          increasing order.
+      indices: An integer numpy array of the indices of the boxes of these
+          classes, one class after the other, in their original order within
+          each class.
+      starts: An integer numpy array of length K of the start of each class in
+          indices.
+      ends: An integer numpy array of length K of the end of each class in
+          indices.
+    """
+    sorted_indices = np.argsort(class_labels, kind='mergesort')
+    labels, counts = np.unique(class_labels[sorted_indices],
+                               return_counts=True)
+    is_class = ((labels >= 0) & (labels < self.num_groundtruth_classes) &
+                (labels == np.floor(labels)))
+    sorted_indices = sorted_indices[np.repeat(is_class, counts)]
+    counts = counts[is_class]
+    ends = np.cumsum(counts)
+    return labels[is_class].astype(int), sorted_indices, ends - counts, ends
+
+  def _find_class_ranges(self, class_labels, classes):
+    """Finds the boxes of each class among boxes sorted by class label.
+
+    Args:
+      class_labels: A numpy array of length M representing the class labels of
+          M boxes.
+      classes: An integer numpy array of K class labels.
+
+    Returns:
+      starts: An integer numpy array of length K of the start of the boxes of
+          each class in np.argsort(class_labels, kind='mergesort').
+      ends: An integer numpy array of length K of the end of the boxes of each
+          class (the same as its start if the class has no box).
+    """
+    sorted_class_labels = np.sort(class_labels, kind='mergesort')
+    return (np.searchsorted(sorted_class_labels, classes, side='left'),
+            np.searchsorted(sorted_class_labels, classes, side='right'))
+
+  def _select_in_groups(self, indices, starts, ends, is_selected):
+    """Selects indices within groups of indices.
+
+    Args:
+      indices: An integer numpy array of indices.
+      starts: An integer numpy array of length K of the start of each group.
+      ends: An integer numpy array of length K of the end of each group.
+      is_selected: A boolean numpy array of the same length as indices.
+
+    Returns:
+      indices: An integer numpy array of the selected indices.
+      starts: An integer numpy array of length K of the start of each group
+          among the selected indices.
+      ends: An integer numpy array of length K of the end of each group among
+          the selected indices.
+    """
+    num_selected = np.concatenate([[0], np.cumsum(is_selected)])
+    return indices[is_selected], num_selected[starts], num_selected[ends]
+
+  def _concatenate_groups(self, indices_per_group):
+    """Concatenates groups of indices.
+
+    Args:
+      indices_per_group: A list of K integer numpy arrays.
+
+    Returns:
+      indices: An integer numpy array of the indices of all the groups, one
+          group after the other.
+      starts: An integer numpy array of length K of the start of each group.
+      ends: An integer numpy array of length K of the end of each group.
+    """
+    sizes = np.array([len(indices) for indices in indices_per_group],
+                     dtype=int)
+    ends = np.cumsum(sizes)
+    if not indices_per_group:
+      return np.array([], dtype=int), ends - sizes, ends
+    return np.concatenate(indices_per_group), ends - sizes, ends
+
+  def _non_max_suppression(self, detected_boxes, detected_scores):
+    """Applies Non Maximum Suppression to boxes detected with the same class.
+
+    Args:
+      detected_boxes: A numpy array of shape [N, 4] of valid detected boxes
+      detected_scores: A 1-d numpy array of length N representing
+          classification score
+
+    Returns:
+      An integer numpy array of the indices of the boxes kept by NMS, sorted by
+      decreasing score.
+    """
+    if self.nms_iou_threshold == 1.0:
+      # NMS is disabled: the boxes are only filtered by the default
+      # score_threshold of non_max_suppression, sorted and capped the same way.
+      high_score_indices = np.flatnonzero(detected_scores > -10.0)
+      sorted_indices = high_score_indices[np.argsort(
+          detected_scores[high_score_indices])[::-1]]
+      return sorted_indices[:self.nms_max_output_boxes]
+
+    # Invalid boxes were removed by _remove_invalid_boxes.
+    detected_boxlist = np_box_list.BoxList(detected_boxes, validate=False)
+    detected_boxlist.add_field('scores', detected_scores)
+    detected_boxlist.add_field('indices', np.arange(detected_boxes.shape[0]))
+    detected_boxlist = np_box_list_ops.non_max_suppression(
+        detected_boxlist, self.nms_max_output_boxes, self.nms_iou_threshold)
+    return detected_boxlist.get_field('indices')
+
+  def _non_max_suppression_for_classes(self, detected_boxes, detected_scores,
+                                       detected_indices, starts, ends):
+    """Applies Non Maximum Suppression to the boxes of each class.
+
+    Args:
+      detected_boxes: A numpy array of shape [N, 4] of valid detected boxes
+      detected_scores: A 1-d numpy array of length N representing
+          classification score
+      detected_indices: An integer numpy array of the indices of the boxes of
+          K classes, one class after the other.
+      starts: An integer numpy array of length K of the start of each class.
+      ends: An integer numpy array of length K of the end of each class.
+
+    Returns:
+      indices: An integer numpy array of the indices of the boxes kept by NMS,
+          one class after the other, sorted by decreasing score within each
+          class.
+      starts: An integer numpy array of length K of the start of each class.
+      ends: An integer numpy array of length K of the end of each class.
+    """
+    if self.nms_iou_threshold == 1.0:
+      # NMS is disabled, so the boxes of all classes are sorted at once, unless
+      # boxes of the same class have the same score: these are kept in the
+      # order of np.argsort, one class at a time.
+      num_classes = len(starts)
+      class_ids = np.repeat(np.arange(num_classes), ends - starts)
+      is_high_score = detected_scores[detected_indices] > -10.0
+      high_score_indices = detected_indices[is_high_score]
+      class_ids = class_ids[is_high_score]
+      scores = detected_scores[high_score_indices]
+      order = np.lexsort((-scores, class_ids))
+      scores = scores[order]
+      class_ids = class_ids[order]
+      if not np.any((class_ids[1:] == class_ids[:-1]) &
+                    (scores[1:] == scores[:-1])):
+        num_high_scores = np.bincount(class_ids, minlength=num_classes)
+        high_score_ends = np.cumsum(num_high_scores)
+        high_score_starts = high_score_ends - num_high_scores
+        ranks = np.arange(len(order)) - high_score_starts[class_ids]
+        return self._select_in_groups(
+            high_score_indices[order], high_score_starts, high_score_ends,
+            ranks < self.nms_max_output_boxes)
+
+    indices_per_class = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+      indices = detected_indices[start:end]
+      indices_per_class.append(indices[self._non_max_suppression(
+          detected_boxes[indices, :], detected_scores[indices])])
+    return self._concatenate_groups(indices_per_class)
+
   def _remove_invalid_boxes(self, detected_boxes, detected_scores,
                             detected_class_labels):
     valid_indices = np.logical_and(detected_boxes[:, 0] < detected_boxes[:, 2],
@@ -253,21 +408,68 @@ class PerImageEvaluation(object):
     """
     if detected_boxes.size == 0:
       return np.array([], dtype=float), np.array([], dtype=bool)
-    detected_boxlist = np_box_list.BoxList(detected_boxes)
-    detected_boxlist.add_field('scores', detected_scores)
-    detected_boxlist = np_box_list_ops.non_max_suppression(
-        detected_boxlist, self.nms_max_output_boxes, self.nms_iou_threshold)
+    num_detections = detected_boxes.shape[0]
+    num_groundtruth_boxes = groundtruth_boxes.shape[0]
+    scores, tp_fp_labels = self._compute_tp_fp_for_classes(
+        detected_boxes, detected_scores, np.arange(num_detections),
+        np.array([0]), np.array([num_detections]), groundtruth_boxes,
+        np.arange(num_groundtruth_boxes), np.array([0]),
+        np.array([num_groundtruth_boxes]), groundtruth_is_difficult_list,
+        groundtruth_is_group_of_list)
+    return scores[0], tp_fp_labels[0]
+
+  def _compute_tp_fp_for_classes(
+      self, detected_boxes, detected_scores, detected_indices, detected_starts,
+      detected_ends, groundtruth_boxes, groundtruth_indices,
+      groundtruth_starts, groundtruth_ends, groundtruth_is_difficult_list,
+      groundtruth_is_group_of_list):
+    """Labels boxes detected with several classes from the same image as tp/fp.
+
+    This is the same as _compute_tp_fp_for_single_class for each class, but the
+    detections of all classes are matched at once, each one only against the
+    groundtruth boxes of its class.
 
-    scores = detected_boxlist.get_field('scores')
-
-    if groundtruth_boxes.size == 0:
-      return scores, np.zeros(detected_boxlist.num_boxes(), dtype=bool)
+    Args:
+      detected_boxes: A numpy array of shape [N, 4] representing detected box
+          coordinates
+      detected_scores: A 1-d numpy array of length N representing classification
+          score
+      detected_indices: An integer numpy array of the indices of the detected
+          boxes of K classes, one class after the other.
+      detected_starts: An integer numpy array of length K of the start of each
+          class in detected_indices.
+      detected_ends: An integer numpy array of length K of the end of each class
+          in detected_indices.
+      groundtruth_boxes: A numpy array of shape [M, 4] representing ground truth
+          box coordinates
+      groundtruth_indices: An integer numpy array of the indices of the
+          groundtruth boxes, one class after the other.
+      groundtruth_starts: An integer numpy array of length K of the start of
+          each class in groundtruth_indices.
+      groundtruth_ends: An integer numpy array of length K of the end of each
+          class in groundtruth_indices.
+      groundtruth_is_difficult_list: A boolean numpy array of length M denoting
+          whether a ground truth box is a difficult instance or not.
+      groundtruth_is_group_of_list: A boolean numpy array of length M denoting
+          whether a ground truth box has group-of tag.
 
-    tp_fp_labels = np.zeros(detected_boxlist.num_boxes(), dtype=bool)
-    is_matched_to_difficult_box = np.zeros(
-        detected_boxlist.num_boxes(), dtype=bool)
-    is_matched_to_group_of_box = np.zeros(
-        detected_boxlist.num_boxes(), dtype=bool)
+    Returns:
+      scores: A list of K numpy arrays representing the detection scores of
+          each class.
+      tp_fp_labels: A list of K boolean numpy arrays indicating whether a
+          detection is a true positive.
+    """
+    detected_indices, detected_starts, detected_ends = (
+        self._non_max_suppression_for_classes(
+            detected_boxes, detected_scores, detected_indices, detected_starts,
+            detected_ends))
+    num_detections_per_class = detected_ends - detected_starts
+    detected_boxes = detected_boxes[detected_indices, :]
+    scores = detected_scores[detected_indices]
+
+    tp_fp_labels = np.zeros(scores.shape[0], dtype=bool)
+    is_matched_to_difficult_box = np.zeros(scores.shape[0], dtype=bool)
+    is_matched_to_group_of_box = np.zeros(scores.shape[0], dtype=bool)
 
     # The evaluation is done in two stages:
     # 1. All detections are matched to non group-of boxes; true positives are
@@ -276,37 +478,56 @@ class PerImageEvaluation(object):
     #    group-of boxes and ignored if matched.
 
     # Tp-fp evaluation for non-group of boxes (if any).
-    gt_non_group_of_boxlist = np_box_list.BoxList(
-        groundtruth_boxes[~groundtruth_is_group_of_list, :])
-    if gt_non_group_of_boxlist.num_boxes() > 0:
-      groundtruth_nongroup_of_is_difficult_list = groundtruth_is_difficult_list[
-          ~groundtruth_is_group_of_list]
-      iou = np_box_list_ops.iou(detected_boxlist, gt_non_group_of_boxlist)
-      max_overlap_gt_ids = np.argmax(iou, axis=1)
-      is_gt_box_detected = np.zeros(
-          gt_non_group_of_boxlist.num_boxes(), dtype=bool)
-      for i in range(detected_boxlist.num_boxes()):
-        gt_id = max_overlap_gt_ids[i]
-        if iou[i, gt_id] >= self.matching_iou_threshold:
-          if not groundtruth_nongroup_of_is_difficult_list[gt_id]:
-            if not is_gt_box_detected[gt_id]:
-              tp_fp_labels[i] = True
-              is_gt_box_detected[gt_id] = True
-          else:
-            is_matched_to_difficult_box[i] = True
+    # Each detection is matched to the groundtruth box of its class it overlaps
+    # the most; the first detection (i.e. the highest score) matched to a
+    # groundtruth box is a true positive, any later one is a false positive.
+    groundtruth_is_difficult_list = groundtruth_is_difficult_list.astype(bool)
+    is_group_of = groundtruth_is_group_of_list.astype(bool)[groundtruth_indices]
+    non_group_of_indices, starts, ends = self._select_in_groups(
+        groundtruth_indices, groundtruth_starts, groundtruth_ends, ~is_group_of)
+    starts = np.repeat(starts, num_detections_per_class)
+    ends = np.repeat(ends, num_detections_per_class)
+    has_groundtruth = np.flatnonzero(ends > starts)
+    if has_groundtruth.size > 0:
+      max_overlap_ious, max_overlap_gt_ids = np_box_ops.max_iou_in_ranges(
+          detected_boxes[has_groundtruth, :],
+          groundtruth_boxes[non_group_of_indices, :], starts[has_groundtruth],
+          ends[has_groundtruth])
+      is_matched = max_overlap_ious >= self.matching_iou_threshold
+      is_difficult = groundtruth_is_difficult_list[
+          non_group_of_indices[max_overlap_gt_ids]]
+      is_matched_to_difficult_box[has_groundtruth] = is_matched & is_difficult
+      is_matched &= ~is_difficult
+      _, first_matches = np.unique(max_overlap_gt_ids[is_matched],
+                                   return_index=True)
+      tp_fp_labels[has_groundtruth[is_matched][first_matches]] = True
 
     # Tp-fp evaluation for group of boxes.
-    gt_group_of_boxlist = np_box_list.BoxList(
-        groundtruth_boxes[groundtruth_is_group_of_list, :])
-    if gt_group_of_boxlist.num_boxes() > 0:
-      ioa = np_box_list_ops.ioa(gt_group_of_boxlist, detected_boxlist)
-      max_overlap_group_of_gt = np.max(ioa, axis=0)
-      for i in range(detected_boxlist.num_boxes()):
-        if (not tp_fp_labels[i] and not is_matched_to_difficult_box[i] and
-            max_overlap_group_of_gt[i] >= self.matching_iou_threshold):
-          is_matched_to_group_of_box[i] = True
-
-    return scores[~is_matched_to_difficult_box
-                  & ~is_matched_to_group_of_box], tp_fp_labels[
-                      ~is_matched_to_difficult_box
-                      & ~is_matched_to_group_of_box]
+    if np.any(is_group_of):
+      group_of_indices, starts, ends = self._select_in_groups(
+          groundtruth_indices, groundtruth_starts, groundtruth_ends,
+          is_group_of)
+      starts = np.repeat(starts, num_detections_per_class)
+      ends = np.repeat(ends, num_detections_per_class)
+      has_group_of = np.flatnonzero(ends > starts)
+      if has_group_of.size > 0:
+        max_overlap_group_of_gt, _ = np_box_ops.max_ioa_in_ranges(
+            groundtruth_boxes[group_of_indices, :],
+            detected_boxes[has_group_of, :], starts[has_group_of],
+            ends[has_group_of])
+        is_matched_to_group_of_box[has_group_of] = (
+            ~tp_fp_labels[has_group_of] &
+            ~is_matched_to_difficult_box[has_group_of] &
+            (max_overlap_group_of_gt >= self.matching_iou_threshold))
+
+    is_evaluated = ~is_matched_to_difficult_box & ~is_matched_to_group_of_box
+    starts, ends = detected_starts, detected_ends
+    if not np.all(is_evaluated):
+      _, starts, ends = self._select_in_groups(
+          detected_indices, detected_starts, detected_ends, is_evaluated)
+      scores = scores[is_evaluated]
+      tp_fp_labels = tp_fp_labels[is_evaluated]
+    starts = starts.tolist()
+    ends = ends.tolist()
+    return ([scores[start:end] for start, end in zip(starts, ends)],
+            [tp_fp_labels[start:end] for start, end in zip(starts, ends)])
@@ -221,6 +221,40 @@ class MultiClassesTpFpTest(tf.test.TestCase):
       self.assertTrue(np.array_equal(expected_tp_fp_labels[i], tp_fp_labels[i]))
 
 
+  def test_tp_fp_with_empty_and_unknown_classes(self):
+    num_groundtruth_classes = 4
+    matching_iou_threshold = 0.5
+    nms_iou_threshold = 1.0
+    nms_max_output_boxes = 10000
+    eval1 = per_image_evaluation.PerImageEvaluation(num_groundtruth_classes,
+                                                    matching_iou_threshold,
+                                                    nms_iou_threshold,
+                                                    nms_max_output_boxes)
+    detected_boxes = np.array([[0, 0, 1, 1], [0, 0, 1, 1], [0, 0, 2, 2],
+                               [0, 0, 1, 1], [0, 0, 1, 1]], dtype=float)
+    detected_scores = np.array([0.5, 0.9, 0.7, 0.8, 0.6], dtype=float)
+    detected_class_labels = np.array([3, 3, 3, 5, -1], dtype=int)
+    groundtruth_boxes = np.array([[0, 0, 1, 1], [0, 0, 2, 2], [0, 0, 1, 1]],
+                                 dtype=float)
+    groundtruth_class_labels = np.array([3, 1, 3], dtype=int)
+    groundtruth_groundtruth_is_difficult_list = np.zeros(3, dtype=bool)
+    groundtruth_groundtruth_is_group_of_list = np.zeros(3, dtype=bool)
+    scores, tp_fp_labels = eval1._compute_tp_fp(
+        detected_boxes, detected_scores, detected_class_labels,
+        groundtruth_boxes, groundtruth_class_labels,
+        groundtruth_groundtruth_is_difficult_list,
+        groundtruth_groundtruth_is_group_of_list)
+    # Only the first of the two detections matched to the same groundtruth box
+    # is a true positive; the labels outside of the classes are ignored.
+    expected_scores = [np.array([], dtype=float)] * 3 + [
+        np.array([0.9, 0.7, 0.5], dtype=float)]
+    expected_tp_fp_labels = [np.array([], dtype=bool)] * 3 + [
+        np.array([True, False, False])]
+    self.assertEqual(len(expected_scores), len(scores))
+    for i in range(len(expected_scores)):
+      self.assertAllClose(expected_scores[i], scores[i])
+      self.assertAllEqual(expected_tp_fp_labels[i], tp_fp_labels[i])
+
 class CorLocTest(tf.test.TestCase):
 
   def test_compute_corloc_with_normal_iou_threshold(self):
@@ -18,6 +18,12 @@
 These functions often receive an image, perform some visualization on the image.
 The functions do not return a value, instead they modify the image itself.
 
+Boxes, labels and keypoints drawn on numpy arrays can be drawn either with PIL
+(the default), or natively with OpenCV (see `set_drawing_backend`). The OpenCV
+backend draws in place on the array, without converting the whole image to a
+PIL image (and back) for each box, and blits the labels from a cache of
+pre-rendered sprites (see `LabelSpriteCache`).
+
 """
 import collections
 import functools
@@ -30,6 +36,11 @@ import PIL.ImageFont as ImageFont
 import six
 import tensorflow as tf
 
+try:
+  import cv2  # pylint: disable=g-import-not-at-top
+except ImportError:
+  cv2 = None
+
 
 _TITLE_LEFT_MARGIN = 10
 _TITLE_TOP_MARGIN = 10
@@ -59,6 +70,212 @@ STANDARD_COLORS = [
     'WhiteSmoke', 'Yellow', 'YellowGreen'
 ]
 
+_DRAWING_BACKENDS = ('pil', 'cv2')
+_drawing_backend = 'pil'
+
+# Caches shared by every call, as the same fonts, colors and display strings
+# get drawn on every frame.
+_MAX_TEXT_SIZE_CACHE_SIZE = 4096
+_font_cache = {}
+_color_cache = {}
+_text_size_cache = {}
+
+# Size of the font used to draw display strings.
+_LABEL_FONT_SIZE = 24
+
+# Max number of label sprites kept in memory. The display strings come from a
+# small set (i.e. class name x 101 percentages), so most of them stay cached.
+_MAX_LABEL_SPRITES = 2048
+
+
+def set_drawing_backend(backend):
+  """Sets the backend used to draw on numpy arrays.
+
+  Args:
+    backend: 'pil' to draw using PIL (default), or 'cv2' to draw natively
+      using OpenCV, in place on the array and in a single pass.
+
+  Raises:
+    ValueError: if the backend is unknown, or OpenCV is not installed.
+  """
+  global _drawing_backend
+  _drawing_backend = _check_drawing_backend(backend)
+
+
+def get_drawing_backend():
+  """Returns the backend used to draw on numpy arrays ('pil' or 'cv2')."""
+  return _drawing_backend
+
+
+def _check_drawing_backend(backend):
+  """Returns the given backend (or the default one if None) if it's usable."""
+  if backend is None:
+    return _drawing_backend
+  if backend not in _DRAWING_BACKENDS:
+    raise ValueError('Unknown drawing backend: {} (expected one of {})'.format(
+        backend, ', '.join(_DRAWING_BACKENDS)))
+  if backend == 'cv2' and cv2 is None:
+    raise ValueError('The cv2 drawing backend requires OpenCV (cv2).')
+  return backend
+
+
+def _get_font(font_size=_LABEL_FONT_SIZE):
+  """Returns the font used to draw display strings, loading it only once."""
+  if font_size not in _font_cache:
+    try:
+      _font_cache[font_size] = ImageFont.truetype('arial.ttf', font_size)
+    except IOError:
+      _font_cache[font_size] = ImageFont.load_default()
+  return _font_cache[font_size]
+
+
+def _color_to_rgb(color):
+  """Returns the (r, g, b) tuple of a color name (or of an (r, g, b) tuple)."""
+  if not isinstance(color, six.string_types):
+    return tuple(int(value) for value in color[:3])
+  if color not in _color_cache:
+    _color_cache[color] = ImageColor.getrgb(color)[:3]
+  return _color_cache[color]
+
+
+def _get_text_size(display_str, font_size=_LABEL_FONT_SIZE):
+  """Returns the (width, height) of a display string in pixels."""
+  key = (display_str, font_size)
+  if key not in _text_size_cache:
+    if len(_text_size_cache) >= _MAX_TEXT_SIZE_CACHE_SIZE:
+      _text_size_cache.clear()
+    _text_size_cache[key] = _get_font(font_size).getsize(display_str)
+  return _text_size_cache[key]
+
+
+class LabelSprite(object):
+  """A pre-rendered label: a display string in black text on a filled box.
+
+  Attributes:
+    rgb: uint8 numpy array of shape [height, width, 3].
+    alpha: uint16 numpy array of shape [height, width, 1] with values in
+      [0, 255] (the text may extend past the right edge of the filled box).
+    premultiplied_rgb: uint16 numpy array rgb * alpha, used for blending.
+    opaque: True if every pixel of the sprite is opaque.
+    margin: margin (in pixels) between the text and the edge of the box.
+  """
+
+  def __init__(self, rgba, margin):
+    self.rgb = np.ascontiguousarray(rgba[:, :, :3])
+    self.alpha = rgba[:, :, 3:].astype(np.uint16)
+    self.premultiplied_rgb = self.rgb * self.alpha
+    self.opaque = bool(np.all(self.alpha == 255))
+    self.margin = margin
+
+  @property
+  def height(self):
+    return self.rgb.shape[0]
+
+  @property
+  def width(self):
+    return self.rgb.shape[1]
+
+
+class LabelSpriteCache(object):
+  """A bounded LRU cache of pre-rendered labels.
+
+  Labels are rasterized with PIL (same as `draw_bounding_box_on_image`) the
+  first time they are drawn, then blitted into the image with numpy slicing,
+  so no text gets rasterized for labels that were drawn before.
+  """
+
+  def __init__(self, max_size=_MAX_LABEL_SPRITES):
+    """Constructor.
+
+    Args:
+      max_size: max number of sprites kept in the cache. The least recently
+        used sprite is evicted once the cache is full.
+    """
+    self._max_size = max_size
+    self._sprites = collections.OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def __len__(self):
+    return len(self._sprites)
+
+  def clear(self):
+    self._sprites.clear()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, display_str, color, font_size=_LABEL_FONT_SIZE):
+    """Returns the LabelSprite of a display string, rendering it if needed.
+
+    Args:
+      display_str: the string to be displayed.
+      color: color of the box behind the text (a color name or (r, g, b)).
+      font_size: size of the font.
+
+    Returns:
+      a LabelSprite.
+    """
+    key = (display_str, _color_to_rgb(color), font_size)
+    sprite = self._sprites.pop(key, None)
+    if sprite is None:
+      self.misses += 1
+      sprite = self._render(display_str, key[1], font_size)
+      if len(self._sprites) >= self._max_size:
+        self._sprites.popitem(last=False)
+    else:
+      self.hits += 1
+    # The most recently used sprite goes to the end.
+    self._sprites[key] = sprite
+    return sprite
+
+  def _render(self, display_str, rgb, font_size):
+    """Renders a label the same way `draw_bounding_box_on_image` draws it."""
+    font = _get_font(font_size)
+    text_width, text_height = _get_text_size(display_str, font_size)
+    margin = int(np.ceil(0.05 * text_height))
+    sprite = Image.new(
+        'RGBA', (text_width + margin + 1, text_height + 2 * margin + 1),
+        (0, 0, 0, 0))
+    draw = ImageDraw.Draw(sprite)
+    draw.rectangle([(0, 0), (text_width, text_height + 2 * margin)],
+                   fill=rgb + (255,))
+    draw.text((margin, margin), display_str, fill=(0, 0, 0, 255), font=font)
+    return LabelSprite(np.array(sprite), margin)
+
+
+_label_sprite_cache = LabelSpriteCache()
+
+
+def get_label_sprite_cache():
+  """Returns the LabelSpriteCache shared by every call (i.e. to clear it)."""
+  return _label_sprite_cache
+
+
+def _blit_label_sprite(image, sprite, left, top):
+  """Alpha-blends a LabelSprite into an image (numpy array) in place.
+
+  Args:
+    image: a uint8 numpy array with shape [height, width, 3].
+    sprite: a LabelSprite.
+    left: x coordinate (in pixels) of the top-left corner of the sprite.
+    top: y coordinate (in pixels) of the top-left corner of the sprite.
+  """
+  im_height, im_width = image.shape[:2]
+  x0, y0 = max(left, 0), max(top, 0)
+  x1, y1 = min(left + sprite.width, im_width), min(top + sprite.height,
+                                                   im_height)
+  if x0 >= x1 or y0 >= y1:
+    return
+  window = image[y0:y1, x0:x1]
+  sprite_window = (slice(y0 - top, y1 - top), slice(x0 - left, x1 - left))
+  if sprite.opaque:
+    window[...] = sprite.rgb[sprite_window]
+    return
+  alpha = sprite.alpha[sprite_window]
+  # Integer blending: (sprite * alpha + image * (255 - alpha)) / 255
+  window[...] = (sprite.premultiplied_rgb[sprite_window] +
+                 window * (255 - alpha) + 127) // 255
+
 
 def save_image_array_as_png(image, output_path):
   """Saves an image (represented as a numpy array) to PNG.
@@ -97,7 +314,8 @@ def draw_bounding_box_on_image_array(image,
                                      color='red',
                                      thickness=4,
                                      display_str_list=(),
-                                     use_normalized_coordinates=True):
+                                     use_normalized_coordinates=True,
+                                     backend=None):
   """Adds a bounding box to an image (numpy array).
 
   Args:
@@ -113,7 +331,14 @@ def draw_bounding_box_on_image_array(image,
     use_normalized_coordinates: If True (default), treat coordinates
       ymin, xmin, ymax, xmax as relative to the image.  Otherwise treat
       coordinates as absolute.
+    backend: 'pil' or 'cv2' (see `set_drawing_backend`). Default is the
+      backend set by `set_drawing_backend`.
   """
+  if _check_drawing_backend(backend) == 'cv2':
+    _draw_on_image_array_cv2(
+        image, _draw_bounding_box_on_image_array_cv2, ymin, xmin, ymax, xmax,
+        color, thickness, display_str_list, use_normalized_coordinates)
+    return
   image_pil = Image.fromarray(np.uint8(image)).convert('RGB')
   draw_bounding_box_on_image(image_pil, ymin, xmin, ymax, xmax, color,
                              thickness, display_str_list,
@@ -160,15 +385,12 @@ def draw_bounding_box_on_image(image,
     (left, right, top, bottom) = (xmin, xmax, ymin, ymax)
   draw.line([(left, top), (left, bottom), (right, bottom),
              (right, top), (left, top)], width=thickness, fill=color)
-  try:
-    font = ImageFont.truetype('arial.ttf', 24)
-  except IOError:
-    font = ImageFont.load_default()
+  font = _get_font()
 
   # If the total height of the display strings added to the top of the bounding
   # box exceeds the top of the image, stack the strings below the bounding box
   # instead of above.
-  display_str_heights = [font.getsize(ds)[1] for ds in display_str_list]
+  display_str_heights = [_get_text_size(ds)[1] for ds in display_str_list]
   # Each display_str has a top and bottom margin of 0.05x.
   total_display_str_height = (1 + 2 * 0.05) * sum(display_str_heights)
 
@@ -178,7 +400,7 @@ def draw_bounding_box_on_image(image,
     text_bottom = bottom + total_display_str_height
   # Reverse list and print from bottom to top.
   for display_str in display_str_list[::-1]:
-    text_width, text_height = font.getsize(display_str)
+    text_width, text_height = _get_text_size(display_str)
     margin = np.ceil(0.05 * text_height)
     draw.rectangle(
         [(left, text_bottom - text_height - 2 * margin), (left + text_width,
@@ -192,6 +414,84 @@ def draw_bounding_box_on_image(image,
     text_bottom -= text_height - 2 * margin
 
 
+def _draw_on_image_array_cv2(image, draw_fn, *args):
+  """Calls draw_fn(image, *args) in place on a numpy array using OpenCV.
+
+  OpenCV can only draw in place on contiguous arrays, so other arrays (i.e. a
+  slice of a larger image) are drawn on a copy, which is then copied back.
+
+  Args:
+    image: a uint8 numpy array with shape [height, width, 3].
+    draw_fn: a function that draws on a contiguous numpy array with OpenCV.
+    *args: the rest of the arguments of draw_fn.
+  """
+  if image.dtype == np.uint8 and image.flags['C_CONTIGUOUS']:
+    draw_fn(image, *args)
+  else:
+    image_copy = np.ascontiguousarray(image, dtype=np.uint8)
+    draw_fn(image_copy, *args)
+    np.copyto(image, image_copy)
+
+
+def _draw_bounding_box_on_image_array_cv2(image,
+                                          ymin,
+                                          xmin,
+                                          ymax,
+                                          xmax,
+                                          color='red',
+                                          thickness=4,
+                                          display_str_list=(),
+                                          use_normalized_coordinates=True):
+  """Adds a bounding box to a contiguous uint8 image (numpy array) with OpenCV.
+
+  Same as `draw_bounding_box_on_image`: each string in display_str_list is
+  displayed on a separate line above the bounding box (or below it, if there's
+  no room above it) in black text on a rectangle filled with the input 'color'.
+  The labels are pre-rendered with PIL once, then blitted from a cache.
+
+  Args:
+    image: a contiguous uint8 numpy array with shape [height, width, 3].
+    ymin: ymin of bounding box.
+    xmin: xmin of bounding box.
+    ymax: ymax of bounding box.
+    xmax: xmax of bounding box.
+    color: color to draw bounding box. Default is red.
+    thickness: line thickness. Default value is 4.
+    display_str_list: list of strings to display in box
+                      (each to be shown on its own line).
+    use_normalized_coordinates: If True (default), treat coordinates
+      ymin, xmin, ymax, xmax as relative to the image.  Otherwise treat
+      coordinates as absolute.
+  """
+  im_height, im_width = image.shape[:2]
+  if use_normalized_coordinates:
+    (left, right, top, bottom) = (xmin * im_width, xmax * im_width,
+                                  ymin * im_height, ymax * im_height)
+  else:
+    (left, right, top, bottom) = (xmin, xmax, ymin, ymax)
+  rgb = _color_to_rgb(color)
+  cv2.rectangle(image, (int(round(left)), int(round(top))),
+                (int(round(right)), int(round(bottom))), rgb,
+                max(int(thickness), 1))
+
+  display_str_heights = [_get_text_size(ds)[1] for ds in display_str_list]
+  # Each display_str has a top and bottom margin of 0.05x.
+  total_display_str_height = (1 + 2 * 0.05) * sum(display_str_heights)
+
+  if top > total_display_str_height:
+    text_bottom = top
+  else:
+    text_bottom = bottom + total_display_str_height
+  # Reverse list and print from bottom to top. The labels are pre-rendered
+  # sprites (see LabelSpriteCache), so no text gets rasterized here.
+  for display_str in display_str_list[::-1]:
+    sprite = _label_sprite_cache.get(display_str, rgb)
+    text_height = sprite.height - 2 * sprite.margin - 1
+    _blit_label_sprite(image, sprite, int(round(left)),
+                       int(round(text_bottom - text_height - 2 * sprite.margin)))
+    text_bottom -= text_height - 2 * sprite.margin
+
+
 def draw_bounding_boxes_on_image_array(image,
                                        boxes,
                                        color='red',
@@ -307,7 +607,8 @@ def draw_keypoints_on_image_array(image,
                                   keypoints,
                                   color='red',
                                   radius=2,
-                                  use_normalized_coordinates=True):
+                                  use_normalized_coordinates=True,
+                                  backend=None):
   """Draws keypoints on an image (numpy array).
 
   Args:
@@ -317,7 +618,14 @@ def draw_keypoints_on_image_array(image,
     radius: keypoint radius. Default value is 2.
     use_normalized_coordinates: if True (default), treat keypoint values as
       relative to the image.  Otherwise treat them as absolute.
+    backend: 'pil' or 'cv2' (see `set_drawing_backend`). Default is the
+      backend set by `set_drawing_backend`.
   """
+  if _check_drawing_backend(backend) == 'cv2':
+    _draw_on_image_array_cv2(image, _draw_keypoints_on_image_array_cv2,
+                             keypoints, color, radius,
+                             use_normalized_coordinates)
+    return
   image_pil = Image.fromarray(np.uint8(image)).convert('RGB')
   draw_keypoints_on_image(image_pil, keypoints, color, radius,
                           use_normalized_coordinates)
@@ -352,9 +660,36 @@ def draw_keypoints_on_image(image,
                  outline=color, fill=color)
 
 
+def _draw_keypoints_on_image_array_cv2(image,
+                                       keypoints,
+                                       color='red',
+                                       radius=2,
+                                       use_normalized_coordinates=True):
+  """Draws keypoints on a contiguous uint8 image (numpy array) with OpenCV.
+
+  Args:
+    image: a contiguous uint8 numpy array with shape [height, width, 3].
+    keypoints: a numpy array with shape [num_keypoints, 2].
+    color: color to draw the keypoints with. Default is red.
+    radius: keypoint radius. Default value is 2.
+    use_normalized_coordinates: if True (default), treat keypoint values as
+      relative to the image.  Otherwise treat them as absolute.
+  """
+  im_height, im_width = image.shape[:2]
+  rgb = _color_to_rgb(color)
+  for keypoint_y, keypoint_x in keypoints:
+    if use_normalized_coordinates:
+      keypoint_x, keypoint_y = keypoint_x * im_width, keypoint_y * im_height
+    cv2.circle(image, (int(round(keypoint_x)), int(round(keypoint_y))),
+               max(int(round(radius)), 1), rgb, cv2.FILLED)
+
+
 def draw_mask_on_image_array(image, mask, color='red', alpha=0.7):
   """Draws mask on an image.
 
+  The mask is only blended within its bounding rectangle, in place and with
+  integer arithmetic (same rounding as PIL's Image.composite).
+
   Args:
     image: uint8 numpy array with shape (img_height, img_height, 3)
     mask: a uint8 numpy array of shape (img_height, img_height) with
@@ -362,24 +697,61 @@ def draw_mask_on_image_array(image, mask, color='red', alpha=0.7):
     color: color to draw the keypoints with. Default is red.
     alpha: transparency value between 0 and 1. (default: 0.7)
 
+  Raises:
+    ValueError: On incorrect data type for image or masks.
+  """
+  draw_masks_on_image_array(image, mask[np.newaxis], [color], alpha)
+
+
+def draw_masks_on_image_array(image, masks, colors, alpha=0.7):
+  """Draws a stack of instance masks on an image, in a single pass.
+
+  The masks are blended one after the other (so later masks are drawn on top
+  of earlier ones), each only within its own bounding rectangle.
+
+  Args:
+    image: uint8 numpy array with shape (img_height, img_width, 3)
+    masks: a uint8 numpy array of shape (num_masks, img_height, img_width)
+      with values between either 0 or 1.
+    colors: a list of colors (one for each mask), or a single color for all.
+    alpha: transparency value between 0 and 1. (default: 0.7)
+
   Raises:
     ValueError: On incorrect data type for image or masks.
   """
   if image.dtype != np.uint8:
     raise ValueError('`image` not of type np.uint8')
-  if mask.dtype != np.uint8:
-    raise ValueError('`mask` not of type np.uint8')
-  if np.any(np.logical_and(mask != 1, mask != 0)):
-    raise ValueError('`mask` elements should be in [0, 1]')
-  rgb = ImageColor.getrgb(color)
-  pil_image = Image.fromarray(image)
-
-  solid_color = np.expand_dims(
-      np.ones_like(mask), axis=2) * np.reshape(list(rgb), [1, 1, 3])
-  pil_solid_color = Image.fromarray(np.uint8(solid_color)).convert('RGBA')
-  pil_mask = Image.fromarray(np.uint8(255.0*alpha*mask)).convert('L')
-  pil_image = Image.composite(pil_solid_color, pil_image, pil_mask)
-  np.copyto(image, np.array(pil_image.convert('RGB')))
+  if masks.dtype != np.uint8:
+    raise ValueError('`masks` not of type np.uint8')
+  if isinstance(colors, six.string_types) or isinstance(
+      colors[0], six.integer_types + (np.integer,)):
+    # A single color (a color name or (r, g, b)) for every mask.
+    colors = [colors] * masks.shape[0]
+
+  # Rows and columns covered by each mask.
+  masks_rows = np.any(masks, axis=2)
+  masks_columns = np.any(masks, axis=1)
+  mask_alpha = np.uint16(255.0 * alpha)
+
+  for mask, rows, columns, color in zip(masks, masks_rows, masks_columns,
+                                        colors):
+    rows = np.flatnonzero(rows)
+    if not rows.size:
+      continue
+    columns = np.flatnonzero(columns)
+    window = (slice(rows[0], rows[-1] + 1), slice(columns[0], columns[-1] + 1))
+
+    # Any element outside of the bounding rectangle is 0.
+    window_mask = mask[window]
+    if np.any(window_mask > 1):
+      raise ValueError('`mask` elements should be in [0, 1]')
+
+    weights = (window_mask.astype(np.uint16) * mask_alpha)[:, :, np.newaxis]
+    rgb = np.array(_color_to_rgb(color), dtype=np.uint16)
+    image_window = image[window]
+    # (rgb * weights + image * (255 - weights)) / 255, rounded as PIL does.
+    blended = rgb * weights + image_window * (255 - weights) + 128
+    image_window[...] = ((blended >> 8) + blended) >> 8
 
 
 def visualize_boxes_and_labels_on_image_array(image,
@@ -393,7 +765,8 @@ def visualize_boxes_and_labels_on_image_array(image,
                                               max_boxes_to_draw=20,
                                               min_score_thresh=.5,
                                               agnostic_mode=False,
-                                              line_thickness=4):
+                                              line_thickness=4,
+                                              backend=None):
   """Overlay labeled boxes on an image with formatted scores and label names.
 
   This function groups boxes that correspond to the same location
@@ -424,10 +797,21 @@ def visualize_boxes_and_labels_on_image_array(image,
       class-agnostic mode or not.  This mode will display scores but ignore
       classes.
     line_thickness: integer (default: 4) controlling line width of the boxes.
+    backend: 'pil' or 'cv2' (see `set_drawing_backend`). Default is the
+      backend set by `set_drawing_backend`. The 'cv2' backend draws every box
+      in place on the image, without converting it to a PIL image for each box.
 
   Returns:
     uint8 numpy array with shape (img_height, img_width, 3) with overlaid boxes.
   """
+  backend = _check_drawing_backend(backend)
+  output_image = image
+  if backend == 'cv2' and not (image.dtype == np.uint8 and
+                               image.flags['C_CONTIGUOUS']):
+    # OpenCV draws in place on contiguous arrays only, so every box gets drawn
+    # on a single contiguous copy, which is copied back once at the end.
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+
   # Create a display string (and color) for every box location, group any boxes
   # that correspond to the same location.
   box_to_display_str_map = collections.defaultdict(list)
@@ -463,10 +847,17 @@ def visualize_boxes_and_labels_on_image_array(image,
           box_to_color_map[box] = STANDARD_COLORS[
               classes[i] % len(STANDARD_COLORS)]
 
+  if instance_masks is not None and backend == 'cv2' and box_to_color_map:
+    # Every instance mask is drawn in a single pass, below all of the boxes.
+    draw_masks_on_image_array(
+        image,
+        np.stack([box_to_instance_masks_map[box] for box in box_to_color_map]),
+        list(box_to_color_map.values()))
+
   # Draw all boxes onto image.
   for box, color in box_to_color_map.items():
     ymin, xmin, ymax, xmax = box
-    if instance_masks is not None:
+    if instance_masks is not None and backend != 'cv2':
       draw_mask_on_image_array(
           image,
           box_to_instance_masks_map[box],
@@ -481,16 +872,20 @@ def visualize_boxes_and_labels_on_image_array(image,
         color=color,
         thickness=line_thickness,
         display_str_list=box_to_display_str_map[box],
-        use_normalized_coordinates=use_normalized_coordinates)
+        use_normalized_coordinates=use_normalized_coordinates,
+        backend=backend)
     if keypoints is not None:
       draw_keypoints_on_image_array(
           image,
           box_to_keypoints_map[box],
           color=color,
           radius=line_thickness / 2,
-          use_normalized_coordinates=use_normalized_coordinates)
+          use_normalized_coordinates=use_normalized_coordinates,
+          backend=backend)
 
-  return image
+  if image is not output_image:
+    np.copyto(output_image, image)
+  return output_image
 
 
 def add_cdf_image_summary(values, name):
@@ -86,6 +86,94 @@ class VisualizationUtilsTest(tf.test.TestCase):
     self.assertEqual(width_original, width_final)
     self.assertEqual(height_original, height_final)
 
+  def test_draw_bounding_box_on_image_array_cv2_backend(self):
+    test_image = self.create_colorful_test_image()
+    expected_image = test_image.copy()
+    ymin = 0.25
+    ymax = 0.75
+    xmin = 0.4
+    xmax = 0.6
+
+    visualization_utils.draw_bounding_box_on_image_array(
+        test_image, ymin, xmin, ymax, xmax, color='Red',
+        display_str_list=['dog: 90%'], backend='cv2')
+
+    self.assertEqual(expected_image.shape, test_image.shape)
+    # The box is drawn in place, in the given color.
+    self.assertAllEqual(test_image[100, 160], [255, 0, 0])
+    self.assertAllEqual(test_image[100, 240], [255, 0, 0])
+    # The inside of the box is left untouched.
+    self.assertAllEqual(test_image[100, 200], expected_image[100, 200])
+
+  def test_draw_bounding_box_on_non_contiguous_image_array_cv2_backend(self):
+    test_image = np.concatenate(
+        [self.create_colorful_test_image()] * 2, axis=1)[:, ::2]
+    self.assertFalse(test_image.flags['C_CONTIGUOUS'])
+
+    visualization_utils.draw_bounding_box_on_image_array(
+        test_image, 0.25, 0.4, 0.75, 0.6, color='Red', backend='cv2')
+
+    self.assertAllEqual(test_image[100, 160], [255, 0, 0])
+
+  def test_cv2_backend_draws_the_same_labels(self):
+    pil_image = self.create_colorful_test_image()
+    cv2_image = pil_image.copy()
+    display_str_list = ['dog: 90%', 'cat: 12%']
+
+    for image, backend in ((pil_image, 'pil'), (cv2_image, 'cv2')):
+      visualization_utils.draw_bounding_box_on_image_array(
+          image, 0.5, 0.4, 0.75, 0.6, color='Red', thickness=1,
+          display_str_list=display_str_list, backend=backend)
+
+    self.assertAllEqual(pil_image, cv2_image)
+
+  def test_label_sprite_cache(self):
+    cache = visualization_utils.LabelSpriteCache(max_size=2)
+    dog = cache.get('dog: 90%', 'Red')
+    self.assertIs(dog, cache.get('dog: 90%', 'Red'))
+    self.assertIs(dog, cache.get('dog: 90%', (255, 0, 0)))
+    self.assertEqual(3, dog.rgb.ndim)
+    self.assertEqual(dog.rgb.shape[:2], dog.alpha.shape[:2])
+
+    cat = cache.get('cat: 90%', 'Red')
+    # The least recently used sprite gets evicted.
+    cache.get('dog: 90%', 'Red')
+    cache.get('dog: 90%', 'Blue')
+    self.assertEqual(2, len(cache))
+    self.assertIsNot(cat, cache.get('cat: 90%', 'Red'))
+    self.assertEqual(3, cache.hits)
+    self.assertEqual(4, cache.misses)
+
+  def test_blit_label_sprite(self):
+    rgba = np.zeros([2, 3, 4], dtype=np.uint8)
+    rgba[:, :, :3] = 200
+    rgba[:, :, 3] = [[255, 0, 51], [255, 255, 255]]
+    sprite = visualization_utils.LabelSprite(rgba, margin=0)
+    self.assertFalse(sprite.opaque)
+
+    test_image = np.full([3, 3, 3], 100, dtype=np.uint8)
+    # The sprite is clipped at the bottom-right corner of the image.
+    visualization_utils._blit_label_sprite(test_image, sprite, 1, 2)
+    expected_result = np.full([3, 3, 3], 100, dtype=np.uint8)
+    expected_result[2, 1] = 200
+    expected_result[2, 2] = 100
+    self.assertAllEqual(test_image, expected_result)
+
+    visualization_utils._blit_label_sprite(test_image, sprite, 0, 0)
+    expected_result[0, :] = [[200] * 3, [100] * 3, [120] * 3]
+    expected_result[1, :] = 200
+    self.assertAllEqual(test_image, expected_result)
+
+  def test_set_drawing_backend(self):
+    self.assertEqual('pil', visualization_utils.get_drawing_backend())
+    visualization_utils.set_drawing_backend('cv2')
+    try:
+      self.assertEqual('cv2', visualization_utils.get_drawing_backend())
+    finally:
+      visualization_utils.set_drawing_backend('pil')
+    with self.assertRaises(ValueError):
+      visualization_utils.set_drawing_backend('unknown')
+
   def test_draw_bounding_boxes_on_image(self):
     test_image = self.create_colorful_test_image()
     test_image = Image.fromarray(test_image)
@@ -145,10 +233,33 @@ class VisualizationUtilsTest(tf.test.TestCase):
         for i in range(images_with_boxes_np.shape[0]):
           img_name = 'image_' + str(i) + '.png'
           output_file = os.path.join(self.get_temp_dir(), img_name)
-          print 'Writing output image %d to %s' % (i, output_file)
+          print('Writing output image %d to %s' % (i, output_file))
           image_pil = Image.fromarray(images_with_boxes_np[i, ...])
           image_pil.save(output_file)
 
+  def test_visualize_boxes_and_labels_on_image_array_cv2_backend(self):
+    category_index = {1: {'id': 1, 'name': 'dog'}, 2: {'id': 2, 'name': 'cat'}}
+    boxes = np.array([[0.25, 0.25, 0.75, 0.75], [0.1, 0.3, 0.6, 1.0]])
+    classes = np.array([1, 2], dtype=np.int32)
+    scores = np.array([0.8, 0.6])
+    keypoints = np.array([[[0.5, 0.5]], [[0.3, 0.6]]])
+
+    pil_image = self.create_colorful_test_image()
+    cv2_image = pil_image.copy()
+    for image, backend in ((pil_image, 'pil'), (cv2_image, 'cv2')):
+      output_image = (
+          visualization_utils.visualize_boxes_and_labels_on_image_array(
+              image, boxes, classes, scores, category_index,
+              keypoints=keypoints, use_normalized_coordinates=True,
+              backend=backend))
+      self.assertIs(image, output_image)
+
+    # Both backends draw the same boxes in the same colors.
+    color = np.array(visualization_utils.ImageColor.getrgb(
+        visualization_utils.STANDARD_COLORS[1]))
+    self.assertAllEqual(pil_image[100, 100], color)
+    self.assertAllEqual(cv2_image[100, 100], color)
+
   def test_draw_keypoints_on_image(self):
     test_image = self.create_colorful_test_image()
     test_image = Image.fromarray(test_image)
@@ -185,6 +296,44 @@ class VisualizationUtilsTest(tf.test.TestCase):
                                                  color='Blue', alpha=.5)
     self.assertAllEqual(test_image, expected_result)
 
+  def test_draw_mask_on_image_array_blends_only_the_mask(self):
+    test_image = self.create_colorful_test_image()
+    mask = np.zeros(test_image.shape[:2], dtype=np.uint8)
+    mask[40:60, 150:250] = 1
+    expected_result = test_image.copy()
+    expected_result[40:60, 150:200] = [255, 39, 39]
+    expected_result[40:60, 200:250] = [255, 77, 0]
+
+    visualization_utils.draw_mask_on_image_array(test_image, mask,
+                                                 color='Red', alpha=.7)
+    self.assertAllEqual(test_image, expected_result)
+
+  def test_draw_mask_on_image_array_with_invalid_mask(self):
+    test_image = self.create_colorful_test_image()
+    mask = np.zeros(test_image.shape[:2], dtype=np.uint8)
+    mask[10, 10] = 2
+    with self.assertRaises(ValueError):
+      visualization_utils.draw_mask_on_image_array(test_image, mask)
+
+  def test_draw_masks_on_image_array(self):
+    test_image = np.zeros([2, 3, 3], dtype=np.uint8)
+    masks = np.asarray([[[1, 1, 0],
+                         [0, 0, 0]],
+                        [[0, 1, 1],
+                         [0, 0, 0]],
+                        [[0, 0, 0],
+                         [0, 0, 0]]], dtype=np.uint8)
+    expected_result = test_image.copy()
+    for mask, color in zip(masks, ['Blue', 'Red', 'Green']):
+      visualization_utils.draw_mask_on_image_array(expected_result, mask,
+                                                   color=color, alpha=.5)
+
+    # Later masks are drawn on top of earlier ones.
+    visualization_utils.draw_masks_on_image_array(
+        test_image, masks, ['Blue', 'Red', 'Green'], alpha=.5)
+    self.assertAllEqual(test_image, expected_result)
+    self.assertAllEqual(test_image[0], [[0, 0, 127], [127, 0, 64], [127, 0, 0]])
+
   def test_add_cdf_image_summary(self):
     values = [0.1, 0.2, 0.3, 0.4, 0.42, 0.44, 0.46, 0.48, 0.50]
     visualization_utils.add_cdf_image_summary(values, 'PositiveAnchorLoss')
@@ -0,0 +1,279 @@
+# coding: utf-8
+"""
+An A/B report that compares pre-trained models of the ObjectClassifier (i.e. a model and its reduced-precision version)
+on a held-out set of annotated images.
+
+Each model runs over the same images through ObjectClassifier.scan_road, then its detections are evaluated against
+the ground truth using the PASCAL metrics of the Tensorflow Object Detection API (object_detection_evaluation.py).
+The report lists the mAP, CorLoc and frames/sec of each model side by side,
+so that the speed/accuracy trade-off of each model could be chosen knowingly.
+
+- Usage (run from the src folder):
+    python -m profiling.classifier_report <path to TFRecord> [--classifiers a,b] [--size 1280x720] [--output report.json]
+
+    i.e. compare the Resnet101 model against its 8-bit version on 500 images:
+    python -m profiling.classifier_report coco_val.record \
+        --classifiers faster_rcnn_resnet101_coco_2017_11_08,faster_rcnn_resnet101_coco_2017_11_08_quantized --max-images 500
+
+- Held-out set:
+    A TFRecord file of tf.Example protos in the format used by the Object Detection API
+    (see object_detection/dataset_tools/create_*_tf_record.py), where the class labels match
+    the label map of the given dataset (mscoco, kitti).
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import argparse
+import contextlib
+import json
+import os, sys
+import time
+import cv2
+import numpy as np
+
+import profiling.replay_benchmark as replay_benchmark
+import object_classifier.graph_utils as graph_utils
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+DEFAULT_CLASSIFIERS = (
+    replay_benchmark.DEFAULT_CLASSIFIER,
+    graph_utils.quantized_codename(replay_benchmark.DEFAULT_CLASSIFIER),
+)
+
+DEFAULT_DATASET = replay_benchmark.DEFAULT_DATASET
+
+# min overlap (IOU) between a detected box and a ground truth box to be counted as a true positive
+MATCHING_IOU_THRESHOLD = .5
+# ---------------------------------------------------------------------------- #
+
+
+def import_evaluation_modules():
+    """
+    Import the evaluation modules of the Object Detection API.
+    Note: they import each other as (object_detection.*), so the object_classifier folder needs to be on the path.
+    """
+    object_classifier_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'object_classifier')
+    if object_classifier_path not in sys.path:
+        sys.path.append(object_classifier_path)
+
+    from object_detection.core import standard_fields
+    from object_detection.utils import object_detection_evaluation
+
+    return standard_fields, object_detection_evaluation
+
+
+def read_examples(record_path, max_images = None):
+    """
+    Yield (image_id, RGB image, ground truth boxes, ground truth classes, difficult flags)
+    for each tf.Example in the given TFRecord file.
+    The boxes are returned in normalized coordinates [ymin, xmin, ymax, xmax].
+    """
+    import tensorflow as tf
+    standard_fields, _ = import_evaluation_modules()
+    fields = standard_fields.TfExampleFields
+
+    for (index, record) in enumerate(tf.python_io.tf_record_iterator(record_path)):
+        if max_images is not None and index >= max_images:
+            break
+
+        feature = tf.train.Example.FromString(record).features.feature
+
+        def values(key, kind):
+            if key not in feature:
+                return []
+            return getattr(feature[key], kind).value
+
+        encoded_image = values(fields.image_encoded, 'bytes_list')[0]
+        image = cv2.imdecode(np.frombuffer(encoded_image, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+        # the models were trained on RGB images
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+        boxes = np.transpose(np.array([
+            values(fields.object_bbox_ymin, 'float_list'),
+            values(fields.object_bbox_xmin, 'float_list'),
+            values(fields.object_bbox_ymax, 'float_list'),
+            values(fields.object_bbox_xmax, 'float_list'),
+        ], dtype=np.float32)).reshape(-1, 4)
+
+        classes = np.array(values(fields.object_class_label, 'int64_list'), dtype=np.int32)
+
+        difficult = np.array(values(fields.object_difficult, 'int64_list'), dtype=bool)
+        if difficult.size != classes.size:
+            difficult = np.zeros(classes.size, dtype=bool)
+
+        source_id = values(fields.source_id, 'bytes_list')
+        image_id = source_id[0].decode('utf-8') if source_id else str(index)
+
+        yield image_id, image, boxes, classes, difficult
+
+
+def evaluate_classifier(record_path, classifier_codename,
+    dataset_codename = DEFAULT_DATASET,
+    frame_size = None,
+    max_images = None,
+    matching_iou_threshold = MATCHING_IOU_THRESHOLD):
+    """
+    Run a given model over the held-out set and return a dictionary of its accuracy and speed.
+
+    - frame_size: (width, height) that every image gets resized to before running the model,
+        which allows the optimized graph for that size to be used (see graph_utils.py).
+        By default, each image is used at its original size (and the original graph gets loaded).
+    """
+    from object_classifier.ObjectClassifier import ObjectClassifier
+    standard_fields, object_detection_evaluation = import_evaluation_modules()
+
+    frame_width, frame_height = frame_size if frame_size else (0, 0)
+
+    object_detector = ObjectClassifier(
+        classifier_codename = classifier_codename,
+        dataset_codename = dataset_codename,
+        frame_height = frame_height,
+        frame_width = frame_width,
+        use_optimized_graph = frame_size is not None)
+
+    timer = time.perf_counter()
+    object_detector.setup()
+    setup_time = time.perf_counter() - timer
+
+    evaluator = object_detection_evaluation.ObjectDetectionEvaluator(
+        list(object_detector.categories_dict.values()),
+        matching_iou_threshold = matching_iou_threshold,
+        evaluate_corlocs = True)
+
+    durations = []
+
+    for (image_id, image, boxes, classes, difficult) in read_examples(record_path, max_images):
+        if frame_size:
+            image = cv2.resize(image, frame_size)
+
+        evaluator.add_single_ground_truth_image_info(image_id, {
+            standard_fields.InputDataFields.groundtruth_boxes: boxes,
+            standard_fields.InputDataFields.groundtruth_classes: classes,
+            standard_fields.InputDataFields.groundtruth_difficult: difficult,
+        })
+
+        timer = time.perf_counter()
+        object_detector.scan_road(image, {})
+        durations.append(time.perf_counter() - timer)
+
+        num_detections = int(object_detector.num_detections[0])
+        evaluator.add_single_detected_image_info(image_id, {
+            standard_fields.DetectionResultFields.detection_boxes:
+                object_detector.detection_boxes[0][:num_detections],
+            standard_fields.DetectionResultFields.detection_scores:
+                object_detector.detection_scores[0][:num_detections],
+            standard_fields.DetectionResultFields.detection_classes:
+                object_detector.detection_classes[0][:num_detections].astype(np.int32),
+        })
+
+    if not durations:
+        raise ValueError('No images were found in: ' + record_path)
+
+    metrics = evaluator.evaluate()
+
+    # the first frame includes the lazy allocations of the session, so it's excluded from the frame rate
+    measured = durations[1:] or durations
+
+    return {
+        'classifier_codename': classifier_codename,
+        'images': len(durations),
+        'mAP': float(metrics['Precision/mAP@{}IOU'.format(matching_iou_threshold)]),
+        'CorLoc': float(metrics['Precision/meanCorLoc@{}IOU'.format(matching_iou_threshold)]),
+        'frames_per_second': len(measured) / sum(measured),
+        'latency': replay_benchmark.summarize_durations(measured),
+        'setup_seconds': setup_time,
+        'model_size_mb': os.path.getsize(object_detector.PATH_TO_CKPT) / 1024.0 ** 2,
+        'per_category': {name: float(value) for name, value in metrics.items() if name.startswith('PerformanceByCategory')},
+    }
+
+
+def run_report(record_path,
+    classifier_codenames = DEFAULT_CLASSIFIERS,
+    dataset_codename = DEFAULT_DATASET,
+    frame_size = None,
+    max_images = None,
+    matching_iou_threshold = MATCHING_IOU_THRESHOLD):
+    """
+    Evaluate each of the given models on the same held-out set, and return a dictionary of results.
+    """
+    return {
+        'config': {
+            'record_path': os.path.abspath(record_path),
+            'dataset_codename': dataset_codename,
+            'frame_size': list(frame_size) if frame_size else None,
+            'max_images': max_images,
+            'matching_iou_threshold': matching_iou_threshold,
+        },
+        'environment': {
+            'git_revision': replay_benchmark.git_revision(),
+            'cpu_count': os.cpu_count(),
+        },
+        'classifiers': [
+            evaluate_classifier(record_path, classifier_codename,
+                dataset_codename = dataset_codename,
+                frame_size = frame_size,
+                max_images = max_images,
+                matching_iou_threshold = matching_iou_threshold)
+            for classifier_codename in classifier_codenames
+        ],
+    }
+
+
+def print_report(results, output_file = sys.stdout):
+    iou = results['config']['matching_iou_threshold']
+
+    header = '{:<56}{:>10}{:>12}{:>12}{:>12}{:>12}'.format(
+        'classifier', 'mAP@{}'.format(iou), 'CorLoc@{}'.format(iou), 'frames/sec', 'p90 (ms)', 'size (MB)')
+
+    print(header, file=output_file)
+    print('-' * len(header), file=output_file)
+
+    for result in results['classifiers']:
+        print('{:<56}{:>10.3f}{:>12.3f}{:>12.2f}{:>12.1f}{:>12.1f}'.format(
+            result['classifier_codename'],
+            result['mAP'],
+            result['CorLoc'],
+            result['frames_per_second'],
+            result['latency']['p90_ms'],
+            result['model_size_mb']), file=output_file)
+
+
+def parse_size(value):
+    return tuple(int(size) for size in value.split('x'))
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        description='Compare the accuracy (mAP, CorLoc) and speed (frames/sec) of pre-trained models on a held-out set.')
+    parser.add_argument('record_path', help='path to a TFRecord file of annotated tf.Example protos')
+    parser.add_argument('--classifiers', type=lambda value: value.split(','), default=DEFAULT_CLASSIFIERS,
+        help='comma-separated list of codenames of the models to be compared')
+    parser.add_argument('--dataset', default=DEFAULT_DATASET, help='codename of the dataset (mscoco, kitti)')
+    parser.add_argument('--size', type=parse_size, default=None,
+        help='WIDTHxHEIGHT that every image gets resized to (original size by default)')
+    parser.add_argument('--max-images', type=int, default=None, help='max number of images to be evaluated')
+    parser.add_argument('--iou', type=float, default=MATCHING_IOU_THRESHOLD, help='matching IOU threshold')
+    parser.add_argument('--output', default=None, help='path of the output JSON file')
+    args = parser.parse_args(argv)
+
+    # keep stdout clean for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run_report(args.record_path,
+            classifier_codenames = args.classifiers,
+            dataset_codename = args.dataset,
+            frame_size = args.size,
+            max_images = args.max_images,
+            matching_iou_threshold = args.iou)
+
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
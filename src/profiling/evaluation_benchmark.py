@@ -0,0 +1,625 @@
+# coding: utf-8
+"""
+A micro-benchmark suite for the box operations used to evaluate the ObjectClassifier
+(np_box_list_ops.py of the Tensorflow Object Detection API, see classifier_report.py).
+
+It generates synthetic detections (clusters of overlapping boxes with random scores, like the raw output
+of a detector before non maximum suppression) for several numbers of boxes, then it times:
+    - np_box_list_ops.non_max_suppression, against the original box-by-box implementation (reference)
+    - np_box_list_ops.multi_class_non_max_suppression (90 classes, like mscoco),
+        against the original implementation that runs non_max_suppression for each class (reference)
+    - np_box_ops.max_iou (the best matching box of each detection, as used by per_image_evaluation.py),
+        against the max/argmax of the full IOU matrix computed by the original np_box_ops.iou (reference)
+    - per_image_evaluation.PerImageEvaluation.compute_object_detection_metrics (90 classes, like mscoco),
+        against the original implementation that filters the boxes of every class and matches them one at a time (reference)
+    - metrics.compute_average_precision (over 100 scored detections per box, i.e. 1M for 10000 boxes),
+        against the original implementation that builds the precision envelope one element at a time (reference)
+    - object_detection_evaluation.ObjectDetectionEvaluation in streaming mode (100 images, merged from 4 shards),
+        against the default evaluation that keeps the groundtruth of every image (reference)
+
+It also checks that both implementations select the same boxes, so that any speed-up could be verified
+without changing the results of the evaluation, and it measures the peak memory allocated by numpy (tracemalloc).
+
+- Usage (run from the src folder):
+    python -m profiling.evaluation_benchmark [--sizes 100,1000,10000] [--repeats 5] [--output evaluation.json]
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import argparse
+import json
+import os, sys
+import time
+import tracemalloc
+import numpy as np
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+DEFAULT_SIZES = (100, 300, 1000, 3000, 10000)
+
+# number of boxes around each object
+CLUSTER_SIZE = 10
+
+IOU_THRESHOLD = .5
+
+NUM_CLASSES = 90
+SCORE_THRESHOLD = .1
+
+# number of scored detections per box, for the average precision (a full-dataset evaluation)
+DETECTIONS_PER_BOX = 100
+
+# number of images (e.g. frames of a drive) of the streaming evaluation, and number of shards it is split in
+NUM_IMAGES = 100
+NUM_SHARDS = 4
+# ---------------------------------------------------------------------------- #
+
+
+def add_object_classifier_path():
+    """
+    The utils of the Object Detection API import each other as (object_detection.*),
+    so the object_classifier folder needs to be on the path.
+    """
+    object_classifier_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'object_classifier')
+    if object_classifier_path not in sys.path:
+        sys.path.append(object_classifier_path)
+
+
+def import_box_modules():
+    """
+    Import the box operations of the Object Detection API.
+    """
+    add_object_classifier_path()
+
+    from object_detection.utils import np_box_list, np_box_list_ops, np_box_ops
+
+    return np_box_list, np_box_list_ops, np_box_ops
+
+
+def import_metrics_module():
+    """
+    Import the metrics of the Object Detection API.
+    """
+    add_object_classifier_path()
+
+    from object_detection.utils import metrics
+
+    return metrics
+
+
+def import_object_detection_evaluation_module():
+    """
+    Import the object detection evaluation of the Object Detection API.
+    """
+    add_object_classifier_path()
+
+    from object_detection.utils import object_detection_evaluation
+
+    return object_detection_evaluation
+
+
+def import_per_image_evaluation_module():
+    """
+    Import the per image evaluation of the Object Detection API.
+    """
+    add_object_classifier_path()
+
+    from object_detection.utils import per_image_evaluation
+
+    return per_image_evaluation
+
+
+def synthetic_detections(num_boxes, seed = 0):
+    """
+    Return (boxes, scores) of (num_boxes) boxes, jittered around (num_boxes / CLUSTER_SIZE) objects
+    scattered over a 1000x1000 image.
+    """
+    random = np.random.RandomState(seed)
+
+    num_objects = max(num_boxes // CLUSTER_SIZE, 1)
+    centers = random.uniform(0, 1000, size=(num_objects, 2))
+    sizes = random.uniform(20, 200, size=(num_objects, 2))
+
+    objects = random.randint(num_objects, size=num_boxes)
+    jitter = random.normal(scale=0.1, size=(num_boxes, 4)) * np.tile(sizes[objects], 2)
+
+    boxes = np.hstack([centers[objects] - sizes[objects] / 2, centers[objects] + sizes[objects] / 2]) + jitter
+    boxes = np.hstack([np.minimum(boxes[:, :2], boxes[:, 2:]), np.maximum(boxes[:, :2], boxes[:, 2:])])
+
+    return boxes, random.uniform(size=num_boxes)
+
+
+def reference_non_max_suppression(np_box_ops, boxes, max_output_size, iou_threshold):
+    """
+    The original implementation of np_box_list_ops.non_max_suppression (over boxes sorted by decreasing score):
+    compute the IOU of each selected box against all the remaining boxes, one box at a time.
+    """
+    num_boxes = boxes.shape[0]
+    is_index_valid = np.full(num_boxes, 1, dtype=bool)
+    selected_indices = []
+
+    for i in range(num_boxes):
+        if len(selected_indices) >= max_output_size:
+            break
+        if not is_index_valid[i]:
+            continue
+
+        selected_indices.append(i)
+        is_index_valid[i] = False
+        valid_indices = np.where(is_index_valid)[0]
+        if valid_indices.size == 0:
+            break
+
+        intersect_over_union = np.squeeze(np_box_ops.iou(
+            np.expand_dims(boxes[i, :], axis=0), boxes[valid_indices, :]), axis=0)
+        is_index_valid[valid_indices] = np.logical_and(
+            is_index_valid[valid_indices], intersect_over_union <= iou_threshold)
+
+    return np.array(selected_indices, dtype=np.int_)
+
+
+def reference_multi_class_non_max_suppression(np_box_list, np_box_list_ops, boxlist, score_thresh, iou_thresh,
+    max_output_size):
+    """
+    The original implementation of np_box_list_ops.multi_class_non_max_suppression:
+    run non_max_suppression for each class (even the ones without any box above the threshold).
+    """
+    scores = boxlist.get_field('scores')
+    selected_boxes_list = []
+
+    for class_idx in range(scores.shape[1]):
+        boxlist_and_class_scores = np_box_list.BoxList(boxlist.get())
+        boxlist_and_class_scores.add_field('scores', scores[:, class_idx])
+        boxlist_filt = np_box_list_ops.filter_scores_greater_than(boxlist_and_class_scores, score_thresh)
+        nms_result = np_box_list_ops.non_max_suppression(boxlist_filt,
+            max_output_size = max_output_size,
+            iou_threshold = iou_thresh,
+            score_threshold = score_thresh)
+        nms_result.add_field('classes', np.zeros_like(nms_result.get_field('scores')) + class_idx)
+        selected_boxes_list.append(nms_result)
+
+    selected_boxes = np_box_list_ops.concatenate(selected_boxes_list)
+
+    return np_box_list_ops.sort_by_field(selected_boxes, 'scores')
+
+
+def reference_iou(boxes1, boxes2):
+    """
+    The original implementation of np_box_ops.iou, that holds several [N, M] temporary arrays.
+    """
+    [y_min1, x_min1, y_max1, x_max1] = np.split(boxes1, 4, axis=1)
+    [y_min2, x_min2, y_max2, x_max2] = np.split(boxes2, 4, axis=1)
+
+    all_pairs_min_ymax = np.minimum(y_max1, np.transpose(y_max2))
+    all_pairs_max_ymin = np.maximum(y_min1, np.transpose(y_min2))
+    intersect_heights = np.maximum(np.zeros(all_pairs_max_ymin.shape), all_pairs_min_ymax - all_pairs_max_ymin)
+    all_pairs_min_xmax = np.minimum(x_max1, np.transpose(x_max2))
+    all_pairs_max_xmin = np.maximum(x_min1, np.transpose(x_min2))
+    intersect_widths = np.maximum(np.zeros(all_pairs_max_xmin.shape), all_pairs_min_xmax - all_pairs_max_xmin)
+    intersect = intersect_heights * intersect_widths
+
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+    union = np.expand_dims(area1, axis=1) + np.expand_dims(area2, axis=0) - intersect
+
+    return intersect / union
+
+
+def reference_tp_fp_for_single_class(per_image_eval, detected_boxes, detected_scores, groundtruth_boxes,
+    groundtruth_is_difficult_list, groundtruth_is_group_of_list):
+    """
+    The original implementation of PerImageEvaluation._compute_tp_fp_for_single_class:
+    match the detections to the groundtruth boxes one detection at a time.
+    """
+    np_box_list, np_box_list_ops, _ = import_box_modules()
+
+    if detected_boxes.size == 0:
+        return np.array([], dtype=float), np.array([], dtype=bool)
+
+    detected_boxlist = np_box_list.BoxList(detected_boxes, validate=False)
+    detected_boxlist.add_field('scores', detected_scores)
+    detected_boxlist = np_box_list_ops.non_max_suppression(detected_boxlist,
+        per_image_eval.nms_max_output_boxes, per_image_eval.nms_iou_threshold)
+    scores = detected_boxlist.get_field('scores')
+
+    if groundtruth_boxes.size == 0:
+        return scores, np.zeros(detected_boxlist.num_boxes(), dtype=bool)
+
+    tp_fp_labels = np.zeros(detected_boxlist.num_boxes(), dtype=bool)
+    is_matched_to_difficult_box = np.zeros(detected_boxlist.num_boxes(), dtype=bool)
+    is_matched_to_group_of_box = np.zeros(detected_boxlist.num_boxes(), dtype=bool)
+
+    gt_non_group_of_boxlist = np_box_list.BoxList(groundtruth_boxes[~groundtruth_is_group_of_list, :])
+    if gt_non_group_of_boxlist.num_boxes() > 0:
+        is_difficult = groundtruth_is_difficult_list[~groundtruth_is_group_of_list]
+        max_overlap_ious, max_overlap_gt_ids = np_box_list_ops.max_iou(detected_boxlist, gt_non_group_of_boxlist)
+        is_gt_box_detected = np.zeros(gt_non_group_of_boxlist.num_boxes(), dtype=bool)
+
+        for i in range(detected_boxlist.num_boxes()):
+            gt_id = max_overlap_gt_ids[i]
+            if max_overlap_ious[i] >= per_image_eval.matching_iou_threshold:
+                if not is_difficult[gt_id]:
+                    if not is_gt_box_detected[gt_id]:
+                        tp_fp_labels[i] = True
+                        is_gt_box_detected[gt_id] = True
+                else:
+                    is_matched_to_difficult_box[i] = True
+
+    gt_group_of_boxlist = np_box_list.BoxList(groundtruth_boxes[groundtruth_is_group_of_list, :])
+    if gt_group_of_boxlist.num_boxes() > 0:
+        max_overlap_group_of_gt, _ = np_box_list_ops.max_ioa(gt_group_of_boxlist, detected_boxlist)
+
+        for i in range(detected_boxlist.num_boxes()):
+            if (not tp_fp_labels[i] and not is_matched_to_difficult_box[i] and
+                max_overlap_group_of_gt[i] >= per_image_eval.matching_iou_threshold):
+                is_matched_to_group_of_box[i] = True
+
+    is_evaluated = ~is_matched_to_difficult_box & ~is_matched_to_group_of_box
+
+    return scores[is_evaluated], tp_fp_labels[is_evaluated]
+
+
+def reference_per_image_evaluation(per_image_eval, detected_boxes, detected_scores, detected_class_labels,
+    groundtruth_boxes, groundtruth_class_labels, groundtruth_is_difficult_list, groundtruth_is_group_of_list):
+    """
+    The original implementation of PerImageEvaluation.compute_object_detection_metrics:
+    filter the detections and the groundtruth boxes of every class (even the ones without any box).
+    """
+    np_box_list, np_box_list_ops, _ = import_box_modules()
+
+    detected_boxes, detected_scores, detected_class_labels = per_image_eval._remove_invalid_boxes(
+        detected_boxes, detected_scores, detected_class_labels)
+
+    scores, tp_fp_labels = [], []
+    is_class_correctly_detected_in_image = np.zeros(per_image_eval.num_groundtruth_classes, dtype=int)
+
+    for i in range(per_image_eval.num_groundtruth_classes):
+        is_detected, is_groundtruth = (detected_class_labels == i), (groundtruth_class_labels == i)
+
+        class_scores, class_tp_fp_labels = reference_tp_fp_for_single_class(per_image_eval,
+            detected_boxes[is_detected, :], detected_scores[is_detected], groundtruth_boxes[is_groundtruth, :],
+            groundtruth_is_difficult_list[is_groundtruth], groundtruth_is_group_of_list[is_groundtruth])
+        scores.append(class_scores)
+        tp_fp_labels.append(class_tp_fp_labels)
+
+        if np.any(is_detected) and np.any(is_groundtruth):
+            max_score_id = np.argmax(detected_scores[is_detected])
+            detected_boxlist = np_box_list.BoxList(detected_boxes[is_detected, :][max_score_id:max_score_id + 1, :])
+            gt_boxlist = np_box_list.BoxList(groundtruth_boxes[is_groundtruth, :])
+            is_class_correctly_detected_in_image[i] = int(
+                np.max(np_box_list_ops.iou(detected_boxlist, gt_boxlist)) >= per_image_eval.matching_iou_threshold)
+
+    return scores, tp_fp_labels, is_class_correctly_detected_in_image
+
+
+def reference_average_precision(precision, recall):
+    """
+    The original implementation of metrics.compute_average_precision (without the checks of the input ranges):
+    check the recall and build the precision envelope one element at a time.
+    """
+    if not all(recall[i] <= recall[i + 1] for i in range(len(recall) - 1)):
+        raise ValueError('recall must be a non-decreasing array')
+
+    recall = np.concatenate([[0], recall, [1]])
+    precision = np.concatenate([[0], precision, [0]])
+
+    for i in range(len(precision) - 2, -1, -1):
+        precision[i] = np.maximum(precision[i], precision[i + 1])
+
+    indices = np.where(recall[1:] != recall[:-1])[0] + 1
+
+    return np.sum((recall[indices] - recall[indices - 1]) * precision[indices])
+
+
+def peak_memory(function):
+    """
+    Return the peak memory (in MB) allocated while running the given function.
+    """
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 2.0 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def time_function(function, repeats):
+    """
+    Call the given function (repeats) times and return the latency statistics in milliseconds.
+    """
+    durations = []
+
+    for _ in range(repeats):
+        timer = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - timer)
+
+    durations = np.asarray(durations) * 1000.0
+
+    return {
+        'mean_ms': float(np.mean(durations)),
+        'median_ms': float(np.median(durations)),
+        'min_ms': float(np.min(durations)),
+    }
+
+
+def benchmark_nms(num_boxes, repeats):
+    """
+    Time np_box_list_ops.non_max_suppression against the reference implementation.
+    """
+    np_box_list, np_box_list_ops, np_box_ops = import_box_modules()
+
+    boxes, scores = synthetic_detections(num_boxes)
+    boxlist = np_box_list.BoxList(boxes)
+    boxlist.add_field('scores', scores)
+
+    sorted_boxes = np_box_list_ops.sort_by_field(boxlist, 'scores').get()
+
+    selected_boxes = np_box_list_ops.non_max_suppression(boxlist, num_boxes, IOU_THRESHOLD).get()
+    reference_indices = reference_non_max_suppression(np_box_ops, sorted_boxes, num_boxes, IOU_THRESHOLD)
+
+    timings = {
+        'non_max_suppression': time_function(
+            lambda: np_box_list_ops.non_max_suppression(boxlist, num_boxes, IOU_THRESHOLD), repeats),
+
+        'reference': time_function(
+            lambda: reference_non_max_suppression(np_box_ops, sorted_boxes, num_boxes, IOU_THRESHOLD), repeats),
+    }
+
+    return {
+        'timings': timings,
+        'selected_boxes': int(selected_boxes.shape[0]),
+        'speedup': timings['reference']['median_ms'] / timings['non_max_suppression']['median_ms'],
+        'passed': bool(np.array_equal(selected_boxes, sorted_boxes[reference_indices])),
+    }
+
+
+def benchmark_multi_class_nms(num_boxes, repeats):
+    """
+    Time np_box_list_ops.multi_class_non_max_suppression against the reference implementation.
+    """
+    np_box_list, np_box_list_ops, _ = import_box_modules()
+
+    boxes, _ = synthetic_detections(num_boxes)
+
+    # a few classes per box above the threshold, most classes without any box at all
+    random = np.random.RandomState(0)
+    scores = random.uniform(size=(num_boxes, NUM_CLASSES)) ** 8
+    scores[:, random.permutation(NUM_CLASSES)[:NUM_CLASSES // 2]] = 0.0
+
+    boxlist = np_box_list.BoxList(boxes)
+    boxlist.add_field('scores', scores)
+    arguments = (boxlist, SCORE_THRESHOLD, IOU_THRESHOLD, num_boxes)
+
+    selected = np_box_list_ops.multi_class_non_max_suppression(*arguments)
+    reference = reference_multi_class_non_max_suppression(np_box_list, np_box_list_ops, *arguments)
+
+    timings = {
+        'multi_class_non_max_suppression': time_function(
+            lambda: np_box_list_ops.multi_class_non_max_suppression(*arguments), repeats),
+
+        'reference': time_function(
+            lambda: reference_multi_class_non_max_suppression(np_box_list, np_box_list_ops, *arguments), repeats),
+    }
+
+    return {
+        'timings': timings,
+        'selected_boxes': selected.num_boxes(),
+        'speedup': timings['reference']['median_ms'] / timings['multi_class_non_max_suppression']['median_ms'],
+        'passed': all(np.array_equal(selected.get_field(field), reference.get_field(field))
+            for field in ('boxes', 'scores', 'classes')),
+    }
+
+
+def benchmark_max_iou(num_boxes, repeats):
+    """
+    Time np_box_ops.max_iou between (num_boxes) detections and one ground truth box per object
+    against the max/argmax of the full IOU matrix.
+    """
+    _, _, np_box_ops = import_box_modules()
+
+    detected_boxes, _ = synthetic_detections(num_boxes, seed = 0)
+    groundtruth_boxes, _ = synthetic_detections(max(num_boxes // CLUSTER_SIZE, 1), seed = 1)
+
+    def reference():
+        intersect_over_union = reference_iou(detected_boxes, groundtruth_boxes)
+        max_iou_ids = np.argmax(intersect_over_union, axis=1)
+        return intersect_over_union[np.arange(num_boxes), max_iou_ids], max_iou_ids
+
+    max_ious, max_iou_ids = np_box_ops.max_iou(detected_boxes, groundtruth_boxes)
+    reference_max_ious, reference_max_iou_ids = reference()
+
+    timings = {
+        'max_iou': time_function(lambda: np_box_ops.max_iou(detected_boxes, groundtruth_boxes), repeats),
+        'reference': time_function(reference, repeats),
+    }
+
+    return {
+        'timings': timings,
+        'peak_memory_mb': peak_memory(lambda: np_box_ops.max_iou(detected_boxes, groundtruth_boxes)),
+        'reference_peak_memory_mb': peak_memory(reference),
+        'speedup': timings['reference']['median_ms'] / timings['max_iou']['median_ms'],
+        'passed': bool(np.array_equal(max_ious, reference_max_ious) and
+            np.array_equal(max_iou_ids, reference_max_iou_ids)),
+    }
+
+
+def benchmark_per_image_evaluation(num_boxes, repeats):
+    """
+    Time PerImageEvaluation.compute_object_detection_metrics on an image with (num_boxes) detections
+    (of 20 of the 90 classes) and one groundtruth box per object (of 5 of those classes)
+    against the reference implementation.
+    """
+    per_image_evaluation = import_per_image_evaluation_module()
+    per_image_eval = per_image_evaluation.PerImageEvaluation(NUM_CLASSES, IOU_THRESHOLD, 1.0, num_boxes)
+
+    random = np.random.RandomState(0)
+    # the detections are spread over a few classes, the groundtruth boxes over fewer of them
+    detected_classes = random.permutation(NUM_CLASSES)[:20]
+    groundtruth_classes = detected_classes[:5]
+
+    detected_boxes, detected_scores = synthetic_detections(num_boxes, seed = 0)
+    groundtruth_boxes, _ = synthetic_detections(max(num_boxes // CLUSTER_SIZE, 1), seed = 1)
+    num_groundtruth_boxes = groundtruth_boxes.shape[0]
+
+    arguments = (detected_boxes, detected_scores, random.choice(detected_classes, size=num_boxes),
+        groundtruth_boxes, random.choice(groundtruth_classes, size=num_groundtruth_boxes),
+        random.uniform(size=num_groundtruth_boxes) < 0.1, random.uniform(size=num_groundtruth_boxes) < 0.1)
+
+    scores, tp_fp_labels, is_class_correctly_detected_in_image = (
+        per_image_eval.compute_object_detection_metrics(*arguments))
+    reference_scores, reference_tp_fp_labels, reference_is_class_correctly_detected_in_image = (
+        reference_per_image_evaluation(per_image_eval, *arguments))
+
+    timings = {
+        'compute_object_detection_metrics': time_function(
+            lambda: per_image_eval.compute_object_detection_metrics(*arguments), repeats),
+
+        'reference': time_function(lambda: reference_per_image_evaluation(per_image_eval, *arguments), repeats),
+    }
+
+    return {
+        'timings': timings,
+        'speedup': timings['reference']['median_ms'] / timings['compute_object_detection_metrics']['median_ms'],
+        'passed': bool(all(np.array_equal(array, reference_array) for (array, reference_array) in
+            zip(scores + tp_fp_labels, reference_scores + reference_tp_fp_labels)) and
+            np.array_equal(is_class_correctly_detected_in_image, reference_is_class_correctly_detected_in_image)),
+    }
+
+
+def benchmark_average_precision(num_boxes, repeats):
+    """
+    Time metrics.compute_average_precision over (num_boxes * DETECTIONS_PER_BOX) scored detections
+    against the reference implementation.
+    """
+    metrics = import_metrics_module()
+
+    num_detections = num_boxes * DETECTIONS_PER_BOX
+    random = np.random.RandomState(0)
+    scores = random.uniform(size=num_detections)
+    # higher scores are more likely to be true positives
+    tp_fp_labels = random.uniform(size=num_detections) < scores
+    precision, recall = metrics.compute_precision_recall(scores, tp_fp_labels, int(np.sum(tp_fp_labels)) * 2)
+
+    average_precision = metrics.compute_average_precision(precision, recall)
+    reference_average_precision_value = reference_average_precision(precision, recall)
+
+    timings = {
+        'compute_average_precision': time_function(
+            lambda: metrics.compute_average_precision(precision, recall), repeats),
+
+        'reference': time_function(lambda: reference_average_precision(precision, recall), repeats),
+    }
+
+    return {
+        'timings': timings,
+        'detections': num_detections,
+        'speedup': timings['reference']['median_ms'] / timings['compute_average_precision']['median_ms'],
+        'passed': bool(average_precision == reference_average_precision_value),
+    }
+
+
+def benchmark_streaming_evaluation(num_boxes, repeats):
+    """
+    Evaluate NUM_IMAGES images with (num_boxes / 10) detections and one groundtruth box per object each,
+    with a streaming ObjectDetectionEvaluation split in NUM_SHARDS merged shards,
+    against the default evaluation (reference), which keeps the groundtruth of every image.
+    """
+    object_detection_evaluation = import_object_detection_evaluation_module()
+
+    random = np.random.RandomState(0)
+    num_detections = max(num_boxes // CLUSTER_SIZE, 1)
+    images = []
+    for image_id in range(NUM_IMAGES):
+        detected_boxes, detected_scores = synthetic_detections(num_detections, seed = 2 * image_id)
+        groundtruth_boxes, _ = synthetic_detections(max(num_detections // CLUSTER_SIZE, 1), seed = 2 * image_id + 1)
+        images.append((image_id, detected_boxes, detected_scores, random.randint(NUM_CLASSES, size=num_detections),
+            groundtruth_boxes, random.randint(NUM_CLASSES, size=groundtruth_boxes.shape[0])))
+
+    def evaluate(images, streaming):
+        evaluation = object_detection_evaluation.ObjectDetectionEvaluation(NUM_CLASSES, streaming = streaming)
+        for (image_id, detected_boxes, detected_scores, detected_class_labels,
+                groundtruth_boxes, groundtruth_class_labels) in images:
+            evaluation.add_single_ground_truth_image_info(image_id, groundtruth_boxes, groundtruth_class_labels)
+            evaluation.add_single_detected_image_info(image_id, detected_boxes, detected_scores, detected_class_labels)
+        return evaluation
+
+    def streaming():
+        evaluation = evaluate(images[::NUM_SHARDS], streaming = True)
+        for shard in range(1, NUM_SHARDS):
+            evaluation.merge(evaluate(images[shard::NUM_SHARDS], streaming = True))
+        return evaluation
+
+    average_precisions = streaming().evaluate().average_precisions
+    reference_average_precisions = evaluate(images, streaming = False).evaluate().average_precisions
+
+    timings = {
+        'streaming': time_function(streaming, repeats),
+        'reference': time_function(lambda: evaluate(images, streaming = False), repeats),
+    }
+
+    return {
+        'timings': timings,
+        'peak_memory_mb': peak_memory(streaming),
+        'reference_peak_memory_mb': peak_memory(lambda: evaluate(images, streaming = False)),
+        'speedup': timings['reference']['median_ms'] / timings['streaming']['median_ms'],
+        'passed': bool(np.allclose(average_precisions, reference_average_precisions, equal_nan = True)),
+    }
+
+
+def run_benchmark(sizes = DEFAULT_SIZES, repeats = 5):
+    results = {}
+
+    for num_boxes in sizes:
+        results['{} boxes'.format(num_boxes)] = {
+            'nms': benchmark_nms(num_boxes, repeats),
+            'multi_class_nms': benchmark_multi_class_nms(num_boxes, repeats),
+            'max_iou': benchmark_max_iou(num_boxes, repeats),
+            'per_image_evaluation': benchmark_per_image_evaluation(num_boxes, repeats),
+            'average_precision': benchmark_average_precision(num_boxes, repeats),
+            'streaming_evaluation': benchmark_streaming_evaluation(num_boxes, repeats),
+        }
+
+    return results
+
+
+def print_report(results):
+    for size, result in results.items():
+        print('\n' + size)
+        print('-' * 60)
+
+        for (operation, benchmark) in result.items():
+            print('{:<28}{:<6}{:>10.2f} ms (median){:>10.2f} ms (reference){:>8.1f}x'.format(
+                operation,
+                'PASS' if benchmark['passed'] else 'FAIL',
+                benchmark['timings'][list(benchmark['timings'])[0]]['median_ms'],
+                benchmark['timings']['reference']['median_ms'],
+                benchmark['speedup']))
+
+            if 'peak_memory_mb' in benchmark:
+                print('{:<34}{:>10.1f} MB (peak){:>12.1f} MB (reference)'.format(
+                    '', benchmark['peak_memory_mb'], benchmark['reference_peak_memory_mb']))
+
+
+def parse_sizes(value):
+    return tuple(int(size) for size in value.split(',') if size.strip())
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Benchmark the box operations used to evaluate the object detector.')
+    parser.add_argument('--sizes', type=parse_sizes, default=DEFAULT_SIZES,
+        help='comma-separated numbers of boxes (i.e. 100,1000,10000)')
+    parser.add_argument('--repeats', type=int, default=5, help='number of times each operation is timed')
+    parser.add_argument('--output', default=None, help='path of the output JSON file')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.sizes, args.repeats)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
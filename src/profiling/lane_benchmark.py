@@ -0,0 +1,338 @@
+# coding: utf-8
+"""
+A micro-benchmark suite for the lane_detector package.
+
+It generates synthetic road frames with known lane polynomials at several resolutions, then it times
+each stage of the lane detection pipeline on its own as well as end to end:
+    - calibration_utils.set_distortion_coefficients (undistort)
+    - graphic_utils.convert_to_bitmap
+    - graphic_utils.convert_to_birdseye_view
+    - Lane.detect_pixles
+    - Lane.highlight
+    - LaneDetector.threat_classifier
+    - LaneDetector.detect_lane (end to end)
+
+It also runs LaneDetector.detect_lane (end to end) over each scenario and checks the detected lanes against
+the ground truth (the error in pixels between the fitted and the known polynomials, and whether the detected
+lane position matches the expected one), so that speed-ups could be verified without changing the quality of the detection.
+
+- Usage (run from the src folder):
+    python -m profiling.lane_benchmark [--resolutions 1280x720,1920x1080] [--repeats 20] [--output lane.json]
+
+- Synthetic frames:
+    Both lane dividers are drawn as curves (x = f(y)) onto a flat gray road in the bird's eye view,
+    then the road is warped back into the camera's perspective using the same transformation used by the detector,
+    and distorted with the calibration model of the camera (the inverse of calibration_utils.set_distortion_coefficients).
+
+Note: the calibration model is the one of the 1280x720 camera in lane_detector/camera_cal, and the detector
+undistorts frames of any size with it, so the end to end check fails at lower resolutions (i.e. 640x480),
+which are left out of the default resolutions. The benchmark exits with status 1 if any scenario fails.
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import argparse
+import json
+import sys
+import time
+import cv2
+import numpy as np
+
+import lane_detector.calibration_utils as calibrator
+import lane_detector.graphic_utils as transformer
+import lane_detector.visualization_utils as visualizer
+from lane_detector.LaneDetector import LaneDetector
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+# Note: 640x480 is left out, since the detector fails at lower resolutions (see the note above)
+DEFAULT_RESOLUTIONS = ((1280, 720), (1920, 1080))
+
+ROAD_COLOR = (90, 90, 90)       # BGR VALUE
+MARKER_COLOR = (255, 255, 255)  # BGR VALUE
+
+# offset of the center of the lane from the center of the frame, as a fraction of the frame's width
+# Note: the expected lane position (CENTER, LEFT, FAR_LEFT, etc.) is computed from the ground truth
+SCENARIOS = (
+    ('centered', 0.0),
+    ('shifted_left', -0.09),
+    ('shifted_right', 0.09),
+    ('far_left', -0.15),
+    ('far_right', 0.15),
+)
+
+# curvature of the lane dividers, as a fraction of the frame's width (measured at the top of the bird's eye view)
+CURVATURE = 0.04
+
+# max mean error (in pixels) between the fitted and the known lane dividers
+MAX_MEAN_ERROR = 10.0
+# ---------------------------------------------------------------------------- #
+
+
+def lane_boundaries(width, height, offset, curvature = CURVATURE):
+    """
+    Return the x-coordinates of the left/right lane dividers for each row (y) of the bird's eye view.
+    """
+    # lane width in pixels within the range accepted by LaneDetector.threat_classifier
+    lane_width = min(max(0.6 * width, 450), 1050)
+    lane_center = width / 2 + offset * width
+
+    metronome = np.arange(height, dtype=np.float64)
+    bend = curvature * width * ((height - 1 - metronome) / height) ** 2
+
+    left = lane_center - lane_width / 2 + bend
+    right = lane_center + lane_width / 2 + bend
+
+    return metronome, left, right
+
+
+def distort(frame, camera_matrix, distortion_coefficients):
+    """
+    Apply the lens distortion of the camera to the given frame, so that undistorting it gives back the frame.
+    """
+    height, width = frame.shape[:2]
+
+    # cv2.undistort samples each pixel of the frame at its distorted location,
+    # so each pixel of the distorted frame is sampled at its undistorted location
+    pixels = np.float32(np.dstack(np.meshgrid(np.arange(width), np.arange(height)))).reshape(-1, 1, 2)
+    undistorted_pixels = cv2.undistortPoints(pixels,
+        camera_matrix,
+        distortion_coefficients,
+        P=camera_matrix).reshape(height, width, 2)
+
+    return cv2.remap(frame,
+        undistorted_pixels[..., 0],
+        undistorted_pixels[..., 1],
+        interpolation=cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_CONSTANT,
+        borderValue=ROAD_COLOR)
+
+
+def synthetic_frame(lane_detector, width, height, offset, curvature = CURVATURE):
+    """
+    Generate a road frame (camera's perspective, distorted by the camera of the given detector)
+    with the known lane dividers.
+    """
+    metronome, left, right = lane_boundaries(width, height, offset, curvature)
+
+    marker_size = max(4, width // 100)
+
+    birdseye_view = np.zeros((height, width, 3), dtype=np.uint8)
+    birdseye_view[:] = ROAD_COLOR
+
+    for boundary in (left, right):
+        points = np.int32(np.transpose(np.vstack([boundary, metronome])))
+        cv2.polylines(birdseye_view, [points], False, MARKER_COLOR, marker_size)
+
+    # compute the same transformation matrices used by the detector
+    _, _, backward_transformation_matrix = transformer.convert_to_birdseye_view(
+        np.zeros((height, width), dtype=np.uint8))
+
+    frame = cv2.warpPerspective(birdseye_view,
+        backward_transformation_matrix,
+        (width, height),
+        flags=cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_CONSTANT,
+        borderValue=ROAD_COLOR)
+
+    return distort(frame, lane_detector.camera_matrix, lane_detector.distortion_coefficients)
+
+
+def time_function(function, repeats):
+    """
+    Call the given function (repeats) times and return the latency statistics in milliseconds.
+    """
+    durations = []
+
+    for _ in range(repeats):
+        timer = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - timer)
+
+    durations = np.asarray(durations) * 1000.0
+
+    return {
+        'mean_ms': float(np.mean(durations)),
+        'median_ms': float(np.median(durations)),
+        'min_ms': float(np.min(durations)),
+    }
+
+
+def expected_position(lane_detector, frame, width, height, offset):
+    """
+    Run LaneDetector.threat_classifier over the ground truth lane dividers.
+    """
+    metronome, left, right = lane_boundaries(width, height, offset)
+
+    ground_truth = visualizer.Lane()
+    ground_truth.lane_detected = True
+    ground_truth.left_marker.x_axis_pixels, ground_truth.left_marker.y_axis_pixels = left, metronome
+    ground_truth.right_marker.x_axis_pixels, ground_truth.right_marker.y_axis_pixels = right, metronome
+
+    detected_lane = lane_detector.lane
+    lane_detector.lane, lane_detector.frame = ground_truth, frame
+    threats = lane_detector.threat_classifier()
+    lane_detector.lane = detected_lane
+
+    return position_of(threats)
+
+
+def position_of(threats):
+    return [position for position, detected in threats.items() if detected][0]
+
+
+def check_accuracy(lane_detector, width, height):
+    """
+    Run LaneDetector.detect_lane over each scenario, and compare the detected lane dividers against the ground truth.
+    """
+    results = {}
+
+    for (scenario, offset) in SCENARIOS:
+        frame = synthetic_frame(lane_detector, width, height, offset)
+        metronome, left, right = lane_boundaries(width, height, offset)
+
+        # start from a fresh lane, as the detected markers are smoothed over consecutive frames
+        lane_detector.lane = visualizer.Lane()
+        threats = {}
+        lane_detector.detect_lane(frame.copy(), threats)
+
+        detected = position_of(threats)
+        expected = expected_position(lane_detector, frame, width, height, offset)
+
+        result = {
+            'expected_position': expected,
+            'detected_position': detected,
+            'lane_detected': bool(lane_detector.lane.lane_detected),
+        }
+
+        if lane_detector.lane.lane_detected:
+            for (name, marker, boundary) in (
+                ('left', lane_detector.lane.left_marker, left),
+                ('right', lane_detector.lane.right_marker, right)):
+
+                fitted = np.polyval(marker.last_observed_pixel, metronome)
+                error = np.abs(fitted - boundary)
+                result[name + '_mean_error_px'] = float(np.mean(error))
+                result[name + '_max_error_px'] = float(np.max(error))
+
+            result['passed'] = expected == detected and \
+                result['left_mean_error_px'] <= MAX_MEAN_ERROR and \
+                result['right_mean_error_px'] <= MAX_MEAN_ERROR
+        else:
+            result['passed'] = False
+
+        results[scenario] = result
+
+    return results
+
+
+def benchmark_resolution(lane_detector, width, height, repeats):
+    """
+    Time each stage of the lane detection pipeline on its own, and end to end.
+    """
+    frame = synthetic_frame(lane_detector, width, height, offset=0.0)
+
+    # the stages run over the undistorted frame, like in LaneDetector.detect_lane
+    calb_frame = calibrator.set_distortion_coefficients(frame,
+        lane_detector.camera_matrix,
+        lane_detector.distortion_coefficients)
+    lanes_bitmap = transformer.convert_to_bitmap(calb_frame)
+    birdseye_view, _, backward_transformation_matrix = transformer.convert_to_birdseye_view(lanes_bitmap)
+
+    lane_detector.lane = visualizer.Lane()
+    lane_detector.lane.detect_pixles(birdseye_view)
+    lane_detector.frame = calb_frame
+
+    timings = {
+        'undistort': time_function(
+            lambda: calibrator.set_distortion_coefficients(frame,
+                lane_detector.camera_matrix,
+                lane_detector.distortion_coefficients), repeats),
+
+        'convert_to_bitmap': time_function(
+            lambda: transformer.convert_to_bitmap(calb_frame), repeats),
+
+        'convert_to_birdseye_view': time_function(
+            lambda: transformer.convert_to_birdseye_view(lanes_bitmap), repeats),
+
+        'detect_pixles': time_function(
+            lambda: lane_detector.lane.detect_pixles(birdseye_view), repeats),
+
+        'highlight': time_function(
+            lambda: lane_detector.lane.highlight(calb_frame, backward_transformation_matrix, lane_color=(127, 255, 0)), repeats),
+
+        'threat_classifier': time_function(
+            lane_detector.threat_classifier, repeats),
+
+        'detect_lane': time_function(
+            lambda: lane_detector.detect_lane(frame.copy(), {}), repeats),
+    }
+
+    return timings
+
+
+def run_benchmark(resolutions = DEFAULT_RESOLUTIONS, repeats = 20):
+    lane_detector = LaneDetector(visualization = True)
+
+    results = {}
+
+    for (width, height) in resolutions:
+        results['{}x{}'.format(width, height)] = {
+            'timings': benchmark_resolution(lane_detector, width, height, repeats),
+            'accuracy': check_accuracy(lane_detector, width, height),
+        }
+
+    return results
+
+
+def print_report(results):
+    for resolution, result in results.items():
+        print('\n' + resolution)
+        print('-' * 60)
+
+        for stage, timing in result['timings'].items():
+            print('{:<28}{:>10.2f} ms (median){:>10.2f} ms (min)'.format(
+                stage, timing['median_ms'], timing['min_ms']))
+
+        for scenario, accuracy in result['accuracy'].items():
+            print('{:<28}{:<10}expected: {:<10} detected: {:<10} error: {:.1f}/{:.1f} px'.format(
+                scenario,
+                'PASS' if accuracy['passed'] else 'FAIL',
+                accuracy['expected_position'],
+                accuracy['detected_position'],
+                accuracy.get('left_mean_error_px', float('nan')),
+                accuracy.get('right_mean_error_px', float('nan'))))
+
+
+def parse_resolutions(value):
+    return tuple(tuple(int(size) for size in resolution.split('x')) for resolution in value.split(','))
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Benchmark the lane_detector package on synthetic frames.')
+    parser.add_argument('--resolutions', type=parse_resolutions, default=DEFAULT_RESOLUTIONS,
+        help='comma-separated list of WIDTHxHEIGHT (i.e. 1280x720,1920x1080)')
+    parser.add_argument('--repeats', type=int, default=20, help='number of times each stage is timed')
+    parser.add_argument('--output', default=None, help='path of the output JSON file')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.resolutions, args.repeats)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+
+    failed_scenarios = ['{} {}'.format(resolution, scenario)
+        for resolution, result in results.items()
+        for scenario, accuracy in result['accuracy'].items()
+        if not accuracy['passed']]
+
+    if failed_scenarios:
+        print('\n-- {} scenario(s) failed: {}'.format(len(failed_scenarios), ', '.join(failed_scenarios)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
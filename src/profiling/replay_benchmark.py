@@ -0,0 +1,289 @@
+# coding: utf-8
+"""
+A headless benchmark that replays recorded driving footage (a video file or a directory of frames)
+through the DrivingAssistant without the GUI and without showing any frames on the screen.
+
+It reports the throughput, the latency percentiles of each stage of the pipeline (collected using trace_utils),
+the peak memory usage (RSS), and a summary of the threats detected throughout the footage
+as a JSON document that could be compared across commits to catch performance regressions.
+
+- Usage (run from the src folder):
+    python -m profiling.replay_benchmark <path to video or frames directory> [options]
+
+    i.e. lane detection only, 200 frames, results saved to a file:
+    python -m profiling.replay_benchmark footage.mp4 --no-object-detection --max-frames 200 --output lane.json
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import argparse
+import contextlib
+import json
+import os, sys
+import platform
+import subprocess
+import time
+import numpy as np
+
+import profiling.trace_utils as tracer
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+DEFAULT_CLASSIFIER = 'faster_rcnn_resnet101_coco_2017_11_08'
+DEFAULT_DATASET = 'mscoco'
+DEFAULT_THRESHOLD = .85
+
+# ring buffer size used while benchmarking (large enough to keep every event of a long replay)
+TRACE_CAPACITY = 2000000
+# ---------------------------------------------------------------------------- #
+
+
+def summarize_durations(durations):
+    """
+    Return the latency percentiles (in milliseconds) of a list of durations (in seconds).
+    """
+    durations = np.asarray(durations, dtype=np.float64) * 1000.0
+
+    return {
+        'count': int(durations.size),
+        'mean_ms': float(np.mean(durations)),
+        'p50_ms': float(np.percentile(durations, 50)),
+        'p90_ms': float(np.percentile(durations, 90)),
+        'p99_ms': float(np.percentile(durations, 99)),
+        'max_ms': float(np.max(durations)),
+    }
+
+
+def stage_latencies(events):
+    """
+    Group recorded trace events by stage name, and summarize their durations.
+    """
+    durations = {}
+
+    for (name, _, begin, end, _, _) in events:
+        if end is not None:
+            durations.setdefault(name, []).append(end - begin)
+
+    return {name: summarize_durations(values) for name, values in sorted(durations.items())}
+
+
+def peak_rss_mb():
+    """
+    Return the peak resident set size of the current process in megabytes (None if not available).
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        # ru_maxrss is reported in bytes on macOS, and in kilobytes on Linux
+        if sys.platform == 'darwin':
+            return peak / (1024.0 ** 2)
+        return peak / 1024.0
+
+    except ImportError:
+        pass
+
+    try:
+        import psutil
+        memory_info = psutil.Process().memory_info()
+        # peak_wset is only available on Windows
+        return getattr(memory_info, 'peak_wset', memory_info.rss) / (1024.0 ** 2)
+
+    except ImportError:
+        return None
+
+
+def git_revision():
+    """
+    Return the current commit hash, so that results could be compared across commits.
+    """
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(source_path,
+    classifier_codename = DEFAULT_CLASSIFIER,
+    dataset_codename = DEFAULT_DATASET,
+    classifier_threshold = DEFAULT_THRESHOLD,
+    object_detection = True,
+    lane_detection = True,
+    visualization = False,
+    diagnostic_mode = False,
+    max_frames = None,
+    warmup_frames = 5,
+    per_frame = False,
+    inference_server = None,
+    intra_op_threads = 0,
+    inter_op_threads = 0,
+    cpu_affinity = None,
+    opencv_threads = None):
+    """
+    Replay the given footage through the DrivingAssistant and return a dictionary of results.
+    """
+    from driving_assistant.DrivingAssistant import DrivingAssistant
+    import driving_assistant.capture_utils as capture_utils
+
+    frame_source = capture_utils.open_source(source_path)
+
+    driving_assistant = DrivingAssistant(
+        classifier_codename = classifier_codename,
+        dataset_codename = dataset_codename,
+        classifier_threshold = classifier_threshold,
+        object_detection = object_detection,
+        object_visualization = visualization,
+        lane_detection = lane_detection,
+        lane_visualization = visualization,
+        diagnostic_mode = diagnostic_mode,
+        frame_source = frame_source,
+        display = False,
+        inference_server = inference_server,
+        intra_op_threads = intra_op_threads,
+        inter_op_threads = inter_op_threads,
+        cpu_affinity = cpu_affinity,
+        opencv_threads = opencv_threads)
+
+    setup_time = 0.0
+    if object_detection:
+        timer = time.perf_counter()
+        driving_assistant.object_detector.setup()
+        setup_time = time.perf_counter() - timer
+
+    # warm up the pipeline (i.e. lazy allocations, caches) before measuring anything
+    for _ in range(warmup_frames):
+        if not driving_assistant.run():
+            break
+
+    tracer.enable(TRACE_CAPACITY)
+    tracer.TRACER.clear()
+
+    threat_counts = {threat: 0 for threat in driving_assistant.threats}
+    frames = []
+    num_frames = 0
+
+    timer = time.perf_counter()
+
+    while max_frames is None or num_frames < max_frames:
+        if not driving_assistant.run():
+            break
+
+        for threat, detected in driving_assistant.threats.items():
+            threat_counts[threat] += int(bool(detected))
+
+        if per_frame:
+            frames.append({
+                'frame_id': driving_assistant.frame_id - 1,
+                'threats': sorted(threat for threat, detected in driving_assistant.threats.items() if detected)
+            })
+
+        num_frames += 1
+
+    elapsed_time = time.perf_counter() - timer
+
+    tracer.disable()
+    frame_source.release()
+
+    results = {
+        'config': {
+            'source': os.path.abspath(source_path),
+            'frame_width': frame_source.width,
+            'frame_height': frame_source.height,
+            'classifier_codename': classifier_codename if object_detection else None,
+            'dataset_codename': dataset_codename if object_detection else None,
+            'classifier_threshold': classifier_threshold,
+            'object_detection': object_detection,
+            'lane_detection': lane_detection,
+            'visualization': visualization,
+            'diagnostic_mode': diagnostic_mode,
+            'warmup_frames': warmup_frames,
+            'inference_server': inference_server,
+            'intra_op_threads': intra_op_threads,
+            'inter_op_threads': inter_op_threads,
+            'cpu_affinity': cpu_affinity,
+            'opencv_threads': opencv_threads,
+        },
+        'environment': {
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+        },
+        'frames': num_frames,
+        'elapsed_seconds': elapsed_time,
+        'frames_per_second': num_frames / elapsed_time if elapsed_time > 0 else 0.0,
+        'setup_seconds': setup_time,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': stage_latencies(tracer.TRACER.events),
+        'threats': threat_counts,
+    }
+
+    if per_frame:
+        results['per_frame'] = frames
+
+    return results
+
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(
+        description='Replay recorded driving footage through DeepEye without a GUI and report its performance.')
+
+    parser.add_argument('source', help='path to a video file or a directory of frames')
+    parser.add_argument('--classifier', default=DEFAULT_CLASSIFIER, help='codename of the pre-trained model')
+    parser.add_argument('--dataset', default=DEFAULT_DATASET, help='codename of the dataset (mscoco, kitti)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='decision threshold of the classifier')
+    parser.add_argument('--no-object-detection', dest='object_detection', action='store_false', help='skip object detection')
+    parser.add_argument('--no-lane-detection', dest='lane_detection', action='store_false', help='skip lane detection')
+    parser.add_argument('--visualization', action='store_true', help='draw detected objects/lanes onto each frame')
+    parser.add_argument('--diagnostic', action='store_true', help='run in diagnostic mode')
+    parser.add_argument('--max-frames', type=int, default=None, help='max number of frames to be measured')
+    parser.add_argument('--warmup-frames', type=int, default=5, help='number of frames processed before measuring')
+    parser.add_argument('--per-frame', action='store_true', help='include the threats detected in each frame')
+    parser.add_argument('--server', default=None,
+        help='address of an InferenceServer to run the object detection on (see object_classifier/InferenceServer.py)')
+    parser.add_argument('--intra-op-threads', type=int, default=0, help='size of the intra-op thread pool of tensorflow')
+    parser.add_argument('--inter-op-threads', type=int, default=0, help='size of the inter-op thread pool of tensorflow')
+    parser.add_argument('--cpus', default=None, help='list of cores to run the benchmark on (i.e. 0-3,6)')
+    parser.add_argument('--opencv-threads', type=int, default=None, help='number of threads used by OpenCV')
+    parser.add_argument('--output', default=None, help='path of the output JSON file (stdout by default)')
+
+    return parser.parse_args(argv)
+
+
+def main(argv = None):
+    args = parse_args(argv)
+
+    # keep stdout clean for the JSON output
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run_benchmark(args.source,
+            classifier_codename = args.classifier,
+            dataset_codename = args.dataset,
+            classifier_threshold = args.threshold,
+            object_detection = args.object_detection,
+            lane_detection = args.lane_detection,
+            visualization = args.visualization,
+            diagnostic_mode = args.diagnostic,
+            max_frames = args.max_frames,
+            warmup_frames = args.warmup_frames,
+            per_frame = args.per_frame,
+            inference_server = args.server,
+            intra_op_threads = args.intra_op_threads,
+            inter_op_threads = args.inter_op_threads,
+            cpu_affinity = args.cpus,
+            opencv_threads = args.opencv_threads)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+# coding: utf-8
+"""
+A tuning helper that finds the best split of the cores between tensorflow and OpenCV for the current host.
+
+It runs the replay benchmark (replay_benchmark.py) over the same footage once for each combination of
+    - the size of the intra-op thread pool of tensorflow,
+    - the size of the inter-op thread pool of tensorflow, and
+    - the number of threads used by OpenCV (by default, the cores left over by the intra-op pool),
+then recommends the settings with the highest frame rate (compared to the default settings of both libraries).
+
+Note: tensorflow creates its thread pools along with the first session in the process,
+so each combination runs in a separate process.
+
+- Usage (run from the src folder):
+    python -m profiling.thread_tuner <path to video or frames directory> [--intra 1,2,4] [--inter 1,2] [--max-frames 100]
+
+    Any option of the replay benchmark that is not listed below (i.e. --classifier, --no-lane-detection)
+    is passed on to each run.
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import argparse
+import contextlib
+import json
+import os, sys
+import subprocess
+import tempfile
+
+import driving_assistant.thread_utils as thread_utils
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+DEFAULT_INTER_OP_THREADS = (1, 2)
+
+DEFAULT_MAX_FRAMES = 100
+DEFAULT_WARMUP_FRAMES = 5
+
+# the stage used to compare the latency of each run (see replay_benchmark.py)
+LATENCY_STAGE = 'DrivingAssistant.run'
+# ---------------------------------------------------------------------------- #
+
+
+def parse_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def default_intra_op_threads(num_cpus):
+    """
+    Return the powers of 2 up to the number of cores (as well as the number of cores itself).
+    """
+    candidates = set([num_cpus])
+
+    threads = 1
+    while threads < num_cpus:
+        candidates.add(threads)
+        threads *= 2
+
+    return sorted(candidates)
+
+
+def candidate_settings(num_cpus, intra_op_threads = None, inter_op_threads = None, opencv_threads = None):
+    """
+    Return the list of (intra_op_threads, inter_op_threads, opencv_threads) to be measured,
+    starting with the default settings of both libraries.
+    """
+    if not intra_op_threads:
+        intra_op_threads = default_intra_op_threads(num_cpus)
+    if not inter_op_threads:
+        inter_op_threads = DEFAULT_INTER_OP_THREADS
+
+    settings = [(0, 0, None)]
+
+    for intra in intra_op_threads:
+        for inter in inter_op_threads:
+            # by default, OpenCV gets the cores left over by the intra-op pool
+            for opencv in (opencv_threads or [max(num_cpus - intra, 1)]):
+                if (intra, inter, opencv) not in settings:
+                    settings.append((intra, inter, opencv))
+
+    return settings
+
+
+def run_setting(source_path, setting, cpus = None, max_frames = DEFAULT_MAX_FRAMES,
+    warmup_frames = DEFAULT_WARMUP_FRAMES, benchmark_args = ()):
+    """
+    Run the replay benchmark with the given (intra_op_threads, inter_op_threads, opencv_threads) in a new process,
+    and return its results.
+    """
+    intra, inter, opencv = setting
+
+    with tempfile.TemporaryDirectory() as directory:
+        output_path = os.path.join(directory, 'results.json')
+
+        command = [sys.executable, '-m', 'profiling.replay_benchmark', source_path,
+            '--max-frames', str(max_frames),
+            '--warmup-frames', str(warmup_frames),
+            '--intra-op-threads', str(intra),
+            '--inter-op-threads', str(inter),
+            '--output', output_path]
+
+        if opencv is not None:
+            command += ['--opencv-threads', str(opencv)]
+        if cpus:
+            command += ['--cpus', cpus]
+
+        command += list(benchmark_args)
+
+        # the benchmark is run from the src folder (same as this script)
+        subprocess.check_call(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+        with open(output_path) as output_file:
+            return json.load(output_file)
+
+
+def summarize_run(setting, results):
+    intra, inter, opencv = setting
+    latency = results['stages'].get(LATENCY_STAGE, {})
+
+    return {
+        'intra_op_threads': intra,
+        'inter_op_threads': inter,
+        'opencv_threads': opencv,
+        'frames_per_second': results['frames_per_second'],
+        'p90_ms': latency.get('p90_ms'),
+        'peak_rss_mb': results['peak_rss_mb'],
+    }
+
+
+def recommend(runs):
+    """
+    Return the run with the highest frame rate (the one with fewer threads if two runs are within 2% of each other).
+    """
+    best_frame_rate = max(run['frames_per_second'] for run in runs)
+    close_runs = [run for run in runs if run['frames_per_second'] >= 0.98 * best_frame_rate]
+
+    def total_threads(run):
+        # the default settings (0, None) use every core
+        return sum(threads if threads else os.cpu_count() for threads in
+            (run['intra_op_threads'], run['inter_op_threads'], run['opencv_threads']))
+
+    return min(close_runs, key=total_threads)
+
+
+def tune(source_path,
+    intra_op_threads = None,
+    inter_op_threads = None,
+    opencv_threads = None,
+    cpus = None,
+    max_frames = DEFAULT_MAX_FRAMES,
+    warmup_frames = DEFAULT_WARMUP_FRAMES,
+    benchmark_args = ()):
+    """
+    Measure every candidate setting on the given footage, and return a dictionary of results.
+    """
+    num_cpus = len(thread_utils.parse_cpu_list(cpus)) if cpus else len(thread_utils.available_cpus())
+
+    settings = candidate_settings(num_cpus, intra_op_threads, inter_op_threads, opencv_threads)
+    runs = []
+
+    for (index, setting) in enumerate(settings):
+        print('-- [{}/{}] intra_op_threads={}, inter_op_threads={}, opencv_threads={}'.format(
+            index + 1, len(settings), *setting))
+
+        runs.append(summarize_run(setting, run_setting(source_path, setting,
+            cpus = cpus,
+            max_frames = max_frames,
+            warmup_frames = warmup_frames,
+            benchmark_args = benchmark_args)))
+
+    baseline = runs[0]
+    recommended = recommend(runs)
+
+    return {
+        'config': {
+            'source': os.path.abspath(source_path),
+            'cpus': cpus,
+            'num_cpus': num_cpus,
+            'max_frames': max_frames,
+            'warmup_frames': warmup_frames,
+            'benchmark_args': list(benchmark_args),
+        },
+        'runs': runs,
+        'baseline': baseline,
+        'recommended': recommended,
+        'speedup': recommended['frames_per_second'] / baseline['frames_per_second']
+            if baseline['frames_per_second'] else None,
+    }
+
+
+def print_results(results, output_file = sys.stdout):
+    header = '{:>8}{:>8}{:>8}{:>14}{:>12}'.format('intra', 'inter', 'opencv', 'frames/sec', 'p90 (ms)')
+
+    print(header, file=output_file)
+    print('-' * len(header), file=output_file)
+
+    for run in results['runs']:
+        marker = '  <= recommended' if run is results['recommended'] else ''
+        print('{:>8}{:>8}{:>8}{:>14.2f}{:>12}{}'.format(
+            run['intra_op_threads'] or 'default',
+            run['inter_op_threads'] or 'default',
+            'default' if run['opencv_threads'] is None else run['opencv_threads'],
+            run['frames_per_second'],
+            '-' if run['p90_ms'] is None else '{:.1f}'.format(run['p90_ms']),
+            marker), file=output_file)
+
+    recommended = results['recommended']
+    print('\nRecommended: DrivingAssistant(..., intra_op_threads = {}, inter_op_threads = {}, opencv_threads = {}) '
+        '({:.2f}x the default settings)'.format(
+            recommended['intra_op_threads'],
+            recommended['inter_op_threads'],
+            recommended['opencv_threads'],
+            results['speedup'] or 0.0), file=output_file)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(
+        description='Find the best split of the cores between tensorflow and OpenCV using the replay benchmark.')
+    parser.add_argument('source', help='path to a video file or a directory of frames')
+    parser.add_argument('--intra', type=parse_list, default=None,
+        help='comma-separated sizes of the intra-op pool (powers of 2 up to the number of cores by default)')
+    parser.add_argument('--inter', type=parse_list, default=None,
+        help='comma-separated sizes of the inter-op pool (1,2 by default)')
+    parser.add_argument('--opencv', type=parse_list, default=None,
+        help='comma-separated numbers of OpenCV threads (the cores left over by the intra-op pool by default)')
+    parser.add_argument('--cpus', default=None, help='list of cores to run on (i.e. 0-3,6)')
+    parser.add_argument('--max-frames', type=int, default=DEFAULT_MAX_FRAMES, help='number of frames measured by each run')
+    parser.add_argument('--warmup-frames', type=int, default=DEFAULT_WARMUP_FRAMES, help='number of frames processed before measuring')
+    parser.add_argument('--output', default=None, help='path of the output JSON file')
+    args, benchmark_args = parser.parse_known_args(argv)
+
+    # keep stdout clean for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        results = tune(args.source,
+            intra_op_threads = args.intra,
+            inter_op_threads = args.inter,
+            opencv_threads = args.opencv,
+            cpus = args.cpus,
+            max_frames = args.max_frames,
+            warmup_frames = args.warmup_frames,
+            benchmark_args = benchmark_args)
+
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
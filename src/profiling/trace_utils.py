@@ -0,0 +1,241 @@
+# coding: utf-8
+"""
+A lightweight tracer that records the begin/end timestamps of the stages of our pipeline
+(i.e. DrivingAssistant.run, ObjectClassifier.scan_road, LaneDetector.detect_lane, GUI updates)
+into a ring buffer, and dumps them as Chrome trace-event JSON.
+
+The output file can be opened in Perfetto (https://ui.perfetto.dev) or chrome://tracing
+to see how the stages overlap across threads and where stalls happen.
+
+- Usage:
+    The tracer is disabled by default, and a disabled tracer only costs a single attribute lookup per stage.
+
+    - From the shell: set the environment variable (DEEPEYE_TRACE=<path to output .json>) before running main.py
+        the trace will be saved automatically when the program exits.
+
+    - From the code:
+        trace_utils.enable()
+        with trace_utils.span('my_stage'):
+            ...
+        trace_utils.save('deepeye_trace.json')
+
+----------------------
+
+Sources:
+- Trace Event Format:
+    https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+"""
+
+# libraries and dependencies
+# ---------------------------------------------------------------------------- #
+import atexit
+import collections
+import functools
+import json
+import os
+import threading
+import time
+# ---------------------------------------------------------------------------- #
+
+#constant parameters
+# ---------------------------------------------------------------------------- #
+# environment variable used to enable the tracer from the shell
+TRACE_ENV_VARIABLE = 'DEEPEYE_TRACE'
+
+# max number of events kept in memory (the oldest events get dropped first)
+DEFAULT_CAPACITY = 200000
+# ---------------------------------------------------------------------------- #
+
+
+class _NullSpan:
+    """
+    A no-op context manager returned by a disabled tracer.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """
+    A context manager that records the duration of a single stage.
+    """
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.begin = None
+
+    def __enter__(self):
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.name, self.category, self.begin, time.perf_counter(), self.args)
+        return False
+
+
+class Tracer:
+    """
+    Collect trace events into a bounded ring buffer.
+
+    Note: appending to a deque is thread-safe, so the same tracer could be shared
+    between the processing loop, the GUI thread, and any helper threads.
+    """
+    def __init__(self, capacity = DEFAULT_CAPACITY):
+        # Boolean flag to turn tracing on/off
+        self.enabled = False
+
+        # ring buffer of (name, category, begin, end, thread_id, args)
+        self.events = collections.deque(maxlen=capacity)
+
+        # a dictionary of [thread IDs] => thread names
+        self.thread_names = {}
+
+        self.pid = os.getpid()
+
+
+    def span(self, name, category = 'deepeye', **args):
+        """
+        Return a context manager that records the duration of the enclosed block.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+
+        return _Span(self, name, category, args)
+
+
+    def traced(self, name = None, category = 'deepeye'):
+        """
+        A decorator that records the duration of every call to the decorated function.
+        """
+        def decorator(function):
+            span_name = name or function.__qualname__
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+
+                with _Span(self, span_name, category, {}):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+
+    def instant(self, name, category = 'deepeye', **args):
+        """
+        Record an event that has no duration (e.g. a warning being issued).
+        """
+        if self.enabled:
+            timestamp = time.perf_counter()
+            self.record(name, category, timestamp, None, args)
+
+
+    def record(self, name, category, begin, end, args = None):
+        """
+        Append a single event to the ring buffer.
+        """
+        thread = threading.current_thread()
+        if thread.ident not in self.thread_names:
+            self.thread_names[thread.ident] = thread.name
+
+        self.events.append((name, category, begin, end, thread.ident, args))
+
+
+    def clear(self):
+        self.events.clear()
+
+
+    def to_chrome_trace(self):
+        """
+        Convert recorded events into a dictionary that follows the Chrome trace-event format.
+        """
+        trace_events = []
+
+        # name each thread, so that it gets labeled properly in the timeline
+        for thread_id, thread_name in list(self.thread_names.items()):
+            trace_events.append({
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': self.pid,
+                'tid': thread_id,
+                'args': {'name': thread_name}
+            })
+
+        for (name, category, begin, end, thread_id, args) in list(self.events):
+            event = {
+                'name': name,
+                'cat': category,
+                'pid': self.pid,
+                'tid': thread_id,
+                # timestamps are expressed in microseconds
+                'ts': begin * 1e6,
+            }
+
+            if end is None:
+                event['ph'] = 'i'
+                event['s'] = 't'
+            else:
+                event['ph'] = 'X'
+                event['dur'] = (end - begin) * 1e6
+
+            if args:
+                event['args'] = args
+
+            trace_events.append(event)
+
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+
+    def save(self, path):
+        """
+        Dump recorded events to a JSON file.
+        """
+        with open(path, 'w') as trace_file:
+            json.dump(self.to_chrome_trace(), trace_file)
+
+        print('Saved trace to:', path)
+
+
+# A shared tracer for the entire program
+# ---------------------------------------------------------------------------- #
+TRACER = Tracer()
+
+span = TRACER.span
+traced = TRACER.traced
+instant = TRACER.instant
+save = TRACER.save
+
+
+def enable(capacity = None):
+    """
+    Start recording events (optionally, with a new ring buffer size).
+    """
+    if capacity:
+        TRACER.events = collections.deque(TRACER.events, maxlen=capacity)
+
+    TRACER.enabled = True
+
+
+def disable():
+    TRACER.enabled = False
+
+
+def is_enabled():
+    return TRACER.enabled
+
+
+# enable the tracer from the shell, and save the trace when the program exits
+if os.environ.get(TRACE_ENV_VARIABLE):
+    enable()
+    atexit.register(save, os.environ[TRACE_ENV_VARIABLE])
+# ---------------------------------------------------------------------------- #